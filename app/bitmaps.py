@@ -0,0 +1,174 @@
+"""
+bitmaps.py
+------------
+Compressed bitsets over row positions or protein codes, for combining
+drill-down filters (AND / OR / NOT) as bitwise operations.
+
+A Bitmap holds a set of integers in [0, size) in whichever of two forms is
+smaller: a sorted uint32 array while sparse, packed bits (one byte per
+eight members of the universe) once more than 1/32 of the universe is set.
+Operations pick the cheapest kernel for the pair of forms (sorted merge,
+gather from the packed bits, or byte-wise &, |, ~) and re-compress their
+result.
+
+PhBins keeps one row Bitmap per pH bin, so a pH range filter is the OR of
+its bins.
+"""
+
+import numpy as np
+
+DENSE_FRACTION = 32          # packed once more than size / DENSE_FRACTION members are set
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+
+class Bitmap:
+    """Set of integers in [0, size): sorted uint32 array when sparse, packed bits when dense."""
+
+    def __init__(self, size: int, positions: np.ndarray = None, packed: np.ndarray = None):
+        self.size = int(size)
+        self._pos = positions    # sorted, unique uint32 (sparse form)
+        self._bits = packed      # uint8, little bit order (dense form)
+
+    # --- construction ---
+    @classmethod
+    def from_sorted(cls, positions, size: int) -> "Bitmap":
+        """Bitmap of ascending, unique `positions`."""
+        positions = np.asarray(positions)
+        if len(positions) * DENSE_FRACTION > size:
+            mask = np.zeros(size, dtype=bool)
+            mask[positions] = True
+            return cls(size, packed=np.packbits(mask, bitorder="little"))
+        return cls(size, positions=positions.astype(np.uint32, copy=False))
+
+    @classmethod
+    def from_mask(cls, mask: np.ndarray) -> "Bitmap":
+        """Bitmap of the True positions of a boolean array."""
+        count = int(np.count_nonzero(mask))
+        if count * DENSE_FRACTION > len(mask):
+            return cls(len(mask), packed=np.packbits(mask, bitorder="little"))
+        return cls(len(mask), positions=np.flatnonzero(mask).astype(np.uint32))
+
+    @classmethod
+    def from_range(cls, start: int, stop: int, size: int) -> "Bitmap":
+        """Bitmap of [start, stop) (e.g. a chemical's rows in the chemical-sorted frame)."""
+        if (stop - start) * DENSE_FRACTION > size:
+            mask = np.zeros(size, dtype=bool)
+            mask[start:stop] = True
+            return cls(size, packed=np.packbits(mask, bitorder="little"))
+        return cls(size, positions=np.arange(start, max(start, stop), dtype=np.uint32))
+
+    @classmethod
+    def union(cls, bitmaps, size: int) -> "Bitmap":
+        """OR of many bitmaps in one pass."""
+        bitmaps = list(bitmaps)
+        if not bitmaps:
+            return cls(size, positions=np.empty(0, dtype=np.uint32))
+        if all(b.is_sparse for b in bitmaps) and sum(len(b._pos) for b in bitmaps) * DENSE_FRACTION <= size:
+            return cls(size, positions=np.unique(np.concatenate([b._pos for b in bitmaps])))
+        mask = np.zeros(size, dtype=bool)
+        for b in bitmaps:
+            if b.is_sparse:
+                mask[b._pos] = True
+            else:
+                mask |= b.mask()
+        return cls.from_mask(mask)
+
+    # --- access ---
+    @property
+    def is_sparse(self) -> bool:
+        return self._bits is None
+
+    def __len__(self) -> int:
+        return len(self._pos) if self.is_sparse else int(_POPCOUNT[self._bits].sum())
+
+    @property
+    def nbytes(self) -> int:
+        return (self._pos if self.is_sparse else self._bits).nbytes
+
+    def mask(self) -> np.ndarray:
+        """Boolean array of length `size`."""
+        if self.is_sparse:
+            mask = np.zeros(self.size, dtype=bool)
+            mask[self._pos] = True
+            return mask
+        return np.unpackbits(self._bits, count=self.size, bitorder="little").view(bool)
+
+    def to_array(self) -> np.ndarray:
+        """Members, ascending (int64)."""
+        if self.is_sparse:
+            return self._pos.astype(np.int64)
+        return np.flatnonzero(np.unpackbits(self._bits, count=self.size, bitorder="little"))
+
+    def contains(self, values: np.ndarray) -> np.ndarray:
+        """Boolean membership of each of `values` (negative values are never members)."""
+        values = np.asarray(values, dtype=np.int64)
+        valid = (values >= 0) & (values < self.size)
+        v = np.where(valid, values, 0)
+        if self.is_sparse:
+            i = np.minimum(np.searchsorted(self._pos, v), max(len(self._pos) - 1, 0))
+            hit = self._pos[i] == v if len(self._pos) else np.zeros(len(v), dtype=bool)
+        else:
+            hit = ((self._bits[v >> 3] >> (v & 7).astype(np.uint8)) & 1).astype(bool)
+        return hit & valid
+
+    # --- set operations ---
+    def _packed(self) -> np.ndarray:
+        return np.packbits(self.mask(), bitorder="little") if self.is_sparse else self._bits
+
+    def _compact(self) -> "Bitmap":
+        """Re-pick the smaller form after an operation on packed bits."""
+        if not self.is_sparse and len(self) * DENSE_FRACTION <= self.size:
+            return Bitmap(self.size, positions=self.to_array().astype(np.uint32))
+        return self
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        if self.is_sparse and other.is_sparse:
+            return Bitmap(self.size, positions=np.intersect1d(self._pos, other._pos, assume_unique=True))
+        if self.is_sparse or other.is_sparse:
+            sparse, dense = (self, other) if self.is_sparse else (other, self)
+            return Bitmap(self.size, positions=sparse._pos[dense.contains(sparse._pos)])
+        return Bitmap(self.size, packed=self._bits & other._bits)._compact()
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        return Bitmap.union([self, other], self.size)
+
+    def __sub__(self, other: "Bitmap") -> "Bitmap":
+        """AND NOT."""
+        if self.is_sparse:
+            return Bitmap(self.size, positions=self._pos[~other.contains(self._pos)])
+        return Bitmap(self.size, packed=self._bits & ~other._packed())._compact()
+
+    def __invert__(self) -> "Bitmap":
+        bits = ~self._packed()
+        tail = self.size % 8
+        if tail:
+            bits[-1] &= np.uint8((1 << tail) - 1)  # bits past `size` stay clear
+        return Bitmap(self.size, packed=bits)._compact()
+
+
+class PhBins:
+    """
+    One row Bitmap per pH bin of width `bin_width` over [lo, hi); values
+    outside fall into the outer bins, rows without a pH into none.
+    """
+
+    def __init__(self, ph: np.ndarray, bin_width: float = 0.25, lo: float = 0.0, hi: float = 14.0):
+        self.bin_width, self.lo = bin_width, lo
+        self.n_bins = int(round((hi - lo) / bin_width))
+        ph = np.asarray(ph, dtype=np.float64)
+        has = ~np.isnan(ph)
+        bins = np.clip(np.floor((ph[has] - lo) / bin_width), 0, self.n_bins - 1).astype(np.int64)
+        rows = np.flatnonzero(has)[np.argsort(bins, kind="stable")]  # by bin, ascending within
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(bins, minlength=self.n_bins))])
+        self.bitmaps = [Bitmap.from_sorted(rows[offsets[i]:offsets[i + 1]], len(ph)) for i in range(self.n_bins)]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(b.nbytes for b in self.bitmaps)
+
+    def rows(self, lo: float, hi: float) -> Bitmap:
+        """Rows with lo <= pH < hi (bin-aligned bounds; hi at the top also takes the values above it)."""
+        first = int(np.clip(round((lo - self.lo) / self.bin_width), 0, self.n_bins))
+        last = int(np.clip(round((hi - self.lo) / self.bin_width), first, self.n_bins))
+        size = self.bitmaps[0].size if self.bitmaps else 0
+        return Bitmap.union(self.bitmaps[first:last], size)
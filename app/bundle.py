@@ -0,0 +1,204 @@
+"""
+bundle.py
+-----------
+Versioned artifact bundle holding everything the dashboard derives from the
+conditions table, written by `python -m app.precompute` next to the DB:
+
+    <db stem>.bundle/
+        meta.json                  format, fingerprint, row count, max rowid
+        conditions.arrow           frame sorted by chemical, derived columns included
+        chemicals.arrow            per-chemical summary (count, proteins, CID, sequence totals)
+        values.<column>.npy        sorted per-chemical values (+ .offsets.npy)
+        cube.<column>.*.npy        chemical × pH × concentration count cube (cells, counts, offsets)
+        proteins.*                 ProteinIndex keys / positions / offsets
+        cooccurrence.*.npy         protein × chemical CSR counts and protein IDs
+        cooccurrence/              CooccurrenceMatrix
+        sequences/                 SequenceStore
+
+Workers memory-map it at startup instead of building any of it. The bundle
+is used only while its fingerprint matches the DB. When it is missing or
+stale, load_dataset brings it up to date first (under the bundle lock, one
+process at a time), so later starts and reloads just map it; if that fails,
+the app builds from the DB as before.
+"""
+
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from app.cooccurrence import CooccurrenceIndex, CooccurrenceMatrix
+from app.data_utils import TABLE, current_fingerprint, get_db_path, load_data
+from app.cube import CountCube
+from app.dataset import CUBE_UNITS, VALUE_COLUMNS, Dataset
+from app.indexes import ChemicalIndex, ProteinIndex, SortedValues
+from app.sequences import SequenceStore
+from app.snapshot import dataset_version, read_snapshot, write_snapshot
+
+BUNDLE_FORMAT = 5  # 2: protein IDs as .npy string arrays; 3: sequence totals, matrix row_counts;
+                   # 4: count cubes; 5: matrix without pairs
+
+
+def bundle_path(db_path) -> Path:
+    """Directory holding the bundle, next to the DB."""
+    path = Path(db_path)
+    return path.with_name(f"{path.stem}.bundle")
+
+
+@contextmanager
+def bundle_lock(path):
+    """Exclusive lock on the bundle (or engine database) at `path` across processes, via a .lock file next to it."""
+    path = Path(path)
+    with open(path.with_name(f"{path.name}.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def read_meta(path):
+    """meta.json of the bundle at `path`, or None."""
+    try:
+        meta = json.loads((Path(path) / "meta.json").read_text())
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("format") == BUNDLE_FORMAT else None
+
+
+def write_bundle(dataset: Dataset, directory, meta: dict) -> None:
+    """
+    Write `dataset` into `directory`, except the sequence store, which the
+    caller builds in place (directory / "sequences") beforehand.
+    """
+    directory = Path(directory)
+    fingerprint = meta["fingerprint"]
+
+    def _save(name, arr):
+        np.save(directory / f"{name}.npy", np.ascontiguousarray(arr))
+
+    for ok in (
+        write_snapshot(dataset.df, directory / "conditions.arrow", fingerprint),
+        write_snapshot(
+            dataset.summary.join(dataset.sequence_totals).reset_index(),
+            directory / "chemicals.arrow", fingerprint,
+        ),
+    ):
+        if not ok:
+            raise OSError("could not write Arrow files (is pyarrow installed?)")
+
+    for key, col in VALUE_COLUMNS.items():
+        sv = dataset.values[key]
+        _save(f"values.{col}", sv.values)
+        _save(f"values.{col}.offsets", sv.offsets)
+    for unit in CUBE_UNITS:
+        cube, col = dataset.cubes[unit], VALUE_COLUMNS[unit]
+        _save(f"cube.{col}.cells", cube.cells)
+        _save(f"cube.{col}.counts", cube.counts)
+        _save(f"cube.{col}.offsets", cube.offsets)
+
+    _save("proteins.positions", dataset.proteins.positions)
+    _save("proteins.offsets", dataset.proteins.offsets)
+    _save("proteins.keys", dataset.proteins.keys)
+
+    W = dataset.cooccurrence.W
+    _save("cooccurrence.w_data", W.data)
+    _save("cooccurrence.w_indices", W.indices)
+    _save("cooccurrence.w_indptr", W.indptr)
+    _save("cooccurrence.proteins", np.asarray(dataset.cooccurrence.proteins, dtype=str))
+    if not dataset.cooccurrence.matrix.save(directory / "cooccurrence", dataset.version):
+        raise OSError("could not write the co-occurrence matrix")
+
+    (directory / "meta.json").write_text(json.dumps(meta, indent=2))
+
+
+def open_bundle(path, fingerprint: dict, db_path=None):
+    """Dataset memory-mapped from the bundle at `path`; None if missing or stale."""
+    path = Path(path)
+    meta = read_meta(path)
+    if meta is None or meta.get("fingerprint") != fingerprint:
+        return None
+    version = dataset_version(fingerprint)
+    df = read_snapshot(path / "conditions.arrow", fingerprint)
+    chem_table = read_snapshot(path / "chemicals.arrow", fingerprint)
+    sequences = SequenceStore.open(path / "sequences", version)
+    if df is None or chem_table is None or sequences is None:
+        return None
+    df.attrs.update(version=version, db_path=db_path)
+
+    try:
+        def _load(name):
+            return np.load(path / f"{name}.npy", mmap_mode="r")
+
+        chemicals = ChemicalIndex(df)
+        chem_table = chem_table.set_index("chemical")
+        if list(chem_table.index) != chemicals.chemicals:
+            return None
+        proteins = ProteinIndex.from_arrays(
+            _load("proteins.keys"), _load("proteins.positions"), _load("proteins.offsets"),
+        )
+        cooc = CooccurrenceIndex.from_arrays(
+            chemicals, _load("cooccurrence.proteins"),
+            _load("cooccurrence.w_data"), _load("cooccurrence.w_indices"), _load("cooccurrence.w_indptr"),
+        )
+        matrix = CooccurrenceMatrix.load(path / "cooccurrence", version)
+        if matrix is None:
+            return None
+        values = {
+            key: SortedValues.from_arrays(_load(f"values.{col}"), _load(f"values.{col}.offsets"), chemicals)
+            for key, col in VALUE_COLUMNS.items()
+        }
+        cubes = {
+            unit: CountCube.from_arrays(*(_load(f"cube.{VALUE_COLUMNS[unit]}.{part}")
+                                          for part in ("cells", "counts", "offsets")), chemicals)
+            for unit in CUBE_UNITS
+        }
+    except (OSError, ValueError, KeyError) as exc:
+        print(f"[WARN] Ignoring unreadable bundle {path}: {exc}")
+        return None
+
+    return Dataset(df, prebuilt={
+        "chemicals": chemicals,
+        "proteins": proteins,
+        "cooccurrence": cooc,
+        "matrix": matrix,
+        "values": values,
+        "summary": chem_table[["count", "unique_proteins", "cid"]],
+        "sequence_totals": chem_table[["seq_total", "seq_rows"]],
+        "sequences": sequences,
+        "cubes": cubes,
+    })
+
+
+def load_dataset(table: str = TABLE) -> Dataset:
+    """
+    Dataset for the configured DB: memory-mapped from the precomputed bundle,
+    which is built first if it does not match the DB (set DB_BUNDLE=0 to
+    skip it), else built from load_data().
+    """
+    db_path = get_db_path()
+    if os.environ.get("DB_BUNDLE", "1") != "0" and Path(db_path).exists():
+        path = bundle_path(db_path)
+        dataset = open_bundle(path, current_fingerprint(db_path), db_path) or _build_bundle(path, db_path, table)
+        if dataset is not None:
+            print(f"[INFO] Opened bundle {path} ({len(dataset.df):,} rows)")
+            return dataset
+    return Dataset(load_data(table))
+
+
+def _build_bundle(path: Path, db_path, table: str):
+    """Bring the bundle at `path` up to date and open it; None if that fails."""
+    from app.precompute import build  # precompute imports this module
+
+    try:
+        with bundle_lock(path):
+            # another process may have built it while we waited for the lock
+            dataset = open_bundle(path, current_fingerprint(db_path), db_path)
+            if dataset is None:
+                print(f"[INFO] Bundle {path} missing or out of date; building it")
+                build(db_path, path, table=table)
+                dataset = open_bundle(path, current_fingerprint(db_path), db_path)
+        return dataset
+    except Exception as exc:  # serve from the DB instead
+        print(f"[WARN] Could not build bundle {path}: {exc}; building from the DB")
+        return None
@@ -0,0 +1,447 @@
+"""
+cache.py
+----------
+Bounded, size-aware caches for drill-down results.
+
+Builders are memoized on their real inputs. Arguments carrying a `version`
+attribute (the indexes) contribute that version instead of their identity,
+so results from an older dataset simply stop being hit and age out.
+
+Two tiers: a per-process LRU in front of a SQLite file shared by every
+gunicorn worker on the host, so a result built by one worker is a hit for
+all the others.
+"""
+
+import functools
+import hashlib
+import os
+import pickle
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from importlib import metadata
+from pathlib import Path
+
+
+class LRUCache:
+    """Least-recently-used cache bounded by the total (pickled) size of its values."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, size: int = None) -> None:
+        if size is None:
+            size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self.bytes -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, old_size) = self._data.popitem(last=False)
+                self.bytes -= old_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def retain_version(self, version: str) -> None:
+        """Drop entries built for any other dataset version."""
+        with self._lock:
+            for key in [k for k in self._data if _key_version(k) not in (None, version)]:
+                self.bytes -= self._data.pop(key)[1]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+class SharedCache:
+    """
+    Pickled results in a SQLite file usable by several processes at once.
+
+    - bounded by the total size of the stored values (`max_bytes`); least
+      recently read entries are evicted first
+    - entries older than `ttl` seconds (0: no limit) count as misses and are
+      purged
+    - each entry records its dataset version (`retain_version` drops the others)
+    - hits, misses, evictions and expirations are counted in the file, so the
+      counters cover all workers
+
+    Lookups are plain reads (WAL lets them run alongside a writer); their hit
+    and miss counts and read times are kept in process memory and written
+    with the next put, or every FLUSH_INTERVAL seconds, so LRU order and the
+    counters lag slightly. Any SQLite error is treated as a miss (or a
+    skipped write): the cache never fails a request.
+
+    Values are unpickled, so the file must be private: it is refused (the
+    tier disabled) when it or its WAL files belong to another user.
+
+    Keys are hashed together with `namespace` (see build_fingerprint), so
+    results stored by another code version or configuration are never
+    served; they age out like any unread entry.
+    """
+
+    COUNTERS = ("hits", "misses", "evictions", "expirations", "bytes")
+    FLUSH_INTERVAL = 10.0  # seconds between writes of the read statistics
+
+    def __init__(self, path, max_bytes: int, ttl: float = 0, namespace: str = ""):
+        self.path = str(path)
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        self._warned = False
+        self._pending_lock = threading.Lock()
+        self._reset_pending()
+
+    def _reset_pending(self) -> None:
+        self._pending_pid = os.getpid()   # a forked child starts with nothing to flush
+        self._pending = {"hits": 0, "misses": 0}
+        self._accessed = {}               # key hash → last read time
+        self._flushed = time.time()
+
+    def _check_owner(self) -> None:
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                owner = os.stat(self.path + suffix).st_uid
+            except FileNotFoundError:
+                continue
+            if owner != os.getuid():
+                raise sqlite3.DatabaseError(f"{self.path + suffix} is owned by uid {owner}, not by this user")
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread and process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            self._check_owner()
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY, version TEXT, value BLOB,
+                    size INTEGER, created REAL, accessed REAL);
+                CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed);
+                CREATE INDEX IF NOT EXISTS entries_created ON entries(created);
+                CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER);
+            """)
+            conn.executemany("INSERT OR IGNORE INTO counters VALUES (?, 0)", [(c,) for c in self.COUNTERS])
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _warn(self, exc) -> None:
+        if not self._warned:
+            print(f"[WARN] Shared cache {self.path} unavailable: {exc}")
+            self._warned = True
+
+    def _run(self, fn, default=None):
+        """Run fn(conn) in one write transaction; `default` on any SQLite error."""
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+                conn.execute("COMMIT")
+                return result
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as exc:
+            self._warn(exc)
+            return default
+
+    def _record(self, name: str, h: str = None, now: float = None) -> None:
+        """Count a lookup in memory; write the batch out once FLUSH_INTERVAL has passed."""
+        with self._pending_lock:
+            if self._pending_pid != os.getpid():
+                self._reset_pending()
+            self._pending[name] += 1
+            if h is not None:
+                self._accessed[h] = now
+            due = time.time() - self._flushed >= self.FLUSH_INTERVAL
+        if due:
+            self._run(self._flush)
+
+    def _flush(self, conn) -> None:
+        """Write the pending read statistics (inside a write transaction)."""
+        with self._pending_lock:
+            if self._pending_pid != os.getpid():
+                self._reset_pending()
+            pending, accessed = self._pending, self._accessed
+            self._pending, self._accessed = {"hits": 0, "misses": 0}, {}
+            self._flushed = time.time()
+        for name, by in pending.items():
+            if by:
+                self._bump(conn, name, by)
+        conn.executemany("UPDATE entries SET accessed = ? WHERE key = ? AND accessed < ?",
+                         [(t, h, t) for h, t in accessed.items()])
+
+    @staticmethod
+    def _bump(conn, name: str, by: int = 1) -> None:
+        conn.execute("UPDATE counters SET value = value + ? WHERE name = ?", (by, name))
+
+    @classmethod
+    def _delete(cls, conn, where: str, params) -> tuple[int, int]:
+        """Delete the entries matching `where`; returns (count, bytes freed)."""
+        n, freed = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE {where}",
+                                params).fetchone()
+        if n:
+            conn.execute(f"DELETE FROM entries WHERE {where}", params)
+            cls._bump(conn, "bytes", -freed)
+        return n, freed
+
+    def _hash(self, key) -> str:
+        return hashlib.sha1(repr((self.namespace, key)).encode()).hexdigest()
+
+    def get(self, key, default=None):
+        h, now = self._hash(key), time.time()
+        try:
+            row = self._conn().execute("SELECT value, created FROM entries WHERE key = ?", (h,)).fetchone()
+        except sqlite3.Error as exc:
+            self._warn(exc)
+            return default
+        if row is None or (self.ttl and row[1] < now - self.ttl):  # expired rows are purged by put
+            self._record("misses")
+            return default
+        self._record("hits", h, now)
+        return pickle.loads(row[0])
+
+    def put(self, key, value, blob: bytes = None) -> None:
+        if blob is None:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        h, now = self._hash(key), time.time()
+
+        def _put(conn):
+            self._flush(conn)
+            old = conn.execute("SELECT size FROM entries WHERE key = ?", (h,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (h, _key_version(key), blob, len(blob), now, now),
+            )
+            self._bump(conn, "bytes", len(blob) - (old[0] if old else 0))
+            if self.ttl:
+                n, freed = self._delete(conn, "created < ?", (now - self.ttl,))
+                self._bump(conn, "expirations", n)
+            (total,) = conn.execute("SELECT value FROM counters WHERE name = 'bytes'").fetchone()
+            while total > self.max_bytes:
+                n, freed = self._delete(
+                    conn, "key IN (SELECT key FROM entries ORDER BY accessed LIMIT 16)", ()
+                )
+                if not n:
+                    break
+                total -= freed
+                self._bump(conn, "evictions", n)
+
+        self._run(_put)
+
+    def clear(self) -> None:
+        def _clear(conn):
+            conn.execute("DELETE FROM entries")
+            conn.execute("UPDATE counters SET value = 0 WHERE name = 'bytes'")
+        self._run(_clear)
+
+    def retain_version(self, version: str) -> None:
+        """Drop entries built for any other dataset version."""
+        self._run(lambda conn: self._delete(conn, "version IS NOT NULL AND version != ?", (version,)))
+
+    def stats(self) -> dict:
+        def _stats(conn):
+            self._flush(conn)
+            counters = dict(conn.execute("SELECT name, value FROM counters"))
+            (entries,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+            return counters, entries
+        counters, entries = self._run(_stats, default=({}, None))
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "path": self.path,
+            "namespace": self.namespace,
+            "entries": entries,
+            "bytes": counters.get("bytes"),
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions"),
+            "expirations": counters.get("expirations"),
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+
+
+class TieredCache:
+    """Per-process LRUCache in front of a SharedCache; values are pickled once."""
+
+    def __init__(self, local: LRUCache, shared: SharedCache):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key, default=None):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = self.shared.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        self.local.put(key, value)
+        return value
+
+    def put(self, key, value) -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.local.put(key, value, size=len(blob))
+        self.shared.put(key, value, blob=blob)
+
+    def clear(self) -> None:
+        self.local.clear()
+        self.shared.clear()
+
+    def retain_version(self, version: str) -> None:
+        self.local.retain_version(version)
+        self.shared.retain_version(version)
+
+    def stats(self) -> dict:
+        return {"local": self.local.stats(), "shared": self.shared.stats()}
+
+
+def _key_part(value):
+    return ("version", value.version) if hasattr(value, "version") else value
+
+
+def _key_version(key):
+    """Dataset version a memoize key was built for (None if it has none)."""
+    for part in key[1] if isinstance(key, tuple) and len(key) == 3 else ():
+        if isinstance(part, tuple) and len(part) == 2 and part[0] == "version":
+            return part[1]
+    return None
+
+
+_MISSING = object()
+
+
+def memoize(cache: LRUCache):
+    """Cache a function's results in `cache`, keyed on its name and arguments."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (
+                fn.__qualname__,
+                tuple(_key_part(a) for a in args),
+                tuple(sorted((k, _key_part(v)) for k, v in kwargs.items())),
+            )
+            result = cache.get(key, _MISSING)
+            if result is _MISSING:
+                result = fn(*args, **kwargs)
+                cache.put(key, result)
+            return result
+        return wrapper
+    return decorator
+
+
+def private_dir():
+    """
+    <tmp>/crystallization-<uid>, created with mode 0700; None (with a
+    warning) if it exists but belongs to someone else or is open to others.
+    """
+    path = os.path.join(tempfile.gettempdir(), f"crystallization-{os.getuid()}")
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    except OSError as exc:
+        print(f"[WARN] Shared cache disabled: cannot create {path}: {exc}")
+        return None
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        print(f"[WARN] Shared cache disabled: {path} is not a private directory of this user")
+        return None
+    return path
+
+
+# settings that change what the memoized builders return
+RESULT_SETTINGS = ("HISTOGRAM_MODE", "FIGURE_ENCODING", "REBIN_MODE")
+RESULT_PACKAGES = ("numpy", "pandas", "plotly")
+
+
+def build_fingerprint() -> str:
+    """
+    Hash of the app's source, the RESULT_SETTINGS in effect and the
+    RESULT_PACKAGES versions: the shared cache's namespace.
+    """
+    h = hashlib.sha1()
+    for path in sorted(Path(__file__).resolve().parent.glob("*.py")):
+        h.update(path.name.encode() + b"\0" + path.read_bytes())
+    for name in RESULT_SETTINGS:
+        h.update(f"{name}={os.environ.get(name, '')}\n".encode())
+    for name in RESULT_PACKAGES:
+        try:
+            h.update(f"{name}=={metadata.version(name)}\n".encode())
+        except metadata.PackageNotFoundError:
+            pass
+    return h.hexdigest()[:12]
+
+
+def make_result_cache():
+    """
+    Cache shared by all drill-down builders:
+      RESULT_CACHE_MB    per-process LRU size (default 64)
+      SHARED_CACHE=0     disable the cross-worker tier
+      SHARED_CACHE_PATH  its SQLite file (default: crystallization-cache.sqlite in
+                         the private directory <tmp>/crystallization-<uid>, mode 0700)
+      SHARED_CACHE_MB    its size limit (default 256)
+      SHARED_CACHE_TTL   entry lifetime in seconds, 0 for none (default 86400)
+    Shared entries are keyed by build_fingerprint() too: a redeploy or a
+    change of RESULT_SETTINGS starts from an empty namespace.
+    """
+    local = LRUCache(int(float(os.environ.get("RESULT_CACHE_MB", "64")) * 1024 * 1024))
+    if os.environ.get("SHARED_CACHE", "1") == "0":
+        return local
+    path = os.environ.get("SHARED_CACHE_PATH")
+    if path is None:
+        directory = private_dir()
+        if directory is None:
+            return local
+        path = os.path.join(directory, "crystallization-cache.sqlite")
+    shared = SharedCache(
+        path,
+        int(float(os.environ.get("SHARED_CACHE_MB", "256")) * 1024 * 1024),
+        ttl=float(os.environ.get("SHARED_CACHE_TTL", "86400")),
+        namespace=build_fingerprint(),
+    )
+    return TieredCache(local, shared)
+
+
+result_cache = make_result_cache()
@@ -4,20 +4,43 @@ callbacks.py
 All Dash callbacks for:
 - Chemical drill-down (summary + tabs: Concentration, pH, Co-occurrence)
 - Protein drill-down table + AA composition
+
+REBIN_MODE picks where the concentration histograms are binned:
+- "server" (default): every bin-width or IQR change is a request that
+  returns the finished figure.
+- "client": on a selection change the server ships the selection's values
+  once (rebin_data: distinct values as a typed array, the KDE density, the
+  IQR range) into a dcc.Store; assets/rebin.js re-bins, rescales the KDE and
+  applies the IQR focus in the browser, with no request per slider move.
+
+Figure outputs go out with typed-array data (FIGURE_ENCODING, see
+app.typed_arrays).
 """
 
+import os
+
 import dash
 from dash import html, dcc
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 import plotly.express as px
-import pandas as pd
+import numpy as np
 from collections import Counter
 
-from app.data_utils import parse_ph_series, concentration_series_mm_and_pct
+from app.cache import memoize, result_cache
+from app.cooccurrence import CooccurrenceIndex
+from app.dataset import Dataset
+from app.reload import LiveDataset
+from app.selection import Query, make_query
+from app.typed_arrays import FIGURE_ENCODING, compact_figure, encoded_figures
 from app.figures import (
     make_hist_with_kde_binwidth,
+    histogram_trace,
+    iqr_focus_range,
     cooccurrence_heatmap_and_topbar,
+    cooccurrence_figures,
+    make_ph_conc_heatmap,
+    rebin_data,
     empty_fig,
     aa_composition_bar,   # ✅ dark version comes from figures.py
 )
@@ -47,38 +70,44 @@ def compute_aa_composition(fasta: str) -> dict:
 # -----------------------------
 # Helpers
 # -----------------------------
-def quant_summary_with_counts(series: pd.Series) -> tuple[str, int]:
-    """Return formatted summary and count for 5–95% range + median."""
-    s = pd.to_numeric(series, errors="coerce").dropna()
-    if s.empty:
+def quant_summary_with_counts(dist) -> tuple[str, int]:
+    """Return formatted summary and count for 5–95% range + median of a distribution."""
+    if len(dist) == 0:
         return "N/A", 0
-    q05 = s.quantile(0.05)
-    q50 = s.quantile(0.50)
-    q95 = s.quantile(0.95)
-    return f"{q05:.2f} – {q95:.2f} (median {q50:.2f})", len(s)
-
-
-def summary_block(d: pd.DataFrame, df_all: pd.DataFrame, selected: str) -> html.Div:
-    """Return HTML summary block with counts, CID, sequence length, and concentration ranges."""
-    total_count = len(d)
-    total_all = max(len(df_all), 1)
-    percent = 100 * total_count / total_all
-    unique_proteins = d["Protein_ID"].nunique()
-    cid_vals = d["CID"].dropna().unique()
-    cid_str = str(cid_vals[0]) if len(cid_vals) else "N/A"
+    q05 = dist.quantile(0.05)
+    q50 = dist.quantile(0.50)
+    q95 = dist.quantile(0.95)
+    return f"{q05:.2f} – {q95:.2f} (median {q50:.2f})", len(dist)
+
+
+@memoize(result_cache)
+def summary_block(dataset: Dataset, selected) -> html.Div:
+    """
+    Return HTML summary block with counts, CID, sequence length, and
+    concentration ranges, for a chemical or a combined selection Query.
+    """
+    chem = selected.chemical if isinstance(selected, Query) else selected
+    known = chem in dataset.chemicals
+    row = dataset.summary.loc[chem] if known else None
+    total_all = max(len(dataset.chemicals), 1)
+    cid_str = row["cid"] if known and isinstance(row["cid"], str) else "N/A"
     pubchem_link = f"https://pubchem.ncbi.nlm.nih.gov/compound/{cid_str}" if cid_str != "N/A" else None
 
-    # --- Average sequence length ---
-    if "FASTA_Sequence" in d.columns:
-        lengths = d["FASTA_Sequence"].dropna().apply(len)
-        avg_len = lengths.mean() if not lengths.empty else None
+    # --- Counts and average sequence length (over rows, from the per-protein store) ---
+    if isinstance(selected, Query):
+        selection = dataset.select(selected)
+        total_count, unique_proteins = len(selection.rows), len(selection.proteins)
+        avg_len = dataset.mean_sequence_length(selection.rows)
     else:
-        avg_len = None
+        total_count = int(row["count"]) if known else 0
+        unique_proteins = int(row["unique_proteins"]) if known else 0
+        avg_len = dataset.avg_sequence_length.get(selected) if known else None
+    percent = 100 * total_count / total_all
+    avg_len = None if avg_len is None or np.isnan(avg_len) else avg_len
 
-    # Concentration summaries
-    mm_series, pct_series = concentration_series_mm_and_pct(d)
-    mm_txt, mm_n = quant_summary_with_counts(mm_series)
-    pct_txt, pct_n = quant_summary_with_counts(pct_series)
+    # Concentration summaries (precomputed sorted arrays, or SQL aggregates)
+    mm_txt, mm_n = quant_summary_with_counts(dataset.distribution("mM", selected))
+    pct_txt, pct_n = quant_summary_with_counts(dataset.distribution("%", selected))
 
     bold_mm = mm_n >= pct_n and mm_n > 0
     bold_pct = pct_n >= mm_n and pct_n > 0
@@ -116,119 +145,262 @@ def summary_block(d: pd.DataFrame, df_all: pd.DataFrame, selected: str) -> html.
 
 
 # -----------------------------
-# Tabs content
+# Tab figures
 # -----------------------------
-def build_concentration_tab(d, selected, binwidth_mm, binwidth_pct, focus_iqr, logy):
-    binwidth_mm = max(0.01, min(float(binwidth_mm), 10.0))
-    binwidth_pct = max(0.005, min(float(binwidth_pct), 3.0))
+BW_MM_RANGE = (0.01, 10.0)    # keep in sync with the clientside label callbacks
+BW_PCT_RANGE = (0.005, 3.0)
+BW_DEFAULTS = {"mM": 1.0, "%": 0.25}
+BW_RANGES = {"mM": BW_MM_RANGE, "%": BW_PCT_RANGE}
+REBIN_MODE = os.environ.get("REBIN_MODE", "server")  # "server" | "client", see the module docstring
 
-    mm_series, pct_series = concentration_series_mm_and_pct(d)
 
-    fig_mm = make_hist_with_kde_binwidth(
-        mm_series, f"{selected} – Concentration (mM)", "mM",
-        bin_width=binwidth_mm, focus_iqr=focus_iqr, logy=logy,
-    )
-    fig_pct = make_hist_with_kde_binwidth(
-        pct_series, f"{selected} – Concentration (%)", "%",
-        bin_width=binwidth_pct, focus_iqr=focus_iqr, logy=logy,
+def clamp(value, bounds, default):
+    lo, hi = bounds
+    return max(lo, min(float(value or default), hi))
+
+
+@memoize(result_cache)
+def build_concentration_fig(dataset: Dataset, selected, unit, bin_width, focus_iqr, logy):
+    """Concentration histogram + KDE for one unit ("mM" or "%")."""
+    return make_hist_with_kde_binwidth(
+        dataset.distribution(unit, selected), f"{selected} – Concentration ({unit})", unit,
+        bin_width=bin_width, focus_iqr=focus_iqr, logy=logy,
     )
 
-    return dbc.Row(
-        [
-            dbc.Col(dbc.Card(dbc.CardBody([dcc.Graph(figure=fig_mm)]), class_name="mb-3"), width=6),
-            dbc.Col(dbc.Card(dbc.CardBody([dcc.Graph(figure=fig_pct)]), class_name="mb-3"), width=6),
-        ]
+
+@memoize(result_cache)
+def build_rebin_data(dataset: Dataset, selected, unit):
+    """Store payload for clientside re-binning of one unit's histogram (REBIN_MODE=client)."""
+    lo, hi = BW_RANGES[unit]
+    data = rebin_data(dataset.distribution(unit, selected), f"{selected} – Concentration ({unit})", unit,
+                      bin_width=BW_DEFAULTS[unit])
+    data["bin_width"] = {"min": lo, "max": hi, "default": BW_DEFAULTS[unit]}
+    if FIGURE_ENCODING == "typed":
+        data["figure"] = compact_figure(data["figure"])
+    return data
+
+
+@memoize(result_cache)
+def build_ph_fig(dataset: Dataset, selected, focus_iqr):
+    s = dataset.distribution("pH", selected)  # parsed once at load, sorted per chemical
+
+    if len(s) == 0:
+        return empty_fig("pH distribution")
+
+    bw = 0.25  # fixed bin size
+    fig_ph = go.Figure(histogram_trace(s, bw))
+    fig_ph.update_layout(
+        template="plotly_dark",  # ✅ match theme
+        title=f"pH distribution for {selected}",
+        xaxis_title="pH",
+        yaxis_title="Count",
+        margin=dict(l=40, r=20, t=50, b=40),
     )
+    x_range = iqr_focus_range(s) if focus_iqr else None
+    if x_range:
+        fig_ph.update_xaxes(range=x_range)
+    fig_ph.update_xaxes(type="linear", dtick=bw)
+    return fig_ph
 
 
-def build_ph_tab(d, selected, focus_iqr):
-    ph_numeric = parse_ph_series(d["pH"])
-    s = pd.to_numeric(ph_numeric, errors="coerce").dropna()
+@memoize(result_cache)
+def build_ph_conc_heatmap(dataset: Dataset, unit):
+    """Global pH × concentration heatmap of one unit, summed from the count cube."""
+    return make_ph_conc_heatmap(*dataset.cubes[unit].heatmap(ph_step=0.25, per_decade=5), unit)
 
-    if s.empty:
-        fig_ph = empty_fig("pH distribution")
-    else:
-        bw = 0.25  # fixed bin size
-        hist = go.Histogram(
-            x=s,
-            xbins=dict(size=bw),
-            marker=dict(line=dict(width=0)),
-            opacity=0.85,
-            name="Counts",
-            marker_color="lightskyblue",
-        )
-        fig_ph = go.Figure(hist)
-        fig_ph.update_layout(
-            template="plotly_dark",  # ✅ match theme
-            title=f"pH distribution for {selected}",
-            xaxis_title="pH",
-            yaxis_title="Count",
-            margin=dict(l=40, r=20, t=50, b=40),
-        )
-        if focus_iqr and len(s) >= 3:
-            q1, q3 = s.quantile(0.25), s.quantile(0.75)
-            lo, hi = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
-            if lo < hi:
-                fig_ph.update_xaxes(range=[max(s.min(), lo), min(s.max(), hi)])
-        fig_ph.update_xaxes(type="linear", dtick=bw)
 
-    return dbc.Row([dbc.Col(dbc.Card(dbc.CardBody([dcc.Graph(figure=fig_ph)])), width=12)])
+@memoize(result_cache)
+def build_co_figs(cooc: CooccurrenceIndex, selected):
+    """(heatmap, top-10 bar) co-occurrence figures."""
+    return cooccurrence_heatmap_and_topbar(cooc, selected, top_k=15)
 
 
-def build_co_tab(df_all, d, selected):
-    heatmap_fig, bar_fig = cooccurrence_heatmap_and_topbar(df_all, d, selected, top_k=15)
-    return dbc.Row([
-        dbc.Col(dbc.Card(dbc.CardBody([dcc.Graph(figure=heatmap_fig)])), width=12),
-        dbc.Col(dbc.Card(dbc.CardBody([dcc.Graph(figure=bar_fig)])), width=12),
-    ])
+@memoize(result_cache)
+def build_selection_co_figs(dataset: Dataset, query: Query):
+    """Co-occurrence figures over the proteins of a combined selection (its own chemicals left out)."""
+    proteins = dataset.select(query).protein_codes
+    cooc = dataset.cooccurrence
+    return cooccurrence_figures(cooc.counts_among(proteins, exclude=query.positive).head(15),
+                                lambda chems: cooc.pair_counts_among(proteins, chems), query, top_k=15)
 
 
 # -----------------------------
 # Register callbacks
 # -----------------------------
-def register_callbacks(app, df):
-    """Register all Dash callbacks."""
+def register_callbacks(app, live: LiveDataset):
+    """
+    Register all Dash callbacks.
+
+    Each drill-down output has its own callback with the narrowest inputs:
+    the summary depends on the chemical selection only, each figure on the
+    selection and its own controls, and the bin-width labels are computed
+    clientside. The selection is the chemical, or a Query combining it with
+    the AND / OR / NOT chemicals and the pH range (see app.selection).
+    The graphs of a tab are only computed while it is open: their callbacks
+    also take the selected tab and return no_update for a closed one, so a
+    selection change does not pay for every tab, and opening a tab draws
+    its graphs (from the result cache when they were drawn before).
+
+    Every callback reads `live.current` once, so a dataset reloaded while it
+    runs does not affect it.
+    """
+
+    app.clientside_callback(
+        """
+        function(value) {
+            var bw = Math.max(0.01, Math.min(parseFloat(value || 1.0), 10.0));
+            return "Bin width: " + bw.toFixed(2) + " mM (cap: 10 mM)";
+        }
+        """,
+        dash.Output("binwidth-mm-label", "children"),
+        dash.Input("binwidth-mm", "value"),
+    )
+
+    app.clientside_callback(
+        """
+        function(value) {
+            var bw = Math.max(0.005, Math.min(parseFloat(value || 0.25), 3.0));
+            return "Bin width: " + bw.toFixed(2) + " % (cap: 3 %)";
+        }
+        """,
+        dash.Output("binwidth-pct-label", "children"),
+        dash.Input("binwidth-pct", "value"),
+    )
+
+    # the AND / OR / NOT dropdowns list the same chemicals: copied in the browser, not shipped 4×
+    app.clientside_callback(
+        """
+        function(options) {
+            return [options, options, options];
+        }
+        """,
+        dash.Output("chem-and", "options"),
+        dash.Output("chem-or", "options"),
+        dash.Output("chem-not", "options"),
+        dash.Input("chem-dropdown", "options"),
+    )
+
+    # combined selection controls (AND / OR / NOT chemicals, pH range), see app.selection
+    selection_inputs = [
+        dash.Input("chem-and", "value"),
+        dash.Input("chem-or", "value"),
+        dash.Input("chem-not", "value"),
+        dash.Input("ph-range", "value"),
+    ]
+
+    def target(dataset, selected, terms):
+        """The chemical, or its combined Query; None if this engine cannot evaluate one."""
+        query = make_query(selected, *terms)
+        return None if isinstance(query, Query) and not hasattr(dataset, "select") else query
+
+    def no_selection_fig(selected, title="No chemical selected"):
+        return empty_fig(title if not selected else "Combined selections need QUERY_ENGINE=pandas")
 
     @app.callback(
         dash.Output("chem-summary", "children"),
-        dash.Output("tab-content", "children"),
-        dash.Output("binwidth-mm-label", "children"),
-        dash.Output("binwidth-pct-label", "children"),
         dash.Input("chem-dropdown", "value"),
+        *selection_inputs,
+    )
+    def update_summary(selected, *terms):
+        if not selected:
+            return html.Div("⬆ Select a chemical to see details.", className="text-muted")
+        dataset = live.current
+        query = target(dataset, selected, terms)
+        if query is None:
+            return html.Div("Combined selections need QUERY_ENGINE=pandas.", className="text-warning")
+        return summary_block(dataset, query)
+
+    if REBIN_MODE == "client":
+        for unit, key in (("mM", "mm"), ("%", "pct")):
+            register_rebin_callbacks(app, live, unit, key, target, no_selection_fig, selection_inputs)
+    else:
+        @app.callback(
+            dash.Output("conc-mm-graph", "figure"),
+            dash.Input("tabs", "value"),
+            dash.Input("chem-dropdown", "value"),
+            dash.Input("show-all", "value"),
+            dash.Input("binwidth-mm", "value"),
+            *selection_inputs,
+        )
+        @encoded_figures
+        def update_conc_mm(tab, selected, show_all, binwidth_mm, *terms):
+            if tab != "tab-conc":
+                return dash.no_update
+            dataset = live.current
+            query = target(dataset, selected, terms) if selected else None
+            if query is None:
+                return no_selection_fig(selected)
+            focus_iqr = "all" not in (show_all or [])
+            return build_concentration_fig(dataset, query, "mM", clamp(binwidth_mm, BW_MM_RANGE, 1.0),
+                                           focus_iqr, logy=False)
+
+        @app.callback(
+            dash.Output("conc-pct-graph", "figure"),
+            dash.Input("tabs", "value"),
+            dash.Input("chem-dropdown", "value"),
+            dash.Input("show-all", "value"),
+            dash.Input("binwidth-pct", "value"),
+            *selection_inputs,
+        )
+        @encoded_figures
+        def update_conc_pct(tab, selected, show_all, binwidth_pct, *terms):
+            if tab != "tab-conc":
+                return dash.no_update
+            dataset = live.current
+            query = target(dataset, selected, terms) if selected else None
+            if query is None:
+                return no_selection_fig(selected)
+            focus_iqr = "all" not in (show_all or [])
+            return build_concentration_fig(dataset, query, "%", clamp(binwidth_pct, BW_PCT_RANGE, 0.25),
+                                           focus_iqr, logy=False)
+
+    @app.callback(
+        dash.Output("ph-graph", "figure"),
         dash.Input("tabs", "value"),
+        dash.Input("chem-dropdown", "value"),
         dash.Input("show-all", "value"),
-        dash.Input("binwidth-mm", "value"),
-        dash.Input("binwidth-pct", "value"),
+        *selection_inputs,
     )
-    def update_drilldown(selected, tab, show_all,
-                         binwidth_mm, binwidth_pct):
-        focus_iqr = "all" not in (show_all or [])
+    @encoded_figures
+    def update_ph(tab, selected, show_all, *terms):
+        if tab != "tab-ph":
+            return dash.no_update
+        dataset = live.current
+        query = target(dataset, selected, terms) if selected else None
+        if query is None:
+            return no_selection_fig(selected)
+        return build_ph_fig(dataset, query, "all" not in (show_all or []))
 
-        bw_mm_clamped = max(0.01, min(float(binwidth_mm or 1.0), 10.0))
-        bw_pct_clamped = max(0.005, min(float(binwidth_pct or 0.25), 3.0))
-        mm_label = f"Bin width: {bw_mm_clamped:.2f} mM (cap: 10 mM)"
-        pct_label = f"Bin width: {bw_pct_clamped:.2f} % (cap: 3 %)"
+    @app.callback(
+        dash.Output("co-heatmap-graph", "figure"),
+        dash.Output("co-bar-graph", "figure"),
+        dash.Input("tabs", "value"),
+        dash.Input("chem-dropdown", "value"),
+        *selection_inputs,
+    )
+    @encoded_figures
+    def update_cooccurrence(tab, selected, *terms):
+        if tab != "tab-co":
+            return dash.no_update, dash.no_update
+        dataset = live.current
+        query = target(dataset, selected, terms) if selected else None
+        if query is None:
+            return (no_selection_fig(selected, "Co-occurrence heatmap"),
+                    no_selection_fig(selected, "Top 10 co-occurring chemicals"))
+        if isinstance(query, Query):
+            return build_selection_co_figs(dataset, query)
+        return build_co_figs(dataset.cooccurrence, query)
 
-        if not selected:
-            return (
-                html.Div("⬆ Select a chemical to see details.", className="text-muted"),
-                html.Div("No chemical selected.", className="text-muted"),
-                mm_label, pct_label,
-            )
-
-        d = df[df["Standardized_Precipitate"] == selected]
-        summary = summary_block(d, df, selected)
-
-        if tab == "tab-conc":
-            content = build_concentration_tab(d, selected, bw_mm_clamped, bw_pct_clamped, focus_iqr, logy=False)
-        elif tab == "tab-ph":
-            content = build_ph_tab(d, selected, focus_iqr)
-        elif tab == "tab-co":
-            content = build_co_tab(df, d, selected)
-        else:
-            content = html.Div("Select a tab.", className="text-muted")
-
-        return summary, content, mm_label, pct_label
+    @app.callback(
+        dash.Output("ph-conc-heatmap", "figure"),
+        dash.Input("heatmap-unit", "value"),
+    )
+    @encoded_figures
+    def update_ph_conc_heatmap(unit):
+        dataset = live.current
+        if not hasattr(dataset, "cubes"):
+            return empty_fig("pH × concentration heatmap needs QUERY_ENGINE=pandas")
+        return build_ph_conc_heatmap(dataset, unit if unit in ("mM", "%") else "mM")
 
     @app.callback(
         dash.Output("protein-table", "children"),
@@ -239,8 +411,9 @@ def register_callbacks(app, df):
         if not n_clicks or not protein_id:
             return html.Div("⬆ Enter a Protein_ID above and click Show Conditions.", className="text-muted")
 
+        dataset = live.current
         protein_id = protein_id.strip()
-        d = df[df["Protein_ID"].astype(str).str.upper() == protein_id.upper()]
+        d = dataset.protein_conditions(protein_id)
         if d.empty:
             return html.Div(f"No conditions found for Protein_ID '{protein_id}'.", className="text-danger")
 
@@ -250,8 +423,8 @@ def register_callbacks(app, df):
             ["Chemical", "Concentration"]
         )
 
-        # Sequence stats
-        seq = "".join(d["FASTA_Sequence"].dropna().astype(str))
+        # Sequence stats (one stored sequence per protein)
+        seq = dataset.sequences.get(d["Protein_ID"].iloc[0]) or ""
         length = compute_sequence_length(seq)
         composition = compute_aa_composition(seq)
         aa_fig = aa_composition_bar(composition, f"Amino Acid Composition (Length={length})")
@@ -260,3 +433,35 @@ def register_callbacks(app, df):
             dbc.Table.from_dataframe(table_df, striped=True, bordered=True, hover=True, responsive=True),
             dcc.Graph(figure=aa_fig)
         ])
+
+
+def register_rebin_callbacks(app, live: LiveDataset, unit, key, target, no_selection_fig, selection_inputs):
+    """
+    REBIN_MODE=client for one unit's histogram: the server fills the
+    conc-<key>-data store on selection changes only (while the Concentration
+    tab is open, see register_callbacks), and the graph is drawn
+    from it in the browser (assets/rebin.js) on every bin-width or IQR change.
+    """
+
+    @app.callback(
+        dash.Output(f"conc-{key}-data", "data"),
+        dash.Input("tabs", "value"),
+        dash.Input("chem-dropdown", "value"),
+        *selection_inputs,
+    )
+    def update_rebin_data(tab, selected, *terms):
+        if tab != "tab-conc":
+            return dash.no_update
+        dataset = live.current
+        query = target(dataset, selected, terms) if selected else None
+        if query is None:
+            return {"figure": no_selection_fig(selected)}
+        return build_rebin_data(dataset, query, unit)
+
+    app.clientside_callback(
+        dash.ClientsideFunction(namespace="rebin", function_name="figure"),
+        dash.Output(f"conc-{key}-graph", "figure"),
+        dash.Input(f"conc-{key}-data", "data"),
+        dash.Input("show-all", "value"),
+        dash.Input(f"binwidth-{key}", "value"),
+    )
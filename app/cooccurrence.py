@@ -0,0 +1,309 @@
+"""
+cooccurrence.py
+-----------------
+Sparse protein × chemical incidence matrix for the co-occurrence tab.
+
+Built once at load with integer category codes for proteins and chemicals.
+Per-request co-occurrence is then a sparse row gather over the proteins that
+used the selected chemical, instead of isin/groupby/pivot on the full frame.
+
+On top of it, CooccurrenceMatrix holds the global chemical × chemical counts
+and per-chemical top-k partner lists. It is persisted next to the DB and
+memory-mapped by workers rather than recomputed.
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from app.indexes import CHEM_COL, ChemicalIndex
+
+
+class CooccurrenceIndex:
+    """
+    W[p, c] = number of condition rows of protein p with chemical c (CSR).
+    B       = binary pattern of W, kept as CSR (per protein) and CSC (per
+              chemical, i.e. "proteins that used chemical c").
+
+    Chemical codes are positions in `ChemicalIndex.chemicals`; rows without a
+    protein or a chemical are left out.
+    """
+
+    def __init__(self, df: pd.DataFrame, chemicals: ChemicalIndex):
+        prot_codes, proteins = pd.factorize(df["Protein_ID"])
+        chem_codes = pd.Categorical(df[CHEM_COL], categories=chemicals.chemicals).codes
+        keep = (prot_codes >= 0) & (chem_codes >= 0)
+        prot_codes, chem_codes = prot_codes[keep], chem_codes[keep].astype(np.int64)
+
+        W = sparse.csr_matrix(
+            (np.ones(len(prot_codes), dtype=np.int32), (prot_codes, chem_codes)),
+            shape=(len(proteins), len(chemicals.chemicals)),
+        )
+        W.sum_duplicates()
+        self._init(chemicals, proteins, W)
+
+    def _init(self, chemicals: ChemicalIndex, proteins, W):
+        self.version = chemicals.version
+        self.chemicals = np.array(chemicals.chemicals, dtype=object)
+        self._pos = {c: i for i, c in enumerate(chemicals.chemicals)}
+        self.proteins = proteins
+        self.W = W
+        self.B_csr = sparse.csr_matrix(
+            (np.ones(len(W.data), dtype=np.int32), W.indices, W.indptr), shape=W.shape
+        )
+        self.B_csc = self.B_csr.tocsc()
+        self.matrix = None  # CooccurrenceMatrix, attached by Dataset
+
+    @classmethod
+    def from_arrays(cls, chemicals: ChemicalIndex, proteins, w_data, w_indices, w_indptr):
+        """Rebuild from the saved CSR arrays of W (see `CooccurrenceIndex.W`)."""
+        cooc = cls.__new__(cls)
+        W = sparse.csr_matrix((w_data, w_indices, w_indptr), shape=(len(proteins), len(chemicals.chemicals)))
+        cooc._init(chemicals, proteins, W)
+        return cooc
+
+    def appended(self, chemicals: ChemicalIndex, protein_ids, chem_codes: np.ndarray):
+        """
+        Index with new condition rows added (their Protein_IDs and codes in
+        `chemicals`, which may list new chemicals after the existing ones).
+        Proteins not seen before get codes after the existing ones. Returns
+        (index, codes of the proteins that gained rows).
+        """
+        known = pd.Index(np.asarray(self.proteins, dtype=str))
+        ids = pd.Series(protein_ids)
+        keep = ids.notna().to_numpy() & (chem_codes >= 0)
+        ids, chem_codes = ids[keep].astype(str).to_numpy(), chem_codes[keep].astype(np.int64)
+        prot_codes = known.get_indexer(ids)
+        unseen = pd.unique(ids[prot_codes < 0])
+        proteins = np.concatenate([np.asarray(known, dtype=str), np.asarray(unseen, dtype=str)])
+        prot_codes[prot_codes < 0] = len(known) + pd.Index(unseen).get_indexer(ids[prot_codes < 0])
+
+        shape = (len(proteins), len(chemicals.chemicals))
+        indptr = np.concatenate([self.W.indptr, np.full(len(unseen), self.W.indptr[-1])])
+        W = sparse.csr_matrix((self.W.data, self.W.indices, indptr), shape=shape) + sparse.csr_matrix(
+            (np.ones(len(prot_codes), dtype=np.int32), (prot_codes, chem_codes)), shape=shape
+        )
+        cooc = type(self).__new__(type(self))
+        cooc._init(chemicals, proteins, W.astype(np.int32))
+        return cooc, np.unique(prot_codes)
+
+    def proteins_with(self, chem) -> np.ndarray:
+        """Protein codes whose conditions include `chem`."""
+        i = self._pos.get(chem)
+        if i is None:
+            return np.empty(0, dtype=np.int32)
+        return self.B_csc.indices[self.B_csc.indptr[i]:self.B_csc.indptr[i + 1]]
+
+    def counts_with(self, chem) -> pd.Series:
+        """
+        Condition-row counts of every other chemical among the proteins that
+        used `chem`, descending (ties in chemical order), zeros dropped.
+        """
+        return self.counts_among(self.proteins_with(chem), exclude=[chem])
+
+    def counts_among(self, proteins: np.ndarray, exclude=()) -> pd.Series:
+        """
+        Condition-row counts of every chemical not in `exclude` among the
+        protein codes `proteins`, descending (ties in chemical order), zeros dropped.
+        """
+        counts = np.asarray(self.W[proteins].sum(axis=0)).ravel()
+        for chem in exclude:
+            if chem in self._pos:
+                counts[self._pos[chem]] = 0
+        order = np.argsort(-counts, kind="stable")
+        order = order[counts[order] > 0]
+        return pd.Series(counts[order], index=self.chemicals[order], name="count")
+
+    def top_partners(self, chem, k: int) -> pd.Series:
+        """First `k` entries of `counts_with`, looked up in the global matrix if attached."""
+        if self.matrix is not None and k <= self.matrix.k and chem in self._pos:
+            idx, counts = self.matrix.neighbors(self._pos[chem])
+            return pd.Series(counts[:k].astype(np.int64), index=self.chemicals[idx[:k]], name="count")
+        return self.counts_with(chem).head(k)
+
+    def pair_counts(self, chem, others) -> np.ndarray:
+        """
+        Dense len(others)² matrix: number of distinct proteins that used `chem`
+        and both chemicals of each pair (diagonal: each chemical alone).
+        """
+        return self.pair_counts_among(self.proteins_with(chem), others)
+
+    def pair_counts_among(self, proteins: np.ndarray, others) -> np.ndarray:
+        """pair_counts over the protein codes `proteins` instead of those that used one chemical."""
+        cols = [self._pos[c] for c in others]
+        sub = self.B_csr[proteins][:, cols]
+        return (sub.T @ sub).toarray()
+
+
+DENSE_MAX_CHEMICALS = 2048   # dense uint32 matrix up to 2048² × 4 B = 16 MB
+TOP_K_NEIGHBORS = 32
+MATRIX_FORMAT = 3  # 2: row_counts kept for incremental updates; 3: pairs dropped
+
+
+def _widen(B: sparse.csr_matrix, n: int) -> sparse.csr_matrix:
+    """B with its column count raised to `n` (new chemicals have no entries)."""
+    return sparse.csr_matrix((B.data, B.indices, B.indptr), shape=(B.shape[0], n))
+
+
+def _grow(stored, n: int):
+    """int64 copy of a stored n₀ × n₀ matrix, zero-padded to n × n."""
+    m = stored.shape[0]
+    if isinstance(stored, np.ndarray):
+        out = np.zeros((n, n), dtype=np.int64)
+        out[:m, :m] = stored
+        return out
+    indptr = np.concatenate([stored.indptr, np.full(n - m, stored.indptr[-1])])
+    return sparse.csr_matrix((stored.data.astype(np.int64), stored.indices, indptr), shape=(n, n))
+
+
+def _rank_neighbors(rows: sparse.csr_matrix, codes, neighbor_idx: np.ndarray, neighbor_count: np.ndarray):
+    """Fill the top-k lists of chemicals `codes` from their row_counts rows (one CSR row each)."""
+    k = neighbor_idx.shape[1]
+    for r, i in enumerate(codes):
+        cols = rows.indices[rows.indptr[r]:rows.indptr[r + 1]]
+        vals = rows.data[rows.indptr[r]:rows.indptr[r + 1]]
+        nz = vals > 0
+        cols, vals = cols[nz], vals[nz]
+        top = np.lexsort((cols, -vals.astype(np.int64)))[:k]
+        neighbor_idx[i] = -1
+        neighbor_count[i] = 0
+        neighbor_idx[i, :len(top)] = cols[top]
+        neighbor_count[i, :len(top)] = vals[top]
+
+
+def _as_stored(m, n: int):
+    """Dense uint32 for small vocabularies, CSR otherwise."""
+    m = sparse.csr_matrix(m) if not isinstance(m, np.ndarray) else m
+    if n <= DENSE_MAX_CHEMICALS:
+        return (m if isinstance(m, np.ndarray) else m.toarray()).astype(np.uint32)
+    m = sparse.csr_matrix(m, dtype=np.uint32)
+    m.eliminate_zeros()
+    return m
+
+
+class CooccurrenceMatrix:
+    """
+    Global chemical × chemical co-occurrence plus per-chemical top-k partner
+    lists.
+
+    - row_counts[i, j]: condition rows with chemical j among proteins that
+                        used i (diagonal zeroed); what the top-k lists rank.
+    - neighbor_idx/count[i]: the k chemicals with most condition rows among
+                        proteins that used i (what the top-10 bar shows),
+                        descending, ties in chemical order, padded with -1/0.
+
+    row_counts is dense uint32 for small vocabularies, CSR otherwise. The
+    per-pair protein counts the heatmap shows are gathered per request
+    (CooccurrenceIndex.pair_counts), so they are not stored here.
+    """
+
+    def __init__(self, row_counts, neighbor_idx: np.ndarray, neighbor_count: np.ndarray):
+        self.row_counts = row_counts
+        self.neighbor_idx = neighbor_idx
+        self.neighbor_count = neighbor_count
+        self.k = neighbor_idx.shape[1]
+
+    @classmethod
+    def build(cls, cooc: CooccurrenceIndex, k: int = TOP_K_NEIGHBORS):
+        n = len(cooc.chemicals)
+        rows = (cooc.B_csc.T @ cooc.W).tocsr()
+        rows = (rows - sparse.diags(rows.diagonal())).tocsr()
+        rows.eliminate_zeros()
+        neighbor_idx = np.full((n, k), -1, dtype=np.int32)
+        neighbor_count = np.zeros((n, k), dtype=np.uint32)
+        _rank_neighbors(rows, range(n), neighbor_idx, neighbor_count)
+        return cls(_as_stored(rows, n), neighbor_idx, neighbor_count)
+
+    def updated(self, old: CooccurrenceIndex, new: CooccurrenceIndex, changed: np.ndarray):
+        """
+        Matrix for `new`, which is `old` plus rows of the proteins `changed`
+        (see CooccurrenceIndex.appended). row_counts is a sum over proteins,
+        so only the changed proteins' terms are recomputed, and only chemicals
+        whose row_counts moved get their top-k list re-ranked.
+        """
+        n = len(new.chemicals)
+        before = changed[changed < old.W.shape[0]]
+
+        def terms(cooc, prots):
+            return _widen(cooc.B_csr[prots], n).T @ _widen(cooc.W[prots], n)
+
+        d_rows = (terms(new, changed).astype(np.int64) - terms(old, before)).tocsr()
+        d_rows = (d_rows - sparse.diags(d_rows.diagonal())).tocsr()
+        d_rows.eliminate_zeros()
+
+        grown = _grow(self.row_counts, n)
+        row_counts = _as_stored(grown + (d_rows.toarray() if isinstance(grown, np.ndarray) else d_rows), n)
+        k = self.k
+        neighbor_idx = np.full((n, k), -1, dtype=np.int32)
+        neighbor_count = np.zeros((n, k), dtype=np.uint32)
+        m = len(self.neighbor_idx)
+        neighbor_idx[:m], neighbor_count[:m] = self.neighbor_idx, self.neighbor_count
+        dirty = np.flatnonzero(np.diff(d_rows.indptr))
+        _rank_neighbors(sparse.csr_matrix(row_counts[dirty]), dirty, neighbor_idx, neighbor_count)
+        return CooccurrenceMatrix(row_counts, neighbor_idx, neighbor_count)
+
+    def neighbors(self, i: int):
+        """(chemical codes, row counts) of chemical i's top partners."""
+        idx = self.neighbor_idx[i]
+        valid = idx >= 0
+        return idx[valid], self.neighbor_count[i][valid]
+
+    # ---- persistence: one .npy per array, memory-mapped on load ----
+    def save(self, path, version: str) -> bool:
+        path = Path(path)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            tmp.mkdir(parents=True, exist_ok=True)
+            arrays = {"neighbor_idx": self.neighbor_idx, "neighbor_count": self.neighbor_count}
+            m = self.row_counts
+            if isinstance(m, np.ndarray):
+                arrays["row_counts"] = m
+            else:
+                arrays.update({"row_counts_data": m.data, "row_counts_indices": m.indices,
+                               "row_counts_indptr": m.indptr})
+            for name, arr in arrays.items():
+                np.save(tmp / f"{name}.npy", np.ascontiguousarray(arr))
+            meta = {"format": MATRIX_FORMAT, "version": version, "shape": list(self.row_counts.shape)}
+            (tmp / "meta.json").write_text(json.dumps(meta))
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp, path)
+        except OSError as exc:
+            print(f"[WARN] Could not write co-occurrence matrix {path}: {exc}")
+            shutil.rmtree(tmp, ignore_errors=True)
+            return False
+        return True
+
+    @classmethod
+    def load(cls, path, version: str):
+        """Memory-map a saved matrix; None if missing or built for another dataset."""
+        path = Path(path)
+        try:
+            meta = json.loads((path / "meta.json").read_text())
+            if meta.get("format") != MATRIX_FORMAT or meta.get("version") != version:
+                return None
+
+            def _load(name):
+                return np.load(path / f"{name}.npy", mmap_mode="r")
+
+            def _matrix(name):
+                if (path / f"{name}.npy").exists():
+                    return _load(name)
+                return sparse.csr_matrix(
+                    (_load(f"{name}_data"), _load(f"{name}_indices"), _load(f"{name}_indptr")),
+                    shape=tuple(meta["shape"]),
+                )
+
+            return cls(_matrix("row_counts"), _load("neighbor_idx"), _load("neighbor_count"))
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def matrix_path(db_path) -> Path:
+    """Directory holding the persisted CooccurrenceMatrix, next to the DB."""
+    path = Path(db_path)
+    return path.with_name(f"{path.stem}.cooccurrence")
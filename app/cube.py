@@ -0,0 +1,205 @@
+"""
+cube.py
+---------
+Sparse count cube: condition rows counted per chemical × pH bin ×
+log-concentration bin, one cube per concentration unit (mM, %).
+
+Base bins are fine: pH in steps of 0.05 over [0, 14), concentration in
+CONC_PER_DECADE log-spaced bins per decade over [1e-4, 1e6), plus a bin for
+rows without a pH and bins for rows without (or with a non-positive)
+concentration. Values outside the ranges fall into the outer bins. Only
+non-empty cells are stored, grouped by chemical like SortedValues:
+
+    cells    int32    ph_bin · N_CONC + conc_bin, ascending within a chemical
+    counts   int64    rows in the cell
+    offsets  int64    chemical i owns cells[offsets[i]:offsets[i + 1]]
+
+Coarser views are sums of base bins and never touch rows: pH histograms at
+multiples of 0.25 (the dashboard's width), log-concentration histograms at any divisor of
+CONC_PER_DECADE, pH × concentration heatmaps, and range counts.
+"""
+
+import numpy as np
+import pandas as pd
+
+from app.distribution import SortedDistribution
+from app.indexes import ChemicalIndex
+
+PH_PER_UNIT = 20                 # pH base bin = 1 / 20 = 0.05
+PH_MAX = 14
+N_PH = PH_MAX * PH_PER_UNIT      # pH bins; bin N_PH = no pH
+CONC_PER_DECADE = 20
+CONC_LOG_MIN, CONC_LOG_MAX = -4, 6
+N_CONC_LOG = (CONC_LOG_MAX - CONC_LOG_MIN) * CONC_PER_DECADE
+CONC_MISSING, CONC_NONPOSITIVE = 0, 1
+N_CONC = N_CONC_LOG + 2          # conc bins: missing, ≤ 0, then the log bins
+
+
+def ph_bins(ph: np.ndarray) -> np.ndarray:
+    """pH base bin of each value (N_PH for NaN)."""
+    ph = np.asarray(ph, dtype=np.float64)
+    out = np.full(len(ph), N_PH, dtype=np.int64)
+    has = ~np.isnan(ph)
+    # × 20 rather than ÷ 0.05: multiples of 0.05 that are binary fractions (7.25) land exactly
+    out[has] = np.clip(np.floor(ph[has] * PH_PER_UNIT), 0, N_PH - 1)
+    return out
+
+
+def conc_bins(x: np.ndarray) -> np.ndarray:
+    """Concentration base bin of each value (CONC_MISSING for NaN, CONC_NONPOSITIVE for ≤ 0)."""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), CONC_MISSING, dtype=np.int64)
+    pos = x > 0
+    out[~np.isnan(x) & ~pos] = CONC_NONPOSITIVE
+    log = (np.log10(x[pos]) - CONC_LOG_MIN) * CONC_PER_DECADE
+    out[pos] = 2 + np.clip(np.floor(log), 0, N_CONC_LOG - 1)
+    return out
+
+
+def _aggregate(chem: np.ndarray, cells: np.ndarray, weights: np.ndarray, n_chem: int):
+    """(cells, counts, offsets) of the distinct (chemical, cell) pairs, weights summed."""
+    key, inverse = np.unique(chem * (N_CONC * (N_PH + 1)) + cells, return_inverse=True)
+    counts = np.bincount(inverse, weights=weights).astype(np.int64)
+    chem_of = key // (N_CONC * (N_PH + 1))
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(chem_of, minlength=n_chem))])
+    return (key % (N_CONC * (N_PH + 1))).astype(np.int32), counts, offsets
+
+
+class CountCube:
+    """Sparse chemical × pH × concentration counts of one concentration column."""
+
+    def __init__(self, df: pd.DataFrame, chemicals: ChemicalIndex, column: str):
+        n_chem = len(chemicals.chemicals)
+        n = int(chemicals.offsets[-1])  # rows with a chemical
+        chem = np.repeat(np.arange(n_chem), np.diff(chemicals.offsets))
+        ph = df["pH_numeric"].to_numpy()[:n] if "pH_numeric" in df.columns else np.full(n, np.nan)
+        x = df[column].to_numpy()[:n] if column in df.columns else np.full(n, np.nan)
+        cells = ph_bins(ph) * N_CONC + conc_bins(x)
+        self.cells, self.counts, self.offsets = _aggregate(chem, cells, np.ones(n), n_chem)
+        self._pos = chemicals._pos
+
+    @classmethod
+    def from_arrays(cls, cells: np.ndarray, counts: np.ndarray, offsets: np.ndarray, chemicals: ChemicalIndex):
+        """Rebuild from saved arrays (same chemical order as `chemicals`)."""
+        cube = cls.__new__(cls)
+        cube.cells, cube.counts, cube.offsets, cube._pos = cells, counts, offsets, chemicals._pos
+        return cube
+
+    def appended(self, ph: np.ndarray, x: np.ndarray, chem: np.ndarray, chemicals: ChemicalIndex) -> "CountCube":
+        """
+        Cube with new rows counted in: their pH, concentration and chemical
+        codes (in `chemicals`, which may list new chemicals after the
+        existing ones). Rows without a chemical are skipped.
+        """
+        keep = chem >= 0
+        n_chem = len(chemicals.chemicals)
+        old_chem = np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))
+        cells, counts, offsets = _aggregate(
+            np.concatenate([old_chem, chem[keep]]),
+            np.concatenate([self.cells.astype(np.int64), ph_bins(ph[keep]) * N_CONC + conc_bins(x[keep])]),
+            np.concatenate([self.counts, np.ones(int(keep.sum()), dtype=np.int64)]),
+            n_chem,
+        )
+        return CountCube.from_arrays(cells, counts, offsets, chemicals)
+
+    @property
+    def nbytes(self) -> int:
+        return self.cells.nbytes + self.counts.nbytes + self.offsets.nbytes
+
+    # --- query API ---
+    def _slice(self, chem=None):
+        """(ph_bin, conc_bin, counts) of `chem`'s cells, or of all chemicals' for None."""
+        if chem is None:
+            cells, counts = self.cells, self.counts
+        else:
+            i = self._pos.get(chem)
+            if i is None:
+                return (np.empty(0, dtype=np.int64),) * 3
+            cells, counts = self.cells[self.offsets[i]:self.offsets[i + 1]], self.counts[self.offsets[i]:self.offsets[i + 1]]
+        cells = cells.astype(np.int64)
+        return cells // N_CONC, cells % N_CONC, counts
+
+    def total(self, chem=None, ph=None, conc=None) -> int:
+        """
+        Rows of `chem` (all chemicals for None) whose pH lies in `ph` = (lo, hi)
+        and concentration in `conc` = (lo, hi), at base-bin resolution: every
+        base bin overlapping a range counts. None leaves an axis unfiltered.
+        """
+        p, c, counts = self._slice(chem)
+        keep = np.ones(len(counts), dtype=bool)
+        if ph is not None:
+            lo, hi = ph_bins([ph[0]])[0], np.ceil(ph[1] * PH_PER_UNIT) - 1
+            keep &= (p >= lo) & (p <= hi) & (p < N_PH)
+        if conc is not None:
+            lo = conc_bins([conc[0]])[0]
+            hi = 1 + np.ceil((np.log10(conc[1]) - CONC_LOG_MIN) * CONC_PER_DECADE) if conc[1] > 0 else 1
+            keep &= (c >= max(lo, 2)) & (c <= hi)
+        return int(counts[keep].sum())
+
+    def ph_histogram(self, chem, bin_width: float):
+        """
+        (left_edges, counts) of the non-empty pH bins of width `bin_width`
+        aligned at multiples of it, as indexes.sorted_histogram returns them.
+        Only for multiples of 0.25, whose edges are exact binary fractions
+        (sorted_histogram's edges for e.g. 0.05 carry rounding error that
+        can move a value to the neighbouring bin); None for other widths.
+        """
+        ratio = bin_width * PH_PER_UNIT
+        if abs(bin_width * 4 - round(bin_width * 4)) > 1e-9 or round(ratio) < 1:
+            return None
+        p, _, counts = self._slice(chem)
+        has = p < N_PH
+        coarse = np.bincount(p[has] // round(ratio), weights=counts[has]).astype(np.int64)
+        bins = np.flatnonzero(coarse)
+        if len(bins) == 0:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        start = bins[0] * bin_width
+        return start + (bins - bins[0]) * bin_width, coarse[bins]
+
+    def conc_histogram(self, chem=None, per_decade: int = CONC_PER_DECADE):
+        """
+        (bin_edges, counts) over the log-concentration range with
+        `per_decade` bins per decade (a divisor of CONC_PER_DECADE); rows
+        without a positive concentration are left out.
+        """
+        step = CONC_PER_DECADE // per_decade
+        _, c, counts = self._slice(chem)
+        has = c >= 2
+        hist = np.bincount((c[has] - 2) // step, weights=counts[has], minlength=N_CONC_LOG // step)
+        edges = 10.0 ** (CONC_LOG_MIN + np.arange(N_CONC_LOG // step + 1) / per_decade)
+        return edges, hist.astype(np.int64)
+
+    def heatmap(self, chem=None, ph_step: float = 0.25, per_decade: int = 5):
+        """
+        pH × log-concentration counts of `chem` (all chemicals for None):
+        (ph_edges, conc_edges, z) with z[i, j] the rows in pH bin i and
+        concentration bin j. Rows missing either value are left out.
+        """
+        ph_ratio, step = int(round(ph_step * PH_PER_UNIT)), CONC_PER_DECADE // per_decade
+        p, c, counts = self._slice(chem)
+        has = (p < N_PH) & (c >= 2)
+        n_ph, n_conc = N_PH // ph_ratio, N_CONC_LOG // step
+        z = np.bincount((p[has] // ph_ratio) * n_conc + (c[has] - 2) // step,
+                        weights=counts[has], minlength=n_ph * n_conc).reshape(n_ph, n_conc)
+        ph_edges = np.arange(n_ph + 1) * ph_step
+        conc_edges = 10.0 ** (CONC_LOG_MIN + np.arange(n_conc + 1) / per_decade)
+        return ph_edges, conc_edges, z.astype(np.int64)
+
+
+class CubeDistribution(SortedDistribution):
+    """
+    One chemical's pH values whose histograms are summed from the count
+    cube. Falls back to the sorted values for widths the base bins cannot
+    form or values outside the cube's pH range.
+    """
+
+    def __init__(self, values, cube: CountCube, chem):
+        super().__init__(values)
+        self._cube, self._chem = cube, chem
+
+    def histogram(self, bin_width: float):
+        if len(self) and 0 <= self._v[0] and self._v[-1] < PH_MAX:
+            hist = self._cube.ph_histogram(self._chem, bin_width)
+            if hist is not None:
+                return hist
+        return super().histogram(bin_width)
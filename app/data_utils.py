@@ -7,14 +7,76 @@ Handles database loading and small preprocessing helpers for crystallization EDA
 from pathlib import Path
 import os
 import sqlite3
+import numpy as np
 import pandas as pd
 import plotly.express as px
 
+from app.snapshot import db_fingerprint, dataset_version, snapshot_path, read_snapshot, write_snapshot
+
 # Default: look for data/CrystallizationEDA.db relative to project root
 ROOT_DIR = Path(__file__).resolve().parents[1]
 DEFAULT_DB_PATH = ROOT_DIR / "data" / "CrystallizationEDA.db"
 TABLE = "conditions"
 
+# Columns the dashboard uses and how they are held in memory. Low-cardinality
+# strings become categories; floats become float32 only where that is
+# lossless, since concentrations are displayed and binned at full precision.
+# Bump SCHEMA_VERSION when this changes so snapshots and caches built with the
+# old schema are dropped.
+SCHEMA = {
+    "Protein_ID": "category",
+    "Standardized_Precipitate": "category",
+    "CID": "category",
+    "Concentration": "category",
+    "Concentration_Value": "float",
+    "Concentration_Unit": "category",
+    "Concentration_Converted": "float",
+    "pH": "category",
+}
+SCHEMA_VERSION = 4  # 2: FASTA → SequenceStore; 3: pH_numeric/pH_status; 4: conc_mM/conc_pct/conc_unit
+
+
+def _downcast_float(s: pd.Series) -> pd.Series:
+    """float32 if every value survives the float64 → float32 round trip exactly."""
+    x = pd.to_numeric(s, errors="coerce").astype(np.float64)
+    x32 = x.astype(np.float32)
+    exact = (x32.to_numpy(np.float64) == x.to_numpy()) | x.isna().to_numpy()
+    return x32 if exact.all() else x
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the loaded columns to their SCHEMA dtypes."""
+    for col, kind in SCHEMA.items():
+        if col not in df.columns:
+            continue
+        df[col] = _downcast_float(df[col]) if kind == "float" else df[col].astype(kind)
+    return df
+
+
+def report_memory(df: pd.DataFrame) -> None:
+    """Print per-column resident memory of the loaded frame."""
+    usage = df.memory_usage(deep=True, index=False)
+    print(f"[INFO] Loaded {len(df):,} rows, {usage.sum() / 1e6:.1f} MB in memory")
+    for col, nbytes in usage.items():
+        print(f"[INFO]   {col:<26} {str(df[col].dtype):<10} {nbytes / 1e6:>9.2f} MB")
+
+
+def get_db_path() -> str:
+    """DB_PATH env var if set (Render deployment), else DEFAULT_DB_PATH."""
+    return os.environ.get("DB_PATH", str(DEFAULT_DB_PATH))
+
+
+def current_fingerprint(db_path) -> dict:
+    """DB fingerprint plus SCHEMA_VERSION: what every derived artifact is keyed on."""
+    return {**db_fingerprint(db_path), "schema": SCHEMA_VERSION}
+
+
+def read_conditions(conn: sqlite3.Connection, table: str = TABLE, where: str = "", params=()) -> pd.DataFrame:
+    """Read the SCHEMA columns of `table` (optionally filtered by `where`) and prepare them."""
+    available = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    cols = ", ".join(f'"{c}"' for c in SCHEMA if c in available)
+    return prepare_frame(pd.read_sql(f"SELECT {cols} FROM {table} {where}", conn, params=params))
+
 
 def load_data(table: str = TABLE) -> pd.DataFrame:
     """
@@ -23,54 +85,182 @@ def load_data(table: str = TABLE) -> pd.DataFrame:
     - Uses DB_PATH env var if set (Render deployment).
     - Falls back to DEFAULT_DB_PATH locally.
     - If no DB found, return empty DataFrame so app can still boot.
+    - Reuses the Arrow snapshot next to the DB while the DB is unchanged
+      (set DB_SNAPSHOT=0 to always read from SQLite).
+    - Selects only the SCHEMA columns, applies their dtypes and adds the
+      derived columns (parsed pH, normalized concentrations).
+    - df.attrs["version"] identifies the DB contents, for cache keys, and
+      df.attrs["db_path"] where it came from (derived artifacts live next to it).
     """
-    db_path = os.environ.get("DB_PATH", str(DEFAULT_DB_PATH))
+    db_path = get_db_path()
 
     if not Path(db_path).exists():
         print(f"[WARN] Database not found at {db_path}. Starting with empty DataFrame.")
         # Minimal empty schema so the app doesn't break
-        return pd.DataFrame(columns=["Protein_ID", "Standardized_Precipitate"])
+        df = pd.DataFrame(columns=["Protein_ID", "Standardized_Precipitate"])
+        df.attrs.update(version="empty", db_path=None)
+        return df
+
+    use_snapshot = os.environ.get("DB_SNAPSHOT", "1") != "0"
+    fingerprint = current_fingerprint(db_path)
+    snap = snapshot_path(db_path, table)
+    df = read_snapshot(snap, fingerprint) if use_snapshot else None
 
-    with sqlite3.connect(db_path) as conn:
-        df = pd.read_sql(f"SELECT * FROM {table}", conn)
+    if df is None:
+        with sqlite3.connect(db_path) as conn:
+            df = read_conditions(conn, table)
+        if use_snapshot:
+            write_snapshot(df, snap, fingerprint)
+
+    report_memory(df)
+    df.attrs.update(version=dataset_version(fingerprint), db_path=db_path)
     return df
 
 
+# pH parse status codes (stored in the pH_status column)
+PH_NUMBER, PH_PREFIXED, PH_RANGE, PH_MISSING, PH_INVALID = range(5)
+_PH_PATTERN = (
+    r"^(?P<prefix>PH\s*[:=]?\s*)?"
+    r"(?P<lo>[-+]?(?:\d+(?:\.\d*)?|\.\d+))"
+    r"(?:\s*(?:-|–|TO)\s*(?P<hi>\d+(?:\.\d*)?|\.\d+))?$"
+)
+
+
+def _parse_ph_strings(values: pd.Series):
+    """Vectorized parse of distinct pH strings → (float32 values, int8 status)."""
+    text = values.astype("string").str.strip().str.upper()
+    parts = text.str.extract(_PH_PATTERN)
+    lo = pd.to_numeric(parts["lo"], errors="coerce").to_numpy(np.float64)
+    hi = pd.to_numeric(parts["hi"], errors="coerce").to_numpy(np.float64)
+    is_range = ~np.isnan(hi)
+    ph = np.where(is_range, (lo + hi) / 2, lo).astype(np.float32)
+
+    status = np.full(len(values), PH_INVALID, dtype=np.int8)
+    status[~np.isnan(lo)] = PH_NUMBER
+    status[parts["prefix"].notna().to_numpy() & ~np.isnan(lo)] = PH_PREFIXED
+    status[is_range & ~np.isnan(lo)] = PH_RANGE
+    missing = (text.isna() | (text == "")).to_numpy()
+    status[missing] = PH_MISSING
+    return ph, status
+
+
+def parse_ph(series: pd.Series):
+    """
+    Parse pH strings such as 'PH 7.5', '7.5' or '7.0-8.0' (range → midpoint).
+
+    Each distinct string is parsed once with a regex extract, then mapped back
+    through integer codes. Returns (float32 pH, NaN if unparsed; int8 status,
+    one of PH_NUMBER / PH_PREFIXED / PH_RANGE / PH_MISSING / PH_INVALID).
+    """
+    codes, uniques = pd.factorize(series, sort=False)
+    ph, status = _parse_ph_strings(pd.Series(np.asarray(uniques, dtype=object)))
+    ph = np.append(ph, np.float32(np.nan))          # code -1 (null) → last slot
+    status = np.append(status, np.int8(PH_MISSING))
+    return ph[codes], status[codes]
+
+
 def parse_ph_series(series: pd.Series) -> pd.Series:
-    """Extract numeric pH from strings like 'PH 7.5' or '7.5'."""
-    def _one(s):
-        if pd.isna(s):
-            return None
-        x = str(s).strip().upper()
-        if x.startswith("PH"):
-            x = x.replace("PH", "").strip()
-        try:
-            return float(x)
-        except Exception:
-            return None
-    return series.apply(_one)
+    """Extract numeric pH from strings like 'PH 7.5', '7.5' or '7.0-8.0'."""
+    ph, _ = parse_ph(series)
+    return pd.Series(ph, index=series.index, name=series.name)
 
 
-def concentration_series_mm_and_pct(d: pd.DataFrame):
+# Concentration unit categories (stored in the conc_unit column)
+CONC_UNITS = ("mM", "M", "uM", "nM", "%", "none", "other")
+UNIT_MM, UNIT_M, UNIT_UM, UNIT_NM, UNIT_PCT, UNIT_NONE, UNIT_OTHER = range(len(CONC_UNITS))
+
+# normalized spelling (lower-case, no spaces, µ → u) → (unit code, factor to mM)
+UNIT_TABLE = {
+    "mm": (UNIT_MM, 1.0),
+    "m": (UNIT_M, 1000.0),
+    "um": (UNIT_UM, 1e-3),
+    "nm": (UNIT_NM, 1e-6),
+    "%": (UNIT_PCT, 1.0),
+    "%w/v": (UNIT_PCT, 1.0),
+    "%(w/v)": (UNIT_PCT, 1.0),
+    "%v/v": (UNIT_PCT, 1.0),
+    "%(v/v)": (UNIT_PCT, 1.0),
+    "%w/w": (UNIT_PCT, 1.0),
+    "%(w/w)": (UNIT_PCT, 1.0),
+    "": (UNIT_NONE, np.nan),
+}
+
+
+def normalize_units(units: pd.Series):
+    """Map unit strings to (int8 unit code, mM factor) via UNIT_TABLE, per distinct value."""
+    codes, uniques = pd.factorize(units, sort=False)
+    keys = (pd.Series(np.asarray(uniques, dtype=object), dtype="string")
+            .str.lower().str.replace(r"\s+", "", regex=True).str.replace("µ", "u").str.replace("μ", "u"))
+    found = [UNIT_TABLE.get(k, (UNIT_OTHER, np.nan)) for k in keys.fillna("")]
+    unit_code = np.array([u for u, _ in found] + [UNIT_NONE], dtype=np.int8)
+    factor = np.array([f for _, f in found] + [np.nan], dtype=np.float64)
+    return unit_code[codes], factor[codes]
+
+
+def normalize_concentrations(df: pd.DataFrame):
     """
-    Return (mm_series, pct_series):
-     - mM = Concentration_Value where unit == 'mm'
-       + Concentration_Converted for any rows whose unit is not 'mm' or '%'
-     - %  = Concentration_Value where unit == '%'
+    Return (conc_mM, conc_pct, conc_unit) for the whole frame:
+     - % units (%, %w/v, %v/v, …): conc_pct = Concentration_Value
+     - mM: conc_mM = Concentration_Value
+     - other molar units (M, µM, nM): Concentration_Converted when present,
+       else Concentration_Value × factor
+     - missing / unknown units: Concentration_Converted (as before)
     """
-    unit = d["Concentration_Unit"].fillna("").astype(str).str.strip()
-    unit_lower = unit.str.lower()
-
-    mm_series = pd.concat(
-        [
-            d.loc[unit_lower == "mm", "Concentration_Value"],
-            d.loc[~unit_lower.isin(["mm", "%"]), "Concentration_Converted"],
-        ],
-        ignore_index=True,
-    )
+    unit, factor = normalize_units(df["Concentration_Unit"])
+    value = pd.to_numeric(df["Concentration_Value"], errors="coerce").to_numpy(np.float64)
+    converted = pd.to_numeric(df["Concentration_Converted"], errors="coerce").to_numpy(np.float64)
+
+    conc_mm = np.full(len(df), np.nan)
+    is_mm = unit == UNIT_MM
+    conc_mm[is_mm] = value[is_mm]
+    molar = np.isin(unit, [UNIT_M, UNIT_UM, UNIT_NM])
+    conc_mm[molar] = np.where(np.isnan(converted[molar]), value[molar] * factor[molar], converted[molar])
+    fallback = np.isin(unit, [UNIT_NONE, UNIT_OTHER])
+    conc_mm[fallback] = converted[fallback]
+
+    conc_pct = np.where(unit == UNIT_PCT, value, np.nan)
+    return conc_mm, conc_pct, unit
+
 
-    pct_series = d.loc[unit == "%", "Concentration_Value"]
-    return mm_series, pct_series
+def add_derived_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Columns computed once at load (and stored in the snapshot)."""
+    if "pH" in df.columns:
+        df["pH_numeric"], df["pH_status"] = parse_ph(df["pH"])
+    if {"Concentration_Unit", "Concentration_Value", "Concentration_Converted"} <= set(df.columns):
+        conc_mm, conc_pct, df["conc_unit"] = normalize_concentrations(df)
+        df["conc_mM"] = _downcast_float(pd.Series(conc_mm, index=df.index))
+        df["conc_pct"] = _downcast_float(pd.Series(conc_pct, index=df.index))
+    return df
+
+
+def prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Project a raw conditions frame onto SCHEMA, apply dtypes and add derived columns."""
+    df = df[[c for c in SCHEMA if c in df.columns]].copy()
+    return add_derived_columns(apply_schema(df))
+
+
+def append_rows(df: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rows of `new` (already through prepare_frame) after those of `df`, with
+    the dtypes a full load of both would have given: categories are unioned
+    and float columns are re-checked for a lossless float32.
+    """
+    if new.empty:
+        return df
+    out = pd.concat([df, new], ignore_index=True)
+    for col in ("conc_mM", "conc_pct"):
+        if col in out.columns:
+            out[col] = _downcast_float(out[col])
+    return apply_schema(out)
+
+
+def concentration_series_mm_and_pct(d: pd.DataFrame):
+    """
+    Return (mm_series, pct_series): the conc_mM and conc_pct columns of `d`
+    (NaN where a row has no value in that unit). Both are normalized once at
+    load by `normalize_concentrations`, so this is a plain column slice.
+    """
+    return d["conc_mM"], d["conc_pct"]
 
 
 def compute_sequence_length(fasta: str) -> int:
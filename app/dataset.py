@@ -0,0 +1,325 @@
+"""
+dataset.py
+------------
+The loaded conditions table together with every lookup structure built from
+it, so callbacks receive one object instead of a growing list of indexes.
+"""
+
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from app.bitmaps import PhBins
+from app.cooccurrence import CooccurrenceIndex, CooccurrenceMatrix, matrix_path
+from app.cube import CountCube, CubeDistribution
+from app.distribution import SortedDistribution
+from app.indexes import CHEM_COL, ChemicalIndex, ProteinIndex, SortedValues
+from app.selection import Query, Selection, evaluate
+from app.sequences import SequenceStore, cached_store, load_sequences
+
+# Dataset.values key → column of sorted per-chemical values
+VALUE_COLUMNS = {"mM": "conc_mM", "%": "conc_pct", "pH": "pH_numeric"}
+CUBE_UNITS = ("mM", "%")  # concentration units with a chemical × pH × concentration count cube
+SELECTION_CACHE = 16  # evaluated Queries kept per Dataset (one interaction fires several callbacks)
+
+
+def mean_sequence_length(totals: pd.DataFrame) -> pd.Series:
+    """seq_total / seq_rows per chemical, NaN where no row has a stored sequence."""
+    total = totals["seq_total"].to_numpy(np.float64)
+    rows = totals["seq_rows"].to_numpy()
+    avg = np.full(len(rows), np.nan)
+    np.divide(total, rows, out=avg, where=rows > 0)
+    return pd.Series(avg, index=totals.index)
+
+
+def _sorted_categorical(categories: pd.Index, codes: np.ndarray) -> pd.Categorical:
+    """Categorical of `codes` into `categories`, with the categories in the order a full load sorts them."""
+    ordered = pd.Categorical(categories).categories
+    remap = np.append(ordered.get_indexer(categories), -1)  # the null code (-1) stays null
+    return pd.Categorical.from_codes(remap[codes], dtype=pd.CategoricalDtype(ordered))
+
+
+class Dataset:
+    """
+    Conditions frame (sorted by chemical) plus its indexes, built once at load.
+
+    `prebuilt` holds structures read from a precomputed bundle (see
+    app.bundle), keyed by attribute name; anything not in it is built here.
+    """
+
+    def __init__(self, df: pd.DataFrame, prebuilt: dict = None):
+        pre = prebuilt or {}
+        self.chemicals = pre["chemicals"] if "chemicals" in pre else ChemicalIndex(df)
+        self.df = self.chemicals.df
+        self.version = self.chemicals.version
+        self.db_path = df.attrs.get("db_path")
+        self.proteins = pre["proteins"] if "proteins" in pre else ProteinIndex(self.df)
+        self.cooccurrence = (pre["cooccurrence"] if "cooccurrence" in pre
+                             else CooccurrenceIndex(self.df, self.chemicals))
+        self.cooccurrence.matrix = pre.get("matrix") or self._cooccurrence_matrix(self.db_path)
+        # per-chemical ascending values for quantiles and histograms
+        self.values = pre.get("values") or {
+            key: SortedValues(self.df, self.chemicals, col) for key, col in VALUE_COLUMNS.items()
+        }
+        # chemical × pH × concentration counts (pH histograms, heatmaps)
+        self.cubes = pre.get("cubes") or {
+            unit: CountCube(self.df, self.chemicals, VALUE_COLUMNS[unit]) for unit in CUBE_UNITS
+        }
+        for name in ("summary", "sequence_totals", "sequences"):
+            if name in pre:
+                setattr(self, name, pre[name])  # fills the cached_property
+        self._selections = {}
+
+    def distribution(self, key: str, chem) -> SortedDistribution:
+        """
+        Values of `chem` (or of a combined selection Query) in the
+        VALUE_COLUMNS column `key`, as the figures consume them.
+        """
+        if isinstance(chem, Query):
+            col = VALUE_COLUMNS[key]
+            if col not in self.df.columns:
+                return SortedDistribution(np.empty(0))
+            v = self.df[col].to_numpy()[self.select(chem).rows]
+            return SortedDistribution(np.sort(v[~np.isnan(v)]))
+        if key == "pH":
+            return CubeDistribution(self.values[key].get(chem), self.cubes["mM"], chem)
+        return SortedDistribution(self.values[key].get(chem))
+
+    def select(self, query: Query) -> Selection:
+        """Rows and proteins matched by `query` (bitmap evaluation, see app.selection)."""
+        selection = self._selections.get(query)
+        if selection is None:
+            selection = evaluate(self, query)
+            if len(self._selections) >= SELECTION_CACHE:
+                self._selections.pop(next(iter(self._selections)), None)
+            self._selections[query] = selection
+        return selection
+
+    @cached_property
+    def ph_bins(self) -> PhBins:
+        """Per-pH-bin row bitmaps, built on the first pH-filtered selection."""
+        ph = self.df["pH_numeric"] if "pH_numeric" in self.df.columns else np.full(len(self.df), np.nan)
+        return PhBins(np.asarray(ph, dtype=np.float64))
+
+    @cached_property
+    def _cooc_code_by_protein_code(self) -> np.ndarray:
+        pid = self.df["Protein_ID"]
+        if not isinstance(pid.dtype, pd.CategoricalDtype):
+            return np.full(1, -1, dtype=np.int64)
+        known = pd.Index(np.asarray(self.cooccurrence.proteins, dtype=str))
+        # trailing -1 so that the null code (-1) maps to "no protein"
+        return np.append(known.get_indexer(pid.cat.categories.astype(str)), -1)
+
+    def row_protein_codes(self, rows: np.ndarray) -> np.ndarray:
+        """Co-occurrence protein code of each of `rows` (-1 without a protein)."""
+        pid = self.df["Protein_ID"]
+        if not isinstance(pid.dtype, pd.CategoricalDtype):
+            return np.full(len(rows), -1, dtype=np.int64)
+        return self._cooc_code_by_protein_code[pid.cat.codes.to_numpy()[rows]]
+
+    def mean_sequence_length(self, rows: np.ndarray) -> float:
+        """Mean stored sequence length over `rows` (NaN if none has one)."""
+        pid = self.df["Protein_ID"]
+        if not isinstance(pid.dtype, pd.CategoricalDtype):
+            return np.nan
+        slots = self._slot_by_protein_code[pid.cat.codes.to_numpy()[rows]]
+        slots = slots[slots >= 0]
+        return float(self.sequences.lengths[slots].mean()) if len(slots) else np.nan
+
+    def protein_conditions(self, protein_id) -> pd.DataFrame:
+        """Condition rows of `protein_id` (case-insensitive), in frame order."""
+        return self.df.take(self.proteins.rows(protein_id))
+
+    @cached_store
+    def sequences(self) -> SequenceStore:
+        """Per-protein FASTA store, opened (or built) on first use."""
+        return load_sequences(self.db_path, self.version)
+
+    @cached_store
+    def _slot_by_protein_code(self) -> np.ndarray:
+        pid = self.df["Protein_ID"]
+        if not isinstance(pid.dtype, pd.CategoricalDtype):
+            return np.empty(0, dtype=np.int64)
+        # trailing -1 so that the null code (-1) maps to "no sequence"
+        return np.append(self.sequences.slots(pid.cat.categories), -1)
+
+    @cached_property
+    def _chemical_codes(self) -> np.ndarray:
+        """Chemical position of every row that has a chemical (the leading rows)."""
+        return np.repeat(np.arange(len(self.chemicals.chemicals)), np.diff(self.chemicals.offsets))
+
+    @cached_property
+    def summary(self) -> pd.DataFrame:
+        """
+        Per-chemical totals, indexed by chemical: condition rows (`count`),
+        distinct proteins (`unique_proteins`) and the first non-null `cid` (str).
+        """
+        chems = self.chemicals.chemicals
+        cid = np.full(len(chems), None, dtype=object)
+        if "CID" in self.df.columns:
+            values = self.df["CID"].iloc[: self.chemicals.offsets[-1]]
+            valid = np.flatnonzero(values.notna().to_numpy())
+            has_cid, first = np.unique(self._chemical_codes[valid], return_index=True)
+            cid[has_cid] = values.to_numpy()[valid[first]].astype(str)
+        return pd.DataFrame({
+            "count": np.diff(self.chemicals.offsets),
+            "unique_proteins": np.diff(self.cooccurrence.B_csc.indptr),
+            "cid": cid,
+        }, index=pd.Index(chems, name="chemical"))
+
+    @cached_store
+    def sequence_totals(self) -> pd.DataFrame:
+        """
+        Per chemical, over its rows whose protein has a stored sequence: the
+        summed sequence length (`seq_total`) and the number of rows (`seq_rows`).
+        """
+        n = len(self.chemicals.chemicals)
+        total, rows = np.zeros(n), np.zeros(n, dtype=np.int64)
+        pid = self.df["Protein_ID"].iloc[: self.chemicals.offsets[-1]]
+        if isinstance(pid.dtype, pd.CategoricalDtype):
+            slots = self._slot_by_protein_code[pid.cat.codes.to_numpy()]
+            has = slots >= 0
+            chem = self._chemical_codes[has]
+            total = np.bincount(chem, weights=self.sequences.lengths[slots[has]], minlength=n)
+            rows = np.bincount(chem, minlength=n)
+        return pd.DataFrame({"seq_total": total, "seq_rows": rows},
+                            index=pd.Index(self.chemicals.chemicals, name="chemical"))
+
+    @cached_store
+    def avg_sequence_length(self) -> pd.Series:
+        """Mean stored sequence length over each chemical's rows (NaN if none has one)."""
+        return mean_sequence_length(self.sequence_totals)
+
+    def appended(self, new: pd.DataFrame, sequences: dict, version: str) -> "Dataset":
+        """
+        This dataset plus the rows `new` (through data_utils.prepare_frame)
+        and their FASTA sequences (Protein_ID → sequence), as `version`.
+
+        Nothing is rebuilt from the full frame: new rows are inserted at the
+        end of their chemical's block (new chemicals come after the existing
+        ones), and every index, count and sorted array takes in only the new
+        rows. The result matches a full rebuild up to the order of chemicals
+        in the indexes; the frame's categorical columns are re-sorted, so
+        sorting on them still follows the values' order.
+        """
+        n, k = len(self.df), len(new)
+        new = new.reset_index(drop=True)
+
+        # merged columns: categories of new values go after the existing ones (positions
+        # in `chemicals` below); the frame gets them sorted (_sorted_categorical)
+        merged = {}
+        for col in self.df.columns:
+            old_col = self.df[col]
+            add = new[col] if col in new.columns else pd.Series([None] * k, dtype=object)
+            if isinstance(old_col.dtype, pd.CategoricalDtype):
+                cats = old_col.cat.categories
+                values = add.astype(object)
+                unseen = pd.Index(pd.unique(values.dropna())).difference(cats, sort=False)
+                if len(unseen):
+                    cats = cats.append(unseen)
+                merged[col] = (cats, np.concatenate([old_col.cat.codes.to_numpy(np.int64),
+                                                     cats.get_indexer(values)]))
+            else:
+                merged[col] = np.concatenate([old_col.to_numpy(), add.to_numpy()])
+
+        # new rows go at the end of their chemical's block, rows without one at the very end
+        cats = merged[CHEM_COL][0]
+        codes = merged[CHEM_COL][1][n:]
+        chemicals = self.chemicals.chemicals + [str(c) for c in cats[len(self.chemicals.chemicals):]]
+        n_chem = len(chemicals)
+        base_offsets = np.concatenate([self.chemicals.offsets,
+                                       np.full(n_chem - len(self.chemicals.chemicals), self.chemicals.offsets[-1])])
+        order = np.argsort(np.where(codes >= 0, codes, n_chem), kind="stable")
+        at = np.where(codes >= 0, base_offsets[codes + 1], n)[order]
+        take = np.insert(np.arange(n), at, n + order)
+        old_to_new = np.arange(n) + np.searchsorted(at, np.arange(n), side="right")
+        new_pos = np.empty(k, dtype=np.int64)
+        new_pos[order] = at + np.arange(k)
+        counts = np.diff(base_offsets) + np.bincount(codes[codes >= 0], minlength=n_chem)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        # the gathered arrays are fresh: copy=False skips consolidating them into 2-D blocks
+        df = pd.DataFrame({
+            col: _sorted_categorical(m[0], m[1][take]) if isinstance(m, tuple) else m[take]
+            for col, m in merged.items()
+        }, copy=False)
+        df.attrs.update(self.df.attrs, version=version)
+        chem_index = ChemicalIndex.from_arrays(df, chemicals, offsets, version)
+
+        pid = new["Protein_ID"] if "Protein_ID" in new.columns else pd.Series([None] * k, dtype=object)
+        has_pid = pid.notna().to_numpy()
+        proteins = self.proteins.appended(old_to_new, pid[has_pid].to_numpy(), new_pos[has_pid])
+        cooc, changed = self.cooccurrence.appended(chem_index, pid.to_numpy(), codes)
+        matrix = self.cooccurrence.matrix.updated(self.cooccurrence, cooc, changed)
+        values = {
+            key: self.values[key].appended(
+                new[col].to_numpy(df[col].dtype) if col in new.columns else np.full(k, np.nan), codes, chem_index)
+            for key, col in VALUE_COLUMNS.items()
+        }
+        ph = new["pH_numeric"].to_numpy(np.float64) if "pH_numeric" in new.columns else np.full(k, np.nan)
+        cubes = {
+            unit: self.cubes[unit].appended(
+                ph, new[VALUE_COLUMNS[unit]].to_numpy(np.float64) if VALUE_COLUMNS[unit] in new.columns
+                else np.full(k, np.nan), codes, chem_index)
+            for unit in CUBE_UNITS
+        }
+
+        # summary: counts follow from the offsets and B; CIDs only fill gaps
+        cid = np.concatenate([self.summary["cid"].to_numpy(), np.full(n_chem - len(self.summary), None)])
+        if "CID" in new.columns:
+            valid = np.flatnonzero(new["CID"].notna().to_numpy() & (codes >= 0))
+            has_cid, first = np.unique(codes[valid], return_index=True)
+            gap = pd.isna(cid[has_cid])
+            cid[has_cid[gap]] = new["CID"].to_numpy()[valid[first[gap]]].astype(str)
+        summary = pd.DataFrame({
+            "count": counts,
+            "unique_proteins": np.diff(cooc.B_csc.indptr),
+            "cid": cid,
+        }, index=pd.Index(chemicals, name="chemical"))
+
+        # sequence totals: new rows, plus old rows of proteins that only now got a sequence
+        store = self.sequences.extended(sequences)
+        total = np.zeros(n_chem)
+        rows = np.zeros(n_chem, dtype=np.int64)
+        total[:len(self.summary)] = self.sequence_totals["seq_total"].to_numpy()
+        rows[:len(self.summary)] = self.sequence_totals["seq_rows"].to_numpy()
+        slots = store.slots(pid.astype(str).to_numpy())
+        has = has_pid & (slots >= 0) & (codes >= 0)
+        total += np.bincount(codes[has], weights=store.lengths[slots[has]], minlength=n_chem)
+        rows += np.bincount(codes[has], minlength=n_chem)
+        if len(store) > len(self.sequences):
+            gained = self.cooccurrence.proteins
+            gained_slots = store.slots(np.asarray(gained, dtype=str))
+            was = self.sequences.slots(np.asarray(gained, dtype=str))
+            newly = np.flatnonzero((gained_slots >= 0) & (was < 0))
+            W = self.cooccurrence.W[newly]
+            per_chem = np.asarray(W.sum(axis=0)).ravel()
+            weighted = np.asarray(W.T @ store.lengths[gained_slots[newly]]).ravel()
+            rows[:len(per_chem)] += per_chem.astype(np.int64)
+            total[:len(weighted)] += weighted
+        sequence_totals = pd.DataFrame({"seq_total": total, "seq_rows": rows},
+                                       index=pd.Index(chemicals, name="chemical"))
+
+        return Dataset(df, prebuilt={
+            "chemicals": chem_index,
+            "proteins": proteins,
+            "cooccurrence": cooc,
+            "matrix": matrix,
+            "values": values,
+            "summary": summary,
+            "sequence_totals": sequence_totals,
+            "sequences": store,
+            "cubes": cubes,
+        })
+
+    def _cooccurrence_matrix(self, db_path):
+        """Memory-map the persisted global matrix, or build (and persist) it."""
+        if db_path:
+            matrix = CooccurrenceMatrix.load(matrix_path(db_path), self.version)
+            if matrix is not None:
+                return matrix
+        matrix = CooccurrenceMatrix.build(self.cooccurrence)
+        if db_path:
+            matrix.save(matrix_path(db_path), self.version)
+        return matrix
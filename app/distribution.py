@@ -0,0 +1,62 @@
+"""
+distribution.py
+-----------------
+One chemical's values of one column, as the figures consume them: size,
+extent, quantiles, histogram counts and the inputs of the KDE.
+
+The figure code only talks to this interface, so the same figures can be
+drawn from an in-memory sorted array (SortedDistribution, pandas engine) or
+from aggregates computed in SQL (app.sqlengine.SqlDistribution).
+"""
+
+import numpy as np
+
+from app.indexes import sorted_histogram, sorted_quantile
+
+KDE_CHUNK = 262_144          # samples binned per step (bounds temporaries)
+
+
+def linear_bin(x: np.ndarray, lo: float, dx: float, bins: int) -> np.ndarray:
+    """
+    Linear binning onto the grid lo + i·dx (i < bins): each sample is split
+    between its two neighbouring nodes. Chunked, so memory is O(bins).
+    """
+    weights = np.zeros(bins)
+    for start in range(0, x.size, KDE_CHUNK):
+        pos = (x[start:start + KDE_CHUNK] - lo) / dx
+        left = np.clip(np.floor(pos).astype(np.int64), 0, bins - 2)
+        frac = pos - left
+        weights += np.bincount(left, weights=1.0 - frac, minlength=bins)
+        weights += np.bincount(left + 1, weights=frac, minlength=bins)
+    return weights
+
+
+class SortedDistribution:
+    """Distribution over an ascending, NaN-free array (e.g. SortedValues.get)."""
+
+    def __init__(self, values):
+        self._v = np.asarray(values)
+
+    def __len__(self) -> int:
+        return len(self._v)
+
+    def values(self) -> np.ndarray:
+        """All values, ascending."""
+        return self._v
+
+    def extent(self) -> tuple[float, float]:
+        return float(self._v[0]), float(self._v[-1])
+
+    def quantile(self, q: float) -> float:
+        return sorted_quantile(self._v, q)
+
+    def histogram(self, bin_width: float):
+        """(left_edges, counts) of non-empty bins aligned at multiples of `bin_width`."""
+        return sorted_histogram(self._v, bin_width)
+
+    def std(self) -> float:
+        """Population standard deviation (in float64)."""
+        return float(np.std(self._v.astype(np.float64)))
+
+    def linear_bins(self, lo: float, dx: float, bins: int) -> np.ndarray:
+        return linear_bin(self._v.astype(np.float64), lo, dx, bins)
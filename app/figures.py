@@ -5,11 +5,16 @@ Figure helper functions for Crystallization EDA dashboard.
 All figures use dark theme (plotly_dark) to match SLATE Bootstrap theme.
 """
 
+import os
+
 import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
+from app.distribution import SortedDistribution, linear_bin
+from app.typed_arrays import smallest_float, smallest_uint, typed_array
+
 
 # --------------------
 # Empty placeholder fig
@@ -33,43 +38,134 @@ def empty_fig(title: str):
 # --------------------
 # Lightweight KDE
 # --------------------
-def kde_curve(x: np.ndarray, points: int = 200):
-    """Lightweight Gaussian KDE (no SciPy)."""
+KDE_EXACT_MAX_N = 2_000      # above this, "auto" switches to the binned engine
+KDE_FINE_BINS = 2_048        # resolution of the binned engine's internal grid
+
+
+def _kde_exact(x: np.ndarray, h: float, grid: np.ndarray) -> np.ndarray:
+    """Dense Gaussian KDE: O(points × n) time and memory."""
+    diff = grid[:, None] - x[None, :]
+    kernel = np.exp(-0.5 * (diff / h) ** 2) / (np.sqrt(2 * np.pi) * h)
+    return kernel.mean(axis=1)
+
+
+def _kde_binned(weights: np.ndarray, n: int, h: float, grid: np.ndarray) -> np.ndarray:
+    """
+    Gaussian KDE via linear binning + FFT convolution.
+
+    `weights` are the n samples spread onto a fine regular grid spanning
+    `grid` (see distribution.linear_bin); they are convolved with the sampled
+    kernel in the frequency domain, and the result is interpolated onto
+    `grid`. Memory is O(bins) whatever n is.
+    """
+    bins = len(weights)
+    lo, hi = grid[0], grid[-1]
+    dx = (hi - lo) / (bins - 1)
+
+    # Kernel support is capped by the grid span: no grid node is further away.
+    k = int(min(np.ceil(6 * h / dx), bins - 1))
+    offsets = np.arange(-k, k + 1) * dx
+    kernel = np.exp(-0.5 * (offsets / h) ** 2) / (np.sqrt(2 * np.pi) * h)
+
+    nfft = 1 << int(np.ceil(np.log2(bins + 2 * k + 1)))
+    conv = np.fft.irfft(np.fft.rfft(weights, nfft) * np.fft.rfft(kernel, nfft), nfft)
+    fine = conv[k:k + bins] / n
+    return np.interp(grid, lo + np.arange(bins) * dx, np.maximum(fine, 0.0))
+
+
+def kde_curve(x: np.ndarray, points: int = 200, method: str = "auto"):
+    """
+    Lightweight Gaussian KDE (no SciPy).
+
+    method: "exact" (dense kernel matrix), "binned" (FFT, memory independent
+    of n) or "auto" (exact up to KDE_EXACT_MAX_N samples, binned above).
+    """
     x = np.asarray(x, dtype=float)
     x = x[~np.isnan(x)]
     if x.size < 2:
         return None, None
-    std = np.std(x)
+    return _kde(x.size, np.std(x), x.min(), x.max(), points, method,
+                lambda: x, lambda lo, dx, bins: linear_bin(x, lo, dx, bins))
+
+
+def distribution_kde(dist, points: int = 200):
+    """kde_curve(dist.values()) computed from the distribution's aggregates where possible."""
+    if len(dist) < 2:
+        return None, None
+    lo, hi = dist.extent()
+    return _kde(len(dist), dist.std(), lo, hi, points, "auto", dist.values, dist.linear_bins)
+
+
+def _kde(n, std, lo, hi, points, method, values, linear_bins):
+    """KDE on `points` nodes over [lo, hi]: exact from values(), or binned from linear_bins(lo, dx, bins)."""
     if std == 0:
         return None, None
-    n = len(x)
     h = 1.06 * std * (n ** (-1 / 5))
-    grid = np.linspace(x.min(), x.max(), points)
-    diff = grid[:, None] - x[None, :]
-    kernel = np.exp(-0.5 * (diff / h) ** 2) / (np.sqrt(2 * np.pi) * h)
-    density = kernel.mean(axis=1)
+    grid = np.linspace(lo, hi, points)
+    if method == "auto":
+        method = "exact" if n <= KDE_EXACT_MAX_N else "binned"
+    if method == "exact":
+        density = _kde_exact(np.asarray(values(), dtype=float), h, grid)
+    else:
+        bins = KDE_FINE_BINS
+        density = _kde_binned(linear_bins(grid[0], (grid[-1] - grid[0]) / (bins - 1), bins), n, h, grid)
     return grid, density
 
 
+# --------------------
+# Histogram traces
+# --------------------
+# "server": bin with NumPy and ship edges/counts as a bar trace (payload O(bins))
+# "client": ship raw samples in a go.Histogram and let the browser bin them
+HISTOGRAM_MODE = os.environ.get("HISTOGRAM_MODE", "server")
+
+
+def as_distribution(values):
+    """`values` if it already is a distribution (see app.distribution), else one over the ascending array."""
+    return values if hasattr(values, "histogram") else SortedDistribution(values)
+
+
+def histogram_trace(values, bin_width: float, gap: float = 0.0, mode: str = None):
+    """Histogram trace for `values` (ascending, NaN-free, or a distribution) in the configured mode."""
+    dist = as_distribution(values)
+    style = dict(marker=dict(line=dict(width=0)), opacity=0.85, name="Counts", marker_color="lightskyblue")
+    if (mode or HISTOGRAM_MODE) == "client":
+        return go.Histogram(x=dist.values(), xbins=dict(size=bin_width), **style)
+    left, counts = dist.histogram(bin_width)
+    return go.Bar(x=left + bin_width / 2, y=counts, width=bin_width * (1 - gap), **style)
+
+
+def iqr_focus_range(v):
+    """x-range [max(min, Q1 − 1.5·IQR), min(max, Q3 + 1.5·IQR)] of an ascending array or distribution, or None."""
+    dist = as_distribution(v)
+    if len(dist) < 3:
+        return None
+    q1, q3 = dist.quantile(0.25), dist.quantile(0.75)
+    lo, hi = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    if lo < hi:
+        v_min, v_max = dist.extent()
+        return [max(v_min, lo), min(v_max, hi)]
+    return None
+
+
 # --------------------
 # Histograms with KDE overlay
 # --------------------
 def make_hist_with_kde_binwidth(series, title, xaxis, bin_width, focus_iqr, logy):
-    s = pd.to_numeric(series, errors="coerce").dropna()
-    if s.empty:
+    """
+    Histogram + scaled KDE. `series` is a distribution (see app.distribution);
+    anything else is coerced, cleaned and sorted first.
+    """
+    if hasattr(series, "histogram"):
+        s = series
+    else:
+        s = SortedDistribution(np.sort(pd.to_numeric(series, errors="coerce").dropna().to_numpy()))
+    if len(s) == 0:
         return empty_fig(title)
 
     bw = float(bin_width) if bin_width and bin_width > 0 else (1.0 if xaxis == "mM" else 0.25)
 
-    hist = go.Histogram(
-        x=s,
-        xbins=dict(size=bw),
-        marker=dict(line=dict(width=0)),
-        opacity=0.85,
-        name="Counts",
-        marker_color="lightskyblue",
-    )
-    fig = go.Figure(hist)
+    fig = go.Figure(histogram_trace(s, bw, gap=0.02))
     fig.update_layout(
         template="plotly_dark",
         title=title,
@@ -79,22 +175,17 @@ def make_hist_with_kde_binwidth(series, title, xaxis, bin_width, focus_iqr, logy
         bargap=0.02,
     )
 
-    gx, gy = kde_curve(s.values)
+    gx, gy = distribution_kde(s)
     if gx is not None and gy is not None and np.all(np.isfinite(gy)):
-        data_range = s.max() - s.min()
-        approx_bins = max(int(round(data_range / bw)), 1)
-        approx_bin_height = len(s) / approx_bins if approx_bins > 0 else len(s)
         fig.add_trace(go.Scatter(
-            x=gx, y=gy * approx_bin_height, mode="lines",
+            x=gx, y=gy * kde_bin_height(len(s), s.extent(), bw), mode="lines",
             name="KDE", line=dict(width=2, color="cyan")
         ))
 
-    if focus_iqr and len(s) >= 3:
-        q1, q3 = s.quantile(0.25), s.quantile(0.75)
-        iqr = q3 - q1
-        lo, hi = q1 - 1.5 * iqr, q3 + 1.5 * iqr
-        if lo < hi:
-            fig.update_xaxes(range=[max(s.min(), lo), min(s.max(), hi)])
+    if focus_iqr:
+        x_range = iqr_focus_range(s)
+        if x_range:
+            fig.update_xaxes(range=x_range)
 
     if logy:
         fig.update_yaxes(type="log")
@@ -102,24 +193,71 @@ def make_hist_with_kde_binwidth(series, title, xaxis, bin_width, focus_iqr, logy
     return fig
 
 
+def kde_bin_height(n: int, extent, bin_width: float) -> float:
+    """Scale of the KDE overlay: samples per bin if they were spread evenly over the extent."""
+    approx_bins = max(int(round((extent[1] - extent[0]) / bin_width)), 1)
+    return n / approx_bins
+
+
+def rebin_data(series, title, xaxis, bin_width) -> dict:
+    """
+    What the browser needs to redraw make_hist_with_kde_binwidth at any bin
+    width, with or without IQR focus (REBIN_MODE=client, assets/rebin.js):
+
+        figure    the figure at `bin_width` without IQR focus, its bar and
+                  KDE y values left out
+        values    distinct values, ascending, as a typed array (float32 when lossless)
+        counts    their multiplicities (None when all are 1)
+        n         number of values
+        extent    [min, max]
+        iqr       IQR focus range, or None
+        kde       KDE density on the figure's KDE x grid, or None
+
+    An empty selection ships only its placeholder figure.
+    """
+    s = as_distribution(series)
+    if len(s) == 0:
+        return {"figure": empty_fig(title)}
+    fig = make_hist_with_kde_binwidth(s, title, xaxis, bin_width, focus_iqr=False, logy=False).to_plotly_json()
+    for key in ("x", "y", "width"):
+        fig["data"][0].pop(key, None)
+    kde = None
+    if len(fig["data"]) > 1:
+        kde = distribution_kde(s)[1]
+        fig["data"][1].pop("y", None)
+
+    v = np.asarray(s.values(), dtype=np.float64)
+    first = np.flatnonzero(np.concatenate([[True], v[1:] != v[:-1]]))
+    counts = np.diff(np.append(first, len(v)))
+    return {
+        "figure": fig,
+        "values": typed_array(v[first], smallest_float(v[first])),
+        "counts": typed_array(counts, smallest_uint(counts)) if len(first) < len(v) else None,
+        "n": len(v),
+        "extent": list(s.extent()),
+        "iqr": iqr_focus_range(s),
+        "kde": typed_array(kde, "f8") if kde is not None else None,
+    }
+
+
 # --------------------
 # Co-occurrence figures
 # --------------------
-def cooccurrence_heatmap_and_topbar(df_all, d_sel, selected, top_k=15):
-    co_df = df_all[
-        (df_all["Protein_ID"].isin(d_sel["Protein_ID"]))
-        & (df_all["Standardized_Precipitate"] != selected)
-    ].copy()
+def cooccurrence_heatmap_and_topbar(cooc, selected, top_k=15):
+    """Heatmap of the top-k co-occurring chemicals + top-10 bar, from a CooccurrenceIndex."""
+    return cooccurrence_figures(cooc.top_partners(selected, max(10, top_k)),
+                                lambda chems: cooc.pair_counts(selected, chems), selected, top_k)
 
-    if co_df.empty:
-        return empty_fig("Co-occurrence heatmap"), empty_fig("Top 10 co-occurring chemicals")
 
-    counts = (
-        co_df.groupby("Standardized_Precipitate")
-        .size()
-        .reset_index(name="count")
-        .sort_values("count", ascending=False)
-    )
+def cooccurrence_figures(partners: pd.Series, pair_counts, selected, top_k=15):
+    """
+    Heatmap + top-10 bar from partner counts (by chemical, descending) and
+    `pair_counts(chemicals)`, their pairwise matrix; `selected` labels the titles.
+    """
+    counts = partners.rename_axis("Standardized_Precipitate").reset_index()
+
+    if counts.empty:
+        return empty_fig("Co-occurrence heatmap"), empty_fig("Top 10 co-occurring chemicals")
 
     top10 = counts.head(10)
     bar_fig = px.bar(
@@ -134,19 +272,7 @@ def cooccurrence_heatmap_and_topbar(df_all, d_sel, selected, top_k=15):
     bar_fig.update_layout(xaxis_tickangle=45, margin=dict(l=40, r=20, t=50, b=120))
 
     top_chems = counts["Standardized_Precipitate"].head(min(top_k, len(counts))).tolist()
-    mat_df = (
-        co_df[co_df["Standardized_Precipitate"].isin(top_chems)]
-        .drop_duplicates(subset=["Protein_ID", "Standardized_Precipitate"])
-        .assign(val=1)
-        .pivot_table(index="Protein_ID", columns="Standardized_Precipitate", values="val", fill_value=0)
-        .reindex(columns=top_chems, fill_value=0)
-    )
-
-    if mat_df.empty:
-        return empty_fig("Co-occurrence heatmap"), bar_fig
-
-    X = mat_df.values
-    co_mat = X.T @ X
+    co_mat = pair_counts(top_chems)
     heatmap_fig = go.Figure(data=go.Heatmap(
         z=co_mat, x=top_chems, y=top_chems,
         colorscale="Viridis", colorbar=dict(title="Count")
@@ -164,12 +290,11 @@ def cooccurrence_heatmap_and_topbar(df_all, d_sel, selected, top_k=15):
 # --------------------
 # Top 50 overview
 # --------------------
-def make_top50_overview(df: pd.DataFrame):
-    overall_n = len(df)
+def make_top50_overview(summary: pd.DataFrame, overall_n: int):
+    """Top-50 bar chart from the per-chemical `Dataset.summary` table."""
     chem_counts = (
-        df.groupby("Standardized_Precipitate", dropna=True)
-        .agg(count=("Standardized_Precipitate", "size"),
-             unique_proteins=("Protein_ID", pd.Series.nunique))
+        summary.loc[summary["count"] > 0, ["count", "unique_proteins"]]
+        .rename_axis("Standardized_Precipitate")
         .reset_index()
         .sort_values("count", ascending=False)
     )
@@ -202,6 +327,43 @@ def make_top50_overview(df: pd.DataFrame):
     return fig_top
 
 
+# --------------------
+# pH × concentration heatmap
+# --------------------
+def make_ph_conc_heatmap(ph_edges: np.ndarray, conc_edges: np.ndarray, z: np.ndarray, unit: str):
+    """
+    Heatmap of condition counts per pH bin × log-concentration bin
+    (CountCube.heatmap), colored on a log scale; concentration columns
+    outside the occupied range are trimmed.
+    """
+    occupied = np.flatnonzero(z.sum(axis=0))
+    if len(occupied) == 0:
+        return empty_fig(f"pH × concentration ({unit})")
+    cols = slice(occupied[0], occupied[-1] + 1)
+    counts = z[:, cols]
+    x = np.sqrt(conc_edges[:-1] * conc_edges[1:])[cols]  # geometric bin centers
+    y = (ph_edges[:-1] + ph_edges[1:]) / 2
+    with np.errstate(divide="ignore"):
+        log_counts = np.where(counts > 0, np.log10(counts), np.nan)
+    top = int(np.ceil(np.nanmax(log_counts))) or 1
+    fig = go.Figure(go.Heatmap(
+        x=x, y=y, z=log_counts, customdata=counts,
+        colorscale="Viridis", zmin=0, zmax=top,
+        colorbar=dict(title="Count", tickvals=list(range(top + 1)),
+                      ticktext=[f"{10 ** i:,}" for i in range(top + 1)]),
+        hovertemplate=f"pH %{{y:.2f}}<br>%{{x:.3g}} {unit}<br>%{{customdata:,}} conditions<extra></extra>",
+    ))
+    fig.update_layout(
+        template="plotly_dark",
+        title=f"pH × concentration ({unit}), all conditions",
+        xaxis=dict(title=f"Concentration ({unit})", type="log"),
+        yaxis=dict(title="pH"),
+        height=460,
+        margin=dict(l=50, r=20, t=50, b=50),
+    )
+    return fig
+
+
 # --------------------
 # Amino acid composition chart
 # --------------------
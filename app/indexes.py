@@ -0,0 +1,254 @@
+"""
+indexes.py
+------------
+Lookup structures built once at load time so drill-down callbacks never
+scan the full conditions table.
+"""
+
+import numpy as np
+import pandas as pd
+
+CHEM_COL = "Standardized_Precipitate"
+
+
+class ChemicalIndex:
+    """
+    Conditions frame sorted by chemical, plus a chemical → row-range table.
+
+    Rows of one chemical are contiguous, so selecting a chemical is a slice
+    whose cost is proportional to the result, not to the table. Sorting is
+    stable: rows keep their original relative order within each chemical.
+    Rows without a chemical are kept at the end of the frame. A frame that is
+    already in that order (e.g. read from a precomputed bundle) is used as is,
+    without copying its columns.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        cat = pd.Categorical(df[CHEM_COL])
+        codes = np.asarray(cat.codes, dtype=np.int64)
+        codes = np.where(codes < 0, len(cat.categories), codes)
+
+        if np.all(codes[1:] >= codes[:-1]):
+            self.df = df.set_axis(pd.RangeIndex(len(df)), copy=False)
+        else:
+            self.df = df.take(np.argsort(codes, kind="stable")).reset_index(drop=True)
+        self.version = df.attrs.get("version", "unversioned")
+        self.chemicals = [str(c) for c in cat.categories]
+        counts = np.bincount(codes, minlength=len(self.chemicals) + 1)[: len(self.chemicals)]
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._pos = {c: i for i, c in enumerate(self.chemicals)}
+
+    @classmethod
+    def from_arrays(cls, df: pd.DataFrame, chemicals: list, offsets: np.ndarray, version: str):
+        """Index over a frame already in chemical order, given its chemical list and offsets."""
+        index = cls.__new__(cls)
+        index.df, index.version, index.chemicals, index.offsets = df, version, chemicals, offsets
+        index._pos = {c: i for i, c in enumerate(chemicals)}
+        return index
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def __contains__(self, chem) -> bool:
+        return chem in self._pos
+
+    def bounds(self, chem) -> tuple[int, int]:
+        """Row range [start, stop) of `chem` in `self.df` (empty if unknown)."""
+        i = self._pos.get(chem)
+        if i is None:
+            return 0, 0
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    def count(self, chem) -> int:
+        start, stop = self.bounds(chem)
+        return stop - start
+
+    def select(self, chem) -> pd.DataFrame:
+        """Rows of `chem` as a slice of the sorted frame."""
+        start, stop = self.bounds(chem)
+        return self.df.iloc[start:stop]
+
+
+class ChemicalList:
+    """
+    The parts of ChemicalIndex the callbacks use (chemical list, membership,
+    row count), for engines that keep no sorted frame.
+    """
+
+    def __init__(self, chemicals: list, n_rows: int):
+        self.chemicals = chemicals
+        self._pos = {c: i for i, c in enumerate(chemicals)}
+        self._rows = n_rows
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def __contains__(self, chem) -> bool:
+        return chem in self._pos
+
+
+class ProteinIndex:
+    """
+    Case-insensitive Protein_ID → row positions index.
+
+    IDs are normalized (str + upper-case) once, over the distinct values only,
+    and kept as a sorted NumPy string array rather than a dict, so the index
+    holds no per-protein Python objects (pages stay shared between forked
+    workers). A lookup is a binary search plus a gather of the matching rows.
+    Rows without a Protein_ID are not indexed.
+    """
+
+    def __init__(self, df: pd.DataFrame, col: str = "Protein_ID"):
+        codes, uniques = pd.factorize(df[col], sort=False)
+        keys, key_of_unique = np.unique(self._keys(uniques), return_inverse=True)
+        key_codes = key_of_unique[codes[codes >= 0]]
+        rows = np.flatnonzero(codes >= 0)
+
+        self.keys = keys
+        self.positions = rows[np.argsort(key_codes, kind="stable")]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(key_codes, minlength=len(keys)))])
+
+    @classmethod
+    def from_arrays(cls, keys: np.ndarray, positions: np.ndarray, offsets: np.ndarray):
+        """Rebuild from saved (sorted) `keys`, `positions` and `offsets`."""
+        index = cls.__new__(cls)
+        index.keys, index.positions, index.offsets = keys, positions, offsets
+        return index
+
+    def appended(self, old_to_new: np.ndarray, protein_ids, positions: np.ndarray) -> "ProteinIndex":
+        """
+        Index after rows were merged into the frame: indexed row r moved to
+        `old_to_new[r]`, and rows of `protein_ids` were added at `positions`.
+        Merges the new entries into the sorted (key, row) order directly.
+        """
+        new_keys = self._keys(protein_ids)
+        keys = np.union1d(self.keys, new_keys)
+        old_key = np.repeat(np.searchsorted(keys, self.keys), np.diff(self.offsets))
+        new_key = np.searchsorted(keys, new_keys)
+        old_rows = old_to_new[self.positions]
+
+        order = np.lexsort((positions, new_key))
+        new_key, new_rows = new_key[order], np.asarray(positions, dtype=np.int64)[order]
+        span = int(old_to_new[-1]) + len(new_rows) + 1 if len(old_to_new) else len(new_rows) + 1
+        at = np.searchsorted(old_key * span + old_rows, new_key * span + new_rows)
+
+        counts = np.bincount(old_key, minlength=len(keys)) + np.bincount(new_key, minlength=len(keys))
+        return ProteinIndex.from_arrays(
+            keys, np.insert(old_rows, at, new_rows), np.concatenate([[0], np.cumsum(counts)])
+        )
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @staticmethod
+    def _keys(protein_ids) -> np.ndarray:
+        """Normalized keys (str + upper-case) of distinct protein IDs, as a NumPy string array."""
+        return np.asarray(pd.Index(protein_ids).astype(str).str.upper(), dtype=str)
+
+    @staticmethod
+    def normalize(protein_id) -> str:
+        return str(protein_id).strip().upper()
+
+    def rows(self, protein_id) -> np.ndarray:
+        """Sorted row positions for `protein_id` (empty if unknown)."""
+        key = self.normalize(protein_id)
+        i = int(np.searchsorted(self.keys, key))
+        if i == len(self.keys) or self.keys[i] != key:
+            return self.positions[:0]
+        return self.positions[self.offsets[i]:self.offsets[i + 1]]
+
+
+def sorted_quantile(v: np.ndarray, q: float) -> float:
+    """Quantile of an ascending array with linear interpolation (pandas/NumPy default)."""
+    pos = q * (len(v) - 1)
+    lo = int(np.floor(pos))
+    hi = min(lo + 1, len(v) - 1)
+    return float(v[lo] + (v[hi] - v[lo]) * (pos - lo))
+
+
+def sorted_histogram(v: np.ndarray, bin_width: float):
+    """
+    Histogram of an ascending array on bins aligned at multiples of
+    `bin_width`: (left_edges, counts) for non-empty bins. Costs
+    O(bins · log n) via searchsorted, or one pass when bins outnumber values.
+    """
+    start = np.floor(float(v[0]) / bin_width) * bin_width
+    # at least one bin: start can round past v[0] (29.15 / 0.005 → start 29.150000000000002)
+    n_bins = max(int(np.floor((float(v[-1]) - start) / bin_width)) + 1, 1)
+    if n_bins <= len(v):
+        edges = start + np.arange(n_bins + 1) * bin_width
+        cut = np.searchsorted(v, edges, side="left")
+        cut[0], cut[-1] = 0, len(v)  # outer edges hold everything, whatever the rounding
+        counts = np.diff(cut)
+        bins = np.flatnonzero(counts)
+        return start + bins * bin_width, counts[bins]
+    idx = np.clip(np.floor((v - start) / bin_width), 0, n_bins - 1).astype(np.int64)
+    first = np.concatenate([[0], np.flatnonzero(np.diff(idx)) + 1])
+    return start + idx[first] * bin_width, np.diff(np.append(first, len(v)))
+
+
+class SortedValues:
+    """
+    Non-null values of one numeric column, sorted within each chemical and
+    held contiguously with an offsets table (same chemical order as the
+    ChemicalIndex). Quantiles, min/max and counts are index lookups; any
+    histogram is a searchsorted over the chemical's slice.
+    """
+
+    def __init__(self, df: pd.DataFrame, chemicals: ChemicalIndex, column: str):
+        n_chem = len(chemicals.chemicals)
+        if column not in df.columns:
+            self.values = np.empty(0)
+            self.offsets = np.zeros(n_chem + 1, dtype=np.int64)
+        else:
+            rows = np.arange(chemicals.offsets[-1])
+            chem = np.repeat(np.arange(n_chem), np.diff(chemicals.offsets))
+            x = df[column].to_numpy()[rows]
+            keep = ~np.isnan(x)
+            chem, x = chem[keep], x[keep]
+            order = np.lexsort((x, chem))
+            self.values = x[order]
+            counts = np.bincount(chem, minlength=n_chem)
+            self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._pos = chemicals._pos
+
+    @classmethod
+    def from_arrays(cls, values: np.ndarray, offsets: np.ndarray, chemicals: ChemicalIndex):
+        """Rebuild from saved `values` and `offsets` (same chemical order as `chemicals`)."""
+        sv = cls.__new__(cls)
+        sv.values, sv.offsets, sv._pos = values, offsets, chemicals._pos
+        return sv
+
+    def appended(self, x: np.ndarray, chem: np.ndarray, chemicals: ChemicalIndex) -> "SortedValues":
+        """
+        Merge new values `x` of chemical codes `chem` (in `chemicals`, which
+        may list new chemicals after the existing ones) into the sorted
+        arrays; NaNs and rows without a chemical are skipped.
+        """
+        n = len(chemicals.chemicals)
+        keep = (chem >= 0) & ~np.isnan(x)
+        x, chem = x[keep], chem[keep]
+        order = np.lexsort((x, chem))
+        x, chem = x[order], chem[order]
+
+        offsets = np.concatenate([self.offsets, np.full(n + 1 - len(self.offsets), self.offsets[-1])])
+        at = np.empty(len(x), dtype=np.int64)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(chem)) + 1, [len(x)]]) if len(x) else [0]
+        for a, b in zip(starts[:-1], starts[1:]):
+            lo, hi = offsets[chem[a]], offsets[chem[a] + 1]
+            at[a:b] = lo + np.searchsorted(self.values[lo:hi], x[a:b], side="right")
+
+        dtype = np.result_type(self.values.dtype, x.dtype)
+        values = np.insert(self.values.astype(dtype, copy=False), at, x.astype(dtype, copy=False))
+        counts = np.diff(offsets) + np.bincount(chem, minlength=n)
+        return SortedValues.from_arrays(values, np.concatenate([[0], np.cumsum(counts)]), chemicals)
+
+    def get(self, chem) -> np.ndarray:
+        """Ascending non-null values of `chem` (a view)."""
+        i = self._pos.get(chem)
+        if i is None:
+            return self.values[:0]
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def count(self, chem) -> int:
+        return len(self.get(chem))
@@ -0,0 +1,230 @@
+"""
+ingest.py
+-----------
+Incremental ingest of new condition rows, without a full reload:
+
+    python -m app.ingest FILE [--db PATH] [--url URL]    # FILE: .csv or .jsonl
+    POST /ingest  {"rows": [{column: value, ...}, ...]}  # Authorization: Bearer <INGEST_TOKEN>
+
+The rows are appended to the SQLite table in one transaction and read back
+through the same preparation as a full load. The serving process then folds
+only those rows into its Dataset (Dataset.appended: chemical and protein
+indexes, per-chemical counts, co-occurrence counts, sorted value arrays) and
+swaps it in. The bundle is brought up to date incrementally by a separate
+`python -m app.precompute` process, off the serving one, so the other
+workers' watchers open it instead of rebuilding.
+
+From the command line, without --url, the rows are written to the DB and
+the bundle is rebuilt; running servers pick the change up on their next poll.
+
+    INGEST_TOKEN        enables POST /ingest (disabled when unset)
+    INGEST_MAX_ROWS     largest batch accepted (default 100000)
+"""
+
+import argparse
+import hmac
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+import pandas as pd
+from flask import jsonify, request
+
+from app.bundle import bundle_lock, bundle_path, read_meta
+from app.data_utils import SCHEMA, TABLE, current_fingerprint, get_db_path, read_conditions
+from app.reload import LiveDataset
+from app.snapshot import dataset_version
+
+COLUMNS = [*SCHEMA, "FASTA_Sequence"]
+_ingest_lock = threading.Lock()
+
+
+def validate(rows) -> list:
+    """Rows as dicts of known columns with scalar values; ValueError otherwise."""
+    if not isinstance(rows, list) or not rows:
+        raise ValueError("expected a non-empty list of rows")
+    max_rows = int(os.environ.get("INGEST_MAX_ROWS", "100000"))
+    if len(rows) > max_rows:
+        raise ValueError(f"{len(rows):,} rows in one batch (at most {max_rows:,})")
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise ValueError(f"row {i}: expected an object")
+        unknown = set(row) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"row {i}: unknown columns {sorted(unknown)}")
+        for col, value in row.items():
+            if value is not None and not isinstance(value, (str, int, float)):
+                raise ValueError(f"row {i}: {col} must be a string or a number")
+    return rows
+
+
+def append_to_db(conn: sqlite3.Connection, rows: list, table: str = TABLE):
+    """
+    Insert `rows` and read them back; runs inside the caller's transaction.
+    Returns (prepared frame, {Protein_ID: FASTA} of the new rows).
+    """
+    available = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    missing = {col for row in rows for col in row} - set(available)
+    if missing:
+        raise ValueError(f"columns not in table {table}: {sorted(missing)}")
+    cols = [c for c in COLUMNS if c in available]
+    names = ", ".join(f'"{c}"' for c in cols)
+    (since,) = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()
+    conn.executemany(
+        f"INSERT INTO {table} ({names}) VALUES ({', '.join('?' * len(cols))})",
+        [tuple(row.get(c) for c in cols) for row in rows],
+    )
+    new = read_conditions(conn, table, "WHERE rowid > ?", (since,))
+    sequences = {}
+    if "FASTA_Sequence" in available:
+        sequences = dict(conn.execute(
+            f"SELECT Protein_ID, MAX(FASTA_Sequence) FROM {table} WHERE rowid > ? "
+            "AND Protein_ID IS NOT NULL AND FASTA_Sequence IS NOT NULL GROUP BY Protein_ID", (since,),
+        ).fetchall())
+    return new, sequences
+
+
+def ingest(rows, live: LiveDataset = None, db_path=None, table: str = TABLE, rebuild_bundle: bool = True) -> dict:
+    """
+    Append `rows` to the DB and, with `live`, swap in the served Dataset
+    plus those rows. If the served Dataset was already behind the DB (another
+    process wrote to it), it is reloaded instead.
+    """
+    rows = validate(rows)
+    db_path = db_path or get_db_path()
+    if not Path(db_path).exists():
+        raise ValueError(f"database not found at {db_path}")
+    t0 = time.perf_counter()
+
+    with _ingest_lock:
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")  # no other writer until commit
+            served = live.current.version if live is not None else None
+            behind = served != dataset_version(current_fingerprint(db_path))
+            new, sequences = append_to_db(conn, rows, table)
+            conn.commit()
+            # the version must describe exactly "served + these rows": read it
+            # under a read lock and check nobody committed after us
+            conn.execute("BEGIN")
+            version = dataset_version(current_fingerprint(db_path))
+            (n_rows,) = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+            conn.rollback()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        mode = "db"
+        if live is not None:
+            if (behind or n_rows != len(live.current.chemicals) + len(new)
+                    or not hasattr(live.current, "appended")):  # the SQL engine re-reads the DB
+                live.reload()
+                mode = "reload"
+            else:
+                live.update(lambda dataset: dataset.appended(new, sequences, version))
+                mode = "appended"
+    elapsed = time.perf_counter() - t0
+    print(f"[INFO] Ingested {len(new):,} rows ({mode}) in {elapsed:.2f}s → version {version}")
+
+    if rebuild_bundle:
+        if live is None:
+            update_bundle(db_path, table)
+        elif read_meta(bundle_path(db_path)) is not None:
+            spawn_bundle_update(db_path, table)
+    return {"rows": len(new), "version": version, "mode": mode, "seconds": round(elapsed, 3)}
+
+
+def update_bundle(db_path, table: str = TABLE) -> None:
+    """Incremental bundle rebuild, one process at a time (later ones usually find it current)."""
+    from app.precompute import build  # precompute imports the whole dataset stack
+
+    path = bundle_path(db_path)
+    try:
+        with bundle_lock(path):
+            build(db_path, path, table=table)
+    except Exception as exc:  # the served Dataset is already current
+        print(f"[WARN] Bundle update after ingest failed: {exc}")
+
+
+def spawn_bundle_update(db_path, table: str = TABLE) -> subprocess.Popen:
+    """Run update_bundle in a separate process (python -m app.precompute), without waiting for it."""
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "app.precompute", "--db", str(db_path), "--table", table],
+        cwd=Path(__file__).resolve().parent.parent,
+    )
+
+    def reap():  # collect the exit status so the child does not linger as a zombie
+        if proc.wait() != 0:
+            print(f"[WARN] Bundle update after ingest failed (exit code {proc.returncode})")
+
+    threading.Thread(target=reap, name="bundle-update", daemon=True).start()
+    return proc
+
+
+def register_ingest(server, live: LiveDataset) -> None:
+    """POST /ingest on the Flask `server`, if INGEST_TOKEN is set."""
+    token = os.environ.get("INGEST_TOKEN")
+    if not token:
+        return
+
+    @server.route("/ingest", methods=["POST"])
+    def ingest_endpoint():
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return jsonify(error="unauthorized"), 401
+        payload = request.get_json(silent=True)
+        rows = payload.get("rows") if isinstance(payload, dict) else payload
+        try:
+            return jsonify(ingest(rows, live))
+        except (ValueError, sqlite3.IntegrityError) as exc:
+            return jsonify(error=str(exc)), 400
+
+
+def read_rows(path) -> list:
+    """Rows of a .csv or .jsonl file as dicts (empty CSV cells → None)."""
+    path = Path(path)
+    if path.suffix == ".csv":
+        df = pd.read_csv(path, dtype=object, keep_default_na=False)
+        return [{k: (v if v != "" else None) for k, v in row.items()} for row in df.to_dict("records")]
+    with open(path) as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.ingest", description=__doc__.split("\n\n")[1])
+    parser.add_argument("file", help="rows to add: .csv with a header, or .jsonl (one object per line)")
+    parser.add_argument("--db", default=get_db_path(), help="SQLite DB (default: DB_PATH or data/CrystallizationEDA.db)")
+    parser.add_argument("--url", default=None, help="post to a running server's /ingest instead (uses INGEST_TOKEN)")
+    args = parser.parse_args(argv)
+
+    try:
+        rows = validate(read_rows(args.file))
+    except (OSError, ValueError) as exc:
+        print(f"[WARN] {args.file}: {exc}")
+        return 1
+    if args.url:
+        req = urllib.request.Request(
+            args.url.rstrip("/") + "/ingest", data=json.dumps({"rows": rows}).encode(),
+            headers={"Content-Type": "application/json",
+                     "Authorization": f"Bearer {os.environ.get('INGEST_TOKEN', '')}"},
+        )
+        with urllib.request.urlopen(req, timeout=600) as resp:
+            print(f"[INFO] {resp.read().decode()}")
+        return 0
+    try:
+        ingest(rows, db_path=args.db)
+    except ValueError as exc:
+        print(f"[WARN] {exc}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
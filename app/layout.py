@@ -10,6 +10,10 @@ Improved layout for Crystallization EDA dashboard:
 - pH bin size fixed (0.25) → no slider.
 - Removed log-scale Y axis toggle.
 - Dark-themed dropdown styling (via CSS).
+- Drill-down graphs live inside their tabs, each fed by its own callback.
+- Chemical card can combine the chemical with AND / OR / NOT chemicals and a pH range.
+- pH × concentration heatmap of all conditions (from the count cube) below Top 50.
+- Stores for the concentration histograms' values (clientside re-binning).
 """
 
 import dash_bootstrap_components as dbc
@@ -30,6 +34,11 @@ def Card(children, title=None, dark=True):
     )
 
 
+def GraphCard(graph_id, class_name=None):
+    """Plain card around a single graph, as used in the drill-down tabs."""
+    return dbc.Card(dbc.CardBody([dcc.Graph(id=graph_id)]), class_name=class_name)
+
+
 def make_layout(fig_top, chem_options):
     """Return the full Dash layout for the app."""
     return dbc.Container(
@@ -48,6 +57,25 @@ def make_layout(fig_top, chem_options):
                 dbc.Col(Card(dcc.Graph(figure=fig_top, id="top-chemicals"), title="Top 50 Chemicals"), width=12),
                 class_name="mb-2",
             ),
+            dbc.Row(
+                dbc.Col(
+                    Card(
+                        [
+                            dbc.RadioItems(
+                                id="heatmap-unit",
+                                options=[{"label": "mM", "value": "mM"}, {"label": "%", "value": "%"}],
+                                value="mM",
+                                inline=True,
+                                className="mb-2",
+                            ),
+                            dcc.Graph(id="ph-conc-heatmap"),
+                        ],
+                        title="pH × Concentration (all conditions)",
+                    ),
+                    width=12,
+                ),
+                class_name="mb-2",
+            ),
 
             # ---------------- Protein Drill-down (moved up) ----------------
             dbc.Row(
@@ -109,6 +137,30 @@ def make_layout(fig_top, chem_options):
                                     },
                                     className="custom-dropdown",  # custom CSS target
                                 ),
+                                html.Div("Combine (optional)", className="small fw-semibold mt-3 mb-1"),
+                                *[
+                                    dcc.Dropdown(
+                                        id=f"chem-{op}",
+                                        options=[],  # copied from chem-dropdown clientside
+                                        multi=True,
+                                        placeholder=placeholder,
+                                        persistence=True,
+                                        className="custom-dropdown mb-1",
+                                    )
+                                    for op, placeholder in [
+                                        ("and", "AND: proteins also crystallized with all of…"),
+                                        ("or", "OR: …and with at least one of…"),
+                                        ("not", "NOT: …and never with any of…"),
+                                    ]
+                                ],
+                                html.Div("pH range", className="small mt-2 mb-1"),
+                                dcc.RangeSlider(
+                                    id="ph-range",
+                                    min=0, max=14, step=0.25, value=[0, 14],
+                                    marks={i: str(i) for i in range(0, 15, 2)},
+                                    tooltip={"placement": "bottom"},
+                                    persistence=True,
+                                ),
                                 html.Hr(),
                                 html.Div(id="chem-summary", className="small"),
                             ],
@@ -167,13 +219,36 @@ def make_layout(fig_top, chem_options):
                                 id="tabs",
                                 value="tab-conc",
                                 children=[
-                                    dcc.Tab(label="Concentration", value="tab-conc", className="custom-tab"),
-                                    dcc.Tab(label="pH", value="tab-ph", className="custom-tab"),
-                                    dcc.Tab(label="Co-occurrence", value="tab-co", className="custom-tab"),
+                                    dcc.Tab(
+                                        label="Concentration", value="tab-conc", className="custom-tab",
+                                        children=dbc.Row(
+                                            [
+                                                dbc.Col(GraphCard("conc-mm-graph", class_name="mb-3"), width=6),
+                                                dbc.Col(GraphCard("conc-pct-graph", class_name="mb-3"), width=6),
+                                                # selection values for clientside re-binning (REBIN_MODE=client)
+                                                dcc.Store(id="conc-mm-data"),
+                                                dcc.Store(id="conc-pct-data"),
+                                            ],
+                                            class_name="mt-3",
+                                        ),
+                                    ),
+                                    dcc.Tab(
+                                        label="pH", value="tab-ph", className="custom-tab",
+                                        children=dbc.Row(dbc.Col(GraphCard("ph-graph"), width=12), class_name="mt-3"),
+                                    ),
+                                    dcc.Tab(
+                                        label="Co-occurrence", value="tab-co", className="custom-tab",
+                                        children=dbc.Row(
+                                            [
+                                                dbc.Col(GraphCard("co-heatmap-graph"), width=12),
+                                                dbc.Col(GraphCard("co-bar-graph"), width=12),
+                                            ],
+                                            class_name="mt-3",
+                                        ),
+                                    ),
                                 ],
                                 className="custom-tabs",
                             ),
-                            html.Div(id="tab-content", className="mt-3"),
                         ],
                         title="Drill-down",
                     ),
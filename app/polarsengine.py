@@ -0,0 +1,180 @@
+"""
+polarsengine.py
+-----------------
+Polars execution backend, selected with QUERY_ENGINE=polars.
+
+The conditions frame is loaded as usual (load_data: snapshot or DB, same
+preparation) and handed to Polars once, zero-copy where Arrow allows.
+PolarsDataset then answers the calls the callbacks make on
+app.dataset.Dataset by running the dashboard's queries on it, on all cores:
+
+- chemical filter:      one chemical's values of a column (histograms, KDE, pH)
+- summary:              group_by(chemical).agg(count, n_unique proteins, first CID)
+- co-occurrence:        partner counts over the proteins that used a chemical,
+                        and the protein × chemical pivot of the top partners
+- protein lookup:       filter on the upper-cased Protein_ID
+
+No per-chemical index is built: each request scans the frame. Polars is an
+optional dependency (requirements-polars.txt); without it the pandas engine
+is used.
+
+Polars' thread pool does not survive a fork, so gunicorn imports the app in
+each worker (no preload) when this engine is selected.
+"""
+
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from app.bundle import load_dataset
+from app.data_utils import TABLE, load_data
+from app.dataset import VALUE_COLUMNS, mean_sequence_length
+from app.distribution import SortedDistribution
+from app.indexes import CHEM_COL, ChemicalList, ProteinIndex
+from app.sequences import SequenceStore, cached_store, load_sequences
+
+try:
+    import polars as pl
+except ImportError:  # optional engine
+    pl = None
+
+
+def _string_categories(s: pd.Series) -> pd.Series:
+    """Categorical column with str categories (as a full load renders them), for Arrow."""
+    if isinstance(s.dtype, pd.CategoricalDtype) and not pd.api.types.is_string_dtype(s.cat.categories):
+        return s.cat.rename_categories(s.cat.categories.astype(str))
+    return s
+
+
+def to_polars(df: pd.DataFrame) -> "pl.DataFrame":
+    """The prepared conditions frame as Polars, plus the `protein_key` lookup column."""
+    frame = pl.from_pandas(pd.DataFrame({col: _string_categories(df[col]) for col in df.columns}, copy=False))
+    if "Protein_ID" in frame.columns:
+        frame = frame.with_columns(
+            protein_key=pl.col("Protein_ID").cast(pl.Utf8).str.to_uppercase().cast(pl.Categorical))
+    return frame
+
+
+class PolarsDataset:
+    """Conditions frame in Polars, queried per request (same calls as app.dataset.Dataset)."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.version = df.attrs.get("version", "unversioned")
+        self.db_path = df.attrs.get("db_path")
+        self.frame = to_polars(df)
+        chemicals = self.frame.get_column(CHEM_COL).drop_nulls().unique().cast(pl.Utf8).sort()
+        self.chemicals = ChemicalList(chemicals.to_list(), self.frame.height)
+        self.cooccurrence = PolarsCooccurrence(self)
+
+    def rows_of(self, chem) -> "pl.DataFrame":
+        """Chemical filter: the rows of `chem`, in table order."""
+        return self.frame.filter(pl.col(CHEM_COL) == chem)
+
+    @cached_property
+    def summary(self) -> pd.DataFrame:
+        """
+        Per-chemical totals, indexed by chemical: condition rows (`count`),
+        distinct proteins (`unique_proteins`) and the first non-null `cid` (str).
+        """
+        aggs = [pl.len().alias("count"), pl.col("Protein_ID").drop_nulls().n_unique().alias("unique_proteins")]
+        if "CID" in self.frame.columns:
+            aggs.append(pl.col("CID").drop_nulls().first().cast(pl.Utf8).alias("cid"))
+        table = (self.frame.filter(pl.col(CHEM_COL).is_not_null())
+                 .group_by(pl.col(CHEM_COL).cast(pl.Utf8), maintain_order=True).agg(aggs))
+        out = table.to_pandas().set_index(CHEM_COL).reindex(self.chemicals.chemicals)
+        if "cid" not in out.columns:
+            out["cid"] = None
+        out["cid"] = out["cid"].astype(object).where(out["cid"].notna(), None)
+        out.index.name = "chemical"
+        return out.astype({"count": np.int64, "unique_proteins": np.int64})[["count", "unique_proteins", "cid"]]
+
+    @cached_store
+    def sequences(self) -> SequenceStore:
+        return load_sequences(self.db_path, self.version)
+
+    @cached_store
+    def sequence_totals(self) -> pd.DataFrame:
+        """
+        Per chemical, over its rows whose protein has a stored sequence: the
+        summed sequence length (`seq_total`) and the number of rows (`seq_rows`).
+        """
+        lengths = pl.DataFrame({"Protein_ID": self.sequences.ids.tolist(), "length": self.sequences.lengths})
+        table = (self.frame.filter(pl.col(CHEM_COL).is_not_null())
+                 .select(pl.col(CHEM_COL).cast(pl.Utf8), pl.col("Protein_ID").cast(pl.Utf8))
+                 .join(lengths, on="Protein_ID")
+                 .group_by(CHEM_COL).agg(seq_total=pl.col("length").sum().cast(pl.Float64), seq_rows=pl.len()))
+        out = table.to_pandas().set_index(CHEM_COL).reindex(self.chemicals.chemicals)
+        out.index.name = "chemical"
+        return out.fillna(0).astype({"seq_total": np.float64, "seq_rows": np.int64})
+
+    @cached_store
+    def avg_sequence_length(self) -> pd.Series:
+        return mean_sequence_length(self.sequence_totals)
+
+    def distribution(self, key: str, chem) -> SortedDistribution:
+        """Values of `chem` in the VALUE_COLUMNS column `key`, ascending."""
+        col = VALUE_COLUMNS[key]
+        if col not in self.frame.columns:
+            return SortedDistribution(np.empty(0))
+        values = self.rows_of(chem).get_column(col).drop_nulls().drop_nans().sort()
+        return SortedDistribution(values.to_numpy())
+
+    def protein_conditions(self, protein_id) -> pd.DataFrame:
+        """Condition rows of `protein_id` (case-insensitive), in chemical then table order."""
+        rows = (self.frame.filter(pl.col("protein_key") == ProteinIndex.normalize(protein_id))
+                .sort(pl.col(CHEM_COL).cast(pl.Utf8), nulls_last=True, maintain_order=True))
+        return rows.drop("protein_key").to_pandas()
+
+
+class PolarsCooccurrence:
+    """CooccurrenceIndex.top_partners / pair_counts as Polars queries."""
+
+    def __init__(self, dataset: PolarsDataset):
+        self._dataset = dataset
+        self.version = dataset.version
+
+    def _partner_rows(self, chem) -> "pl.DataFrame":
+        """Rows (protein, chemical) of the proteins that used `chem`."""
+        frame = self._dataset.frame
+        proteins = self._dataset.rows_of(chem).get_column("Protein_ID").drop_nulls().unique()
+        return (frame.filter(pl.col("Protein_ID").is_in(proteins) & pl.col(CHEM_COL).is_not_null())
+                .select(pl.col("Protein_ID"), pl.col(CHEM_COL).cast(pl.Utf8)))
+
+    def top_partners(self, chem, k: int) -> pd.Series:
+        """
+        Condition-row counts of the other chemicals among the proteins that
+        used `chem`: top k, descending, ties in chemical order.
+        """
+        counts = (self._partner_rows(chem).filter(pl.col(CHEM_COL) != chem)
+                  .group_by(CHEM_COL).agg(count=pl.len())
+                  .sort(["count", CHEM_COL], descending=[True, False]).head(k))
+        return pd.Series(counts.get_column("count").to_numpy().astype(np.int64),
+                         index=counts.get_column(CHEM_COL).to_list(), name="count")
+
+    def pair_counts(self, chem, others) -> np.ndarray:
+        """
+        Dense len(others)² matrix: number of distinct proteins that used `chem`
+        and both chemicals of each pair (diagonal: each chemical alone), from
+        the protein × chemical pivot of `others`.
+        """
+        others = list(others)
+        rows = self._partner_rows(chem).filter(pl.col(CHEM_COL).is_in(others)).unique()
+        if rows.is_empty():
+            return np.zeros((len(others), len(others)), dtype=np.int32)
+        pivot = rows.pivot(on=CHEM_COL, index="Protein_ID", values=CHEM_COL, aggregate_function="len")
+        B = np.column_stack([
+            pivot.get_column(c).fill_null(0).to_numpy() if c in pivot.columns else np.zeros(pivot.height)
+            for c in others
+        ]).astype(np.int32)
+        return B.T @ B
+
+
+def load_polars_dataset(table: str = TABLE):
+    """PolarsDataset over load_data(), or the pandas Dataset if Polars is not installed."""
+    if pl is None:
+        print("[WARN] QUERY_ENGINE=polars but polars is not installed; using pandas")
+        return load_dataset(table)
+    dataset = PolarsDataset(load_data(table))
+    print(f"[INFO] Serving {len(dataset.chemicals):,} rows with Polars (QUERY_ENGINE=polars)")
+    return dataset
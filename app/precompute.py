@@ -0,0 +1,119 @@
+"""
+precompute.py
+---------------
+Offline build of the artifact bundle (see app.bundle):
+
+    python -m app.precompute [--db PATH] [--out DIR] [--table NAME] [--full]
+
+Reads the SQLite DB once and writes the bundle that workers memory-map at
+startup; it does nothing while the bundle still matches the DB. Builds take
+the bundle lock, so they never overlap with the server's own. The server
+runs the same build on startup when the bundle is missing or stale
+(app.bundle.load_dataset), so this is only needed to prepare it ahead.
+
+When the DB only gained rows since the last build (every row up to the
+previous max rowid is still there), the rebuild is incremental: the old
+frame and sequence store are reused and only the new rows are read from
+SQLite. Rows edited in place are not detected that way; use --full after
+such changes.
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from app.bundle import BUNDLE_FORMAT, bundle_lock, bundle_path, read_meta, write_bundle
+from app.data_utils import TABLE, append_rows, current_fingerprint, get_db_path, read_conditions
+from app.dataset import Dataset
+from app.sequences import SequenceStore
+from app.snapshot import dataset_version, read_snapshot
+
+
+def _previous_build(conn, path: Path, meta, fingerprint: dict, table: str):
+    """(frame, sequence store, max rowid) of the old bundle if the DB only gained rows since, else None."""
+    if (meta is None or meta.get("table") != table
+            or meta["fingerprint"].get("schema") != fingerprint["schema"]):
+        return None
+    (kept,) = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE rowid <= ?", (meta["max_rowid"],)).fetchone()
+    if kept != meta["rows"]:
+        return None
+    df = read_snapshot(path / "conditions.arrow", meta["fingerprint"])
+    store = SequenceStore.open(path / "sequences", meta["version"])
+    if df is None or store is None:
+        return None
+    return df, store, meta["max_rowid"]
+
+
+def build(db_path, path=None, full: bool = False, table: str = TABLE) -> str:
+    """Bring the bundle at `path` up to date with the DB; returns "current", "incremental" or "full"."""
+    path = Path(path or bundle_path(db_path))
+    fingerprint = current_fingerprint(db_path)
+    meta = read_meta(path)
+    if not full and meta is not None and meta["fingerprint"] == fingerprint:
+        return "current"
+    version = dataset_version(fingerprint)
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("BEGIN")  # one read snapshot for the counts and the rows
+        n_rows, max_rowid = conn.execute(f"SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM {table}").fetchone()
+        previous = None if full else _previous_build(conn, path, meta, fingerprint, table)
+        if previous is None:
+            df, base_store, since = read_conditions(conn, table), None, 0
+        else:
+            base_df, base_store, since = previous
+            df = append_rows(base_df, read_conditions(conn, table, "WHERE rowid > ?", (since,)))
+        conn.rollback()
+
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    try:
+        store = SequenceStore.build(db_path, tmp / "sequences", version, table, base=base_store, since_rowid=since)
+        # no db_path: nothing gets written next to the DB while building
+        df.attrs.update(version=version, db_path=None)
+        dataset = Dataset(df, prebuilt={"sequences": store})
+        write_bundle(dataset, tmp, {
+            "format": BUNDLE_FORMAT,
+            "version": version,
+            "fingerprint": fingerprint,
+            "table": table,
+            "rows": n_rows,
+            "max_rowid": max_rowid,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return "full" if previous is None else "incremental"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.precompute", description=__doc__.split("\n\n")[1])
+    parser.add_argument("--db", default=get_db_path(), help="SQLite DB (default: DB_PATH or data/CrystallizationEDA.db)")
+    parser.add_argument("--out", default=None, help="bundle directory (default: <db stem>.bundle next to the DB)")
+    parser.add_argument("--table", default=TABLE, help=f"conditions table (default: {TABLE})")
+    parser.add_argument("--full", action="store_true", help="rebuild from scratch even if only rows were added")
+    args = parser.parse_args(argv)
+
+    if not Path(args.db).exists():
+        print(f"[WARN] Database not found at {args.db}; no bundle built.")
+        return 0
+    t0 = time.perf_counter()
+    out = args.out or bundle_path(args.db)
+    with bundle_lock(out):
+        mode = build(args.db, out, full=args.full, table=args.table)
+    if mode == "current":
+        print(f"[INFO] Bundle {out} is up to date")
+    else:
+        print(f"[INFO] Bundle {out} rebuilt ({mode}) in {time.perf_counter() - t0:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+reload.py
+-----------
+Hot reload of the dataset when the SQLite file changes, without a restart.
+
+Callbacks read `LiveDataset.current` once per request. A watcher thread
+polls the DB fingerprint, builds the new Dataset (bundle or DB, with all
+its indexes) off the request path, then swaps the reference. Requests
+already running keep the Dataset they started with; cached results are
+keyed by dataset version, so entries of the old version simply stop being
+hit.
+
+Under gunicorn with a preloaded app, the watcher runs in the master instead
+(start_master, see gunicorn.conf.py): the new Dataset is loaded there once
+and the workers are then replaced by ones forked from it, so they keep
+sharing it copy-on-write. Otherwise each worker runs its own watcher.
+
+    DB_WATCH_INTERVAL   seconds between polls (default 30; 0 disables)
+    QUERY_ENGINE        what serves the queries: "pandas" (default, in-memory
+                        indexes), "sql" (app.sqlengine) or "polars" (app.polarsengine)
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+from app.bundle import load_dataset
+from app.data_utils import current_fingerprint, get_db_path
+from app.dataset import Dataset
+from app.polarsengine import load_polars_dataset
+from app.snapshot import dataset_version
+from app.sqlengine import load_sql_dataset
+
+LOADERS = {"pandas": load_dataset, "sql": load_sql_dataset, "polars": load_polars_dataset}
+
+
+class LiveDataset:
+    """The Dataset currently served, replaced atomically when the DB changes."""
+
+    def __init__(self, dataset: Dataset, loader=load_dataset, interval: float = None):
+        self.current = dataset
+        self.interval = (float(os.environ.get("DB_WATCH_INTERVAL", "30"))
+                         if interval is None else interval)
+        self.reloads = 0
+        self.on_swap = []           # fn(new, old), called after each swap
+        self._loader = loader
+        self._pending = None        # changed version seen on the previous poll
+        self._reload_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._watcher_pid = None
+        self._recycle = None        # set by start_master; workers forked after it never watch
+        # a worker forked while the master's watcher holds the lock must not inherit it held
+        os.register_at_fork(after_in_child=self._reset_locks)
+
+    def _reset_locks(self) -> None:
+        self._reload_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+
+    def changed_version(self):
+        """Version of the DB on disk if it differs from the one being served, else None."""
+        db_path = get_db_path()
+        if not Path(db_path).exists():
+            return None
+        version = dataset_version(current_fingerprint(db_path))
+        return version if version != self.current.version else None
+
+    def check(self) -> bool:
+        """
+        Reload if the DB changed and its fingerprint held still since the
+        previous poll (so a write in progress is not loaded). True if swapped.
+        """
+        version = self.changed_version()
+        if version != self._pending:
+            self._pending = version
+            return False
+        return version is not None and self.reload()
+
+    def reload(self) -> bool:
+        """Build a new Dataset now and swap it in."""
+        with self._reload_lock:
+            t0 = time.perf_counter()
+            new = self._loader()
+            old = self._swap(new)
+            self.reloads += 1
+        print(f"[INFO] Reloaded dataset {old.version} → {new.version} "
+              f"({len(new.chemicals):,} rows) in {time.perf_counter() - t0:.1f}s")
+        self._notify(new, old)
+        return True
+
+    def update(self, fn) -> Dataset:
+        """Swap in `fn(current)` (e.g. the current Dataset plus ingested rows), serialized with reloads."""
+        with self._reload_lock:
+            new = fn(self.current)
+            old = self._swap(new)
+        self._notify(new, old)
+        return new
+
+    def preload(self) -> None:
+        """Open (or build) the current dataset's sequence store now instead of on first use."""
+        self.current.sequences  # cached_store: opening it is the side effect
+
+    def _swap(self, new: Dataset) -> Dataset:
+        old, self.current = self.current, new
+        self._pending = None
+        return old
+
+    def _notify(self, new: Dataset, old: Dataset) -> None:
+        for fn in self.on_swap:
+            fn(new, old)
+
+    def start(self) -> None:
+        """
+        Start the watcher thread in this process. Threads do not survive a
+        fork, so this is a no-op only if this very process already started one.
+        """
+        if self.interval <= 0 or self._recycle is not None or self._watcher_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+            threading.Thread(target=self._watch, name="dataset-watcher", daemon=True).start()
+
+    def start_master(self, recycle) -> None:
+        """
+        Start the watcher in the gunicorn master: after each reload,
+        `recycle()` replaces the workers, which fork with the new Dataset.
+        Workers forked from this process skip their own watcher.
+        """
+        if self.interval <= 0:
+            return
+        self._recycle = recycle
+        self._watcher_pid = os.getpid()
+        threading.Thread(target=self._watch, name="dataset-watcher", daemon=True).start()
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                if self.check() and self._recycle is not None:
+                    self._recycle()
+            except Exception as exc:  # keep serving the current dataset
+                print(f"[WARN] Dataset reload failed: {exc}")
+
+
+def dataset_loader():
+    """Dataset loader of the QUERY_ENGINE in use."""
+    engine = os.environ.get("QUERY_ENGINE", "pandas")
+    if engine not in LOADERS:
+        print(f"[WARN] Unknown QUERY_ENGINE={engine!r}; using pandas")
+    return LOADERS.get(engine, load_dataset)
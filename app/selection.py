@@ -0,0 +1,108 @@
+"""
+selection.py
+--------------
+Multi-chemical drill-down: "conditions of the proteins crystallized with
+A AND B, with C OR D, never with E, at pH 4–7".
+
+A Query names the drill-down chemical plus optional AND / OR / NOT
+chemicals and a pH range. It is evaluated with bitmaps (app.bitmaps):
+
+- proteins:  per-chemical protein sets (the co-occurrence CSC columns), or,
+             under a pH range, the proteins of that chemical's rows in the
+             range (chemical row range AND pH bin bitmaps, projected);
+             combined as   P = main AND all(AND) AND any(OR) AND NOT any(NOT)
+- rows:      the rows of the positive chemicals (main, AND, OR) in the pH
+             range whose protein is in P
+
+The result (Selection) feeds the summary block and every tab.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+from app.bitmaps import Bitmap
+
+PH_FULL_RANGE = (0.0, 14.0)
+
+
+class Query(NamedTuple):
+    """Combined drill-down selection; hashable, so results memoize on it."""
+
+    chemical: str
+    all_of: tuple = ()
+    any_of: tuple = ()
+    none_of: tuple = ()
+    ph: tuple = None            # (lo, hi): lo <= pH < hi; None for no pH filter
+
+    @property
+    def positive(self) -> list:
+        """Chemicals whose conditions are shown: the main one, AND and OR."""
+        return list(dict.fromkeys([self.chemical, *self.all_of, *self.any_of]))
+
+    def __str__(self) -> str:
+        parts = [" AND ".join([self.chemical, *self.all_of])]
+        if self.any_of:
+            parts.append("AND (" + " OR ".join(self.any_of) + ")")
+        if self.none_of:
+            parts.append("NOT (" + " OR ".join(self.none_of) + ")")
+        if self.ph:
+            parts.append(f"@ pH {self.ph[0]:g}–{self.ph[1]:g}")
+        return " ".join(parts)
+
+
+def make_query(chemical, all_of=None, any_of=None, none_of=None, ph_range=None):
+    """
+    Drill-down target from the selection controls: the chemical itself when
+    nothing is combined with it (the single-chemical views), else a Query.
+    """
+    ph = tuple(float(v) for v in ph_range) if ph_range else None
+    if ph == PH_FULL_RANGE:
+        ph = None
+    terms = [tuple(sorted(set(t or ()) - {chemical})) for t in (all_of, any_of, none_of)]
+    if not any(terms) and ph is None:
+        return chemical
+    return Query(chemical, *terms, ph)
+
+
+class Selection:
+    """Rows (ascending positions in the Dataset frame) and protein codes matched by a Query."""
+
+    def __init__(self, rows: np.ndarray, proteins: Bitmap):
+        self.rows = rows
+        self.proteins = proteins
+
+    @property
+    def protein_codes(self) -> np.ndarray:
+        """Co-occurrence protein codes of the selected proteins, ascending."""
+        return self.proteins.to_array()
+
+
+def evaluate(dataset, query: Query) -> Selection:
+    """Selection of `query` in a Dataset (see the module docstring)."""
+    n_rows = len(dataset.df)
+    n_proteins = len(dataset.cooccurrence.proteins)
+    ph = dataset.ph_bins.rows(*query.ph) if query.ph else None
+
+    def rows_of(chem) -> Bitmap:
+        return Bitmap.from_range(*dataset.chemicals.bounds(chem), n_rows)
+
+    def proteins_of(chem, in_range: bool = True) -> Bitmap:
+        if ph is None or not in_range:
+            return Bitmap.from_sorted(dataset.cooccurrence.proteins_with(chem), n_proteins)
+        codes = dataset.row_protein_codes((rows_of(chem) & ph).to_array())
+        return Bitmap.from_sorted(np.unique(codes[codes >= 0]), n_proteins)
+
+    proteins = proteins_of(query.chemical)
+    for chem in query.all_of:
+        proteins = proteins & proteins_of(chem)
+    if query.any_of:
+        proteins = proteins & Bitmap.union([proteins_of(c) for c in query.any_of], n_proteins)
+    if query.none_of:
+        proteins = proteins - Bitmap.union([proteins_of(c, in_range=False) for c in query.none_of], n_proteins)
+
+    rows = Bitmap.union([rows_of(c) for c in query.positive], n_rows)
+    if ph is not None:
+        rows = rows & ph
+    rows = rows.to_array()
+    return Selection(rows[proteins.contains(dataset.row_protein_codes(rows))], proteins)
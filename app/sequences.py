@@ -0,0 +1,226 @@
+"""
+sequences.py
+--------------
+Per-protein FASTA store, kept out of the conditions frame.
+
+Every condition row used to carry a full copy of its protein's sequence. The
+store keeps one sequence per Protein_ID in a flat blob with an offsets table,
+written next to the DB and memory-mapped, so only the sequences actually
+looked at are ever paged in. IDs are a NumPy string array searched by
+binary search, so the store holds no per-protein Python objects either.
+
+Builds are serialized across processes by a lock file next to the store;
+a process that waited opens the store the first one built.
+"""
+
+import fcntl
+import io
+import json
+import os
+import shutil
+import sqlite3
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+
+STORE_FORMAT = 2  # 2: ids.json → ids.npy
+
+
+class SequenceStore:
+    """One FASTA sequence (whitespace removed) per Protein_ID."""
+
+    failed = False  # True for the empty stand-in of a store that could not be built
+
+    def __init__(self, ids, offsets: np.ndarray, blob):
+        self.ids = np.asarray(ids, dtype=str)
+        self.offsets = offsets
+        self.lengths = np.diff(offsets)
+        self._blob = blob
+        self._order = np.argsort(self.ids, kind="stable")
+        self._sorted_ids = self.ids[self._order]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def slots(self, protein_ids) -> np.ndarray:
+        """Store slot for each protein ID (-1 when it has no sequence)."""
+        query = np.asarray(protein_ids, dtype=str)
+        if len(self.ids) == 0:
+            return np.full(len(query), -1, dtype=np.int64)
+        i = np.minimum(np.searchsorted(self._sorted_ids, query), len(self.ids) - 1)
+        return np.where(self._sorted_ids[i] == query, self._order[i], -1).astype(np.int64)
+
+    def get(self, protein_id):
+        """Sequence of `protein_id`, or None."""
+        if protein_id is None:
+            return None
+        i = int(self.slots([protein_id])[0])
+        if i < 0:
+            return None
+        return bytes(self._blob[self.offsets[i]:self.offsets[i + 1]]).decode("ascii", errors="replace")
+
+    @classmethod
+    def empty(cls, failed: bool = False):
+        store = cls([], np.zeros(1, dtype=np.int64), b"")
+        store.failed = failed
+        return store
+
+    def extended(self, sequences: dict):
+        """
+        Store with `sequences` (Protein_ID → FASTA) added for the IDs it does
+        not have yet. The existing blob is shared, not copied.
+        """
+        new = {str(pid): "".join(str(fasta).split()).encode("ascii", errors="replace")
+               for pid, fasta in sequences.items() if pid is not None and fasta is not None}
+        unseen = self.slots(list(new)) < 0
+        new = {pid: seq for (pid, seq), keep in zip(new.items(), unseen) if keep}
+        if not new:
+            return self
+        lengths = np.fromiter((len(seq) for seq in new.values()), dtype=np.int64, count=len(new))
+        offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(lengths)])
+        blob = _ChainedBlob(self._blob, int(self.offsets[-1]), b"".join(new.values()))
+        return SequenceStore(np.concatenate([self.ids, np.asarray(list(new), dtype=str)]), offsets, blob)
+
+    @classmethod
+    def build(cls, db_path, path, version: str, table: str = "conditions", base=None, since_rowid: int = 0):
+        """
+        Stream one sequence per protein out of SQLite into a store at `path`.
+
+        With a `base` store, its sequences are copied over and only proteins
+        it does not have are read, from rows after `since_rowid`.
+        """
+        path = Path(path)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            tmp.mkdir(parents=True, exist_ok=True)
+            with open(tmp / "seq.bin", "wb") as blob:
+                ids, offsets = _stream(db_path, blob, table, base, since_rowid)
+            np.save(tmp / "offsets.npy", np.asarray(offsets, dtype=np.int64))
+            np.save(tmp / "ids.npy", np.asarray(ids, dtype=str))
+            (tmp / "meta.json").write_text(json.dumps({"format": STORE_FORMAT, "version": version}))
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp, path)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)  # left over only if the build failed
+        return cls.open(path, version)
+
+    @classmethod
+    def read(cls, db_path, table: str = "conditions"):
+        """Store held in memory, read straight from SQLite (when none can be written)."""
+        blob = io.BytesIO()
+        ids, offsets = _stream(db_path, blob, table)
+        return cls(ids, np.asarray(offsets, dtype=np.int64), blob.getvalue())
+
+    @classmethod
+    def open(cls, path, version: str):
+        """Memory-map a store; None if missing or built for another dataset."""
+        path = Path(path)
+        try:
+            meta = json.loads((path / "meta.json").read_text())
+            if meta.get("format") != STORE_FORMAT or meta.get("version") != version:
+                return None
+            offsets = np.load(path / "offsets.npy")
+            ids = np.load(path / "ids.npy", mmap_mode="r" if len(offsets) > 1 else None)
+            size = int(offsets[-1])
+            blob = np.memmap(path / "seq.bin", dtype=np.uint8, mode="r") if size else b""
+            return cls(ids, offsets, blob)
+        except (OSError, ValueError):
+            return None
+
+
+def _stream(db_path, blob, table: str = "conditions", base: SequenceStore = None, since_rowid: int = 0):
+    """
+    Write one sequence per protein from SQLite into the binary file `blob`
+    (after `base`'s, see SequenceStore.build); returns (ids, offsets).
+    """
+    ids, offsets = [], [0]
+    where = "WHERE Protein_ID IS NOT NULL AND FASTA_Sequence IS NOT NULL"
+    params = ()
+    with sqlite3.connect(db_path) as conn:
+        if base is not None:
+            blob.write(bytes(base._blob[:base.offsets[-1]]))
+            ids, offsets = base.ids.tolist(), [int(o) for o in base.offsets]
+            known = set(ids)
+            where, params = f"{where} AND rowid > ?", (since_rowid,)
+        rows = conn.execute(
+            f"SELECT Protein_ID, MAX(FASTA_Sequence) FROM {table} {where} GROUP BY Protein_ID", params
+        )
+        for pid, fasta in rows:
+            if base is not None and str(pid) in known:
+                continue
+            seq = "".join(str(fasta).split()).encode("ascii", errors="replace")
+            blob.write(seq)
+            ids.append(pid)
+            offsets.append(offsets[-1] + len(seq))
+    return ids, offsets
+
+
+class _ChainedBlob:
+    """A base blob of `size` bytes followed by in-memory bytes, sliceable as one blob."""
+
+    def __init__(self, base, size: int, extra: bytes):
+        self.base, self.size, self.extra = base, size, extra
+
+    def __getitem__(self, key: slice):
+        start, stop, _ = key.indices(self.size + len(self.extra))
+        if stop <= self.size:
+            return self.base[start:stop]
+        if start >= self.size:
+            return self.extra[start - self.size:stop - self.size]
+        return bytes(self.base[start:self.size]) + self.extra[:stop - self.size]
+
+
+def store_path(db_path) -> Path:
+    """Directory holding the SequenceStore, next to the DB."""
+    path = Path(db_path)
+    return path.with_name(f"{path.stem}.sequences")
+
+
+def load_sequences(db_path, version: str) -> SequenceStore:
+    """
+    Open the store for this dataset version, building it if needed (under
+    the lock file). If it cannot be written, the sequences are held in
+    memory; if the DB cannot be read either, the result is an empty store
+    marked `failed`, which cached_store does not keep.
+    """
+    if not db_path:
+        return SequenceStore.empty()
+    path = store_path(db_path)
+    store = SequenceStore.open(path, version)
+    if store is not None:
+        return store
+    try:
+        with open(path.with_name(f"{path.name}.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            store = SequenceStore.open(path, version) or SequenceStore.build(db_path, path, version)
+        if store is not None:
+            return store
+    except OSError as exc:
+        print(f"[WARN] Could not write sequence store {path}: {exc}; holding it in memory")
+    except sqlite3.Error as exc:
+        print(f"[WARN] Could not build sequence store: {exc}")
+        return SequenceStore.empty(failed=True)
+    try:
+        return SequenceStore.read(db_path)
+    except (OSError, sqlite3.Error) as exc:
+        print(f"[WARN] Could not read sequences: {exc}")
+        return SequenceStore.empty(failed=True)
+
+
+class cached_store(cached_property):
+    """
+    cached_property for an engine's `sequences` and what is derived from
+    them: nothing is kept while the store is a failed stand-in, so the next
+    access tries again.
+    """
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = self.func(instance)
+        if isinstance(value, SequenceStore):
+            instance.__dict__["_sequences_failed"] = value.failed
+        if not instance.__dict__.get("_sequences_failed"):
+            instance.__dict__[self.attrname] = value
+        return value
@@ -0,0 +1,100 @@
+"""
+snapshot.py
+-------------
+Columnar on-disk snapshot of the conditions table.
+
+The first load writes an uncompressed Arrow IPC file next to the SQLite DB;
+later loads memory-map it instead of re-parsing the table through sqlite3.
+The snapshot carries a fingerprint of the DB file and is ignored as soon as
+the fingerprint changes.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # snapshots are an optimisation, never a requirement
+    pa = None
+
+FINGERPRINT_KEY = b"crystallization.fingerprint"
+
+
+def db_fingerprint(db_path) -> dict:
+    """
+    Fingerprint of a SQLite file: mtime, size and the header change counter.
+
+    `PRAGMA data_version` is only meaningful within a single connection, so it
+    cannot be persisted. The file change counter (header bytes 24–27) is its
+    on-disk counterpart and is bumped by every committed write transaction.
+    In WAL mode the main file may not change until a checkpoint, so the WAL
+    file's size and mtime are included as well.
+    """
+    path = Path(db_path)
+    st = path.stat()
+    with open(path, "rb") as fh:
+        header = fh.read(28)
+    fp = {
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "change_counter": int.from_bytes(header[24:28], "big") if len(header) == 28 else 0,
+    }
+    wal = path.with_name(path.name + "-wal")
+    if wal.exists():
+        wst = wal.stat()
+        fp["wal"] = [wst.st_mtime_ns, wst.st_size]
+    return fp
+
+
+def dataset_version(fingerprint: dict) -> str:
+    """Short stable hash of a fingerprint, used to key caches by dataset."""
+    return hashlib.sha1(json.dumps(fingerprint, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def snapshot_path(db_path, table: str) -> Path:
+    """Snapshot file for `table`, stored next to the DB."""
+    path = Path(db_path)
+    return path.with_name(f"{path.stem}.{table}.arrow")
+
+
+def read_snapshot(path, fingerprint: dict):
+    """Memory-map a snapshot; return None if missing, stale or unreadable."""
+    if pa is None or not Path(path).exists():
+        return None
+    try:
+        source = pa.memory_map(str(path), "r")
+        table = ipc.open_file(source).read_all()
+    except (OSError, pa.ArrowInvalid) as exc:
+        print(f"[WARN] Ignoring unreadable snapshot {path}: {exc}")
+        return None
+    meta = table.schema.metadata or {}
+    if json.loads(meta.get(FINGERPRINT_KEY, b"null")) != fingerprint:
+        return None
+    return table.to_pandas(split_blocks=True)
+
+
+def write_snapshot(df: pd.DataFrame, path, fingerprint: dict) -> bool:
+    """Write `df` atomically as an Arrow IPC file tagged with `fingerprint`."""
+    if pa is None:
+        return False
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            FINGERPRINT_KEY: json.dumps(fingerprint).encode(),
+        })
+        with pa.OSFile(str(tmp), "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+    except (OSError, pa.ArrowException) as exc:
+        print(f"[WARN] Could not write snapshot {path}: {exc}")
+        tmp.unlink(missing_ok=True)
+        return False
+    return True
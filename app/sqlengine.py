@@ -0,0 +1,385 @@
+"""
+sqlengine.py
+--------------
+SQL pushdown query engine, for conditions tables larger than a worker's RAM.
+
+    QUERY_ENGINE=sql    serve from SQL instead of the in-memory Dataset
+                        (see app.reload.dataset_loader)
+
+The conditions table is streamed once, in chunks, through the same
+preparation as a full load (prepare_frame: parsed pH, normalized
+concentrations) into an indexed side database next to the DB:
+
+    <db stem>.engine.sqlite
+        rows        one row per condition; chemical as a code, derived values
+        chemicals   per-chemical summary (count, proteins, CID, sequence totals)
+        meta        dataset version, row count, value column dtypes
+
+SqlDataset answers the calls the callbacks make on app.dataset.Dataset
+(summary, distributions, co-occurrence, protein lookup) with queries that
+return aggregates only: quantiles are index seeks, histogram and KDE binning
+are GROUP BYs over one chemical's index range, co-occurrence is a join on
+protein. A worker holds the per-chemical summary and nothing per row.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.bundle import bundle_lock, load_dataset
+from app.data_utils import SCHEMA, TABLE, current_fingerprint, get_db_path, prepare_frame
+from app.dataset import VALUE_COLUMNS, mean_sequence_length
+from app.indexes import CHEM_COL, ChemicalList, ProteinIndex, sorted_histogram
+from app.sequences import SequenceStore, cached_store, load_sequences
+from app.snapshot import dataset_version
+
+ENGINE_FORMAT = 1
+BUILD_CHUNK = 250_000  # rows prepared and inserted per step while building
+
+_SCHEMA_SQL = f"""
+CREATE TABLE rows (
+    row_id        INTEGER PRIMARY KEY,
+    chem          INTEGER,
+    protein       TEXT,
+    protein_key   TEXT,
+    concentration TEXT,
+    ph            TEXT,
+    {", ".join(f"{col} REAL" for col in VALUE_COLUMNS.values())}
+);
+CREATE TABLE chemicals (
+    code INTEGER PRIMARY KEY, name TEXT, count INTEGER, unique_proteins INTEGER,
+    cid TEXT, seq_total REAL, seq_rows INTEGER
+);
+CREATE TABLE seq (protein TEXT PRIMARY KEY, length INTEGER);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+_INDEX_SQL = "\n".join(
+    [f"CREATE INDEX rows_{col} ON rows (chem, {col});" for col in VALUE_COLUMNS.values()] + [
+        "CREATE INDEX rows_chem_protein ON rows (chem, protein);",
+        "CREATE INDEX rows_protein_chem ON rows (protein, chem);",
+        "CREATE INDEX rows_protein_key ON rows (protein_key);",
+    ]
+)
+
+
+def engine_path(db_path) -> Path:
+    """SQLite file holding the engine tables, next to the DB."""
+    path = Path(db_path)
+    return path.with_name(f"{path.stem}.engine.sqlite")
+
+
+def _text(series: pd.Series) -> list:
+    """Column values as str / None, for insertion."""
+    return [None if pd.isna(v) else str(v) for v in series.astype(object)]
+
+
+def _first_cids(src: sqlite3.Connection, table: str) -> dict:
+    """
+    First non-null CID of each chemical (in table order), as str the way a
+    full load renders it: pandas reads an integer column holding NULLs or
+    reals as float64, so 1056 becomes "1056.0" there, but stays "1056"
+    next to text values (object column).
+    """
+    nulls, reals, texts = src.execute(
+        f"SELECT SUM(CID IS NULL), SUM(typeof(CID) = 'real'), SUM(typeof(CID) IN ('text', 'blob')) FROM {table}"
+    ).fetchone()
+    as_float = not texts and bool(nulls or reals)
+    rows = src.execute(
+        f'SELECT "{CHEM_COL}", CID FROM {table} WHERE rowid IN ('
+        f'SELECT MIN(rowid) FROM {table} WHERE CID IS NOT NULL AND "{CHEM_COL}" IS NOT NULL '
+        f'GROUP BY "{CHEM_COL}")'
+    )
+    return {str(chem): str(float(cid)) if as_float else str(cid) for chem, cid in rows}
+
+
+def build_engine(db_path, path, version: str, table: str = TABLE, chunk: int = BUILD_CHUNK) -> None:
+    """Stream the conditions table into a fresh engine database at `path`."""
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.unlink(missing_ok=True)
+    src, out = sqlite3.connect(db_path), sqlite3.connect(tmp)
+    try:
+        out.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + _SCHEMA_SQL)
+        available = {row[1] for row in src.execute(f"PRAGMA table_info({table})")}
+        cols = ", ".join(f'"{c}"' for c in SCHEMA if c in available)
+        chemicals = sorted(str(c) for (c,) in src.execute(
+            f'SELECT DISTINCT "{CHEM_COL}" FROM {table} WHERE "{CHEM_COL}" IS NOT NULL'))
+        vocabulary = pd.Index(chemicals)
+
+        n_rows = 0
+        float32 = dict.fromkeys(VALUE_COLUMNS.values(), True)  # dtype a full load would give
+        for part in pd.read_sql(f"SELECT rowid AS row_id, {cols} FROM {table}", src, chunksize=chunk):
+            row_id = part.pop("row_id").tolist()
+            df = prepare_frame(part)
+            codes = vocabulary.get_indexer(df[CHEM_COL].astype(object))
+            protein = _text(df["Protein_ID"])
+            values = []
+            for col in VALUE_COLUMNS.values():
+                x = df[col] if col in df.columns else pd.Series(np.nan, index=df.index)
+                float32[col] &= x.dtype == np.float32
+                values.append(x.to_numpy(np.float64).tolist())  # NaN binds as NULL
+            out.executemany(
+                f"INSERT INTO rows VALUES ({', '.join('?' * (6 + len(values)))})",
+                zip(row_id, [None if c < 0 else c for c in codes.tolist()], protein,
+                    [None if p is None else p.upper() for p in protein],
+                    _text(df.get("Concentration", pd.Series(None, index=df.index))),
+                    _text(df.get("pH", pd.Series(None, index=df.index))), *values),
+            )
+            n_rows += len(df)
+        out.executescript(_INDEX_SQL)
+
+        store = load_sequences(db_path, version)
+        out.executemany("INSERT OR IGNORE INTO seq VALUES (?, ?)", zip(store.ids.tolist(), store.lengths.tolist()))
+        counts = dict(out.execute("SELECT chem, COUNT(*) FROM rows WHERE chem IS NOT NULL GROUP BY chem"))
+        proteins = dict(out.execute(
+            "SELECT chem, COUNT(DISTINCT protein) FROM rows WHERE chem IS NOT NULL GROUP BY chem"))
+        seq = {chem: (total, n) for chem, total, n in out.execute(
+            "SELECT chem, SUM(length), COUNT(*) FROM rows JOIN seq USING (protein) "
+            "WHERE chem IS NOT NULL GROUP BY chem")}
+        cids = _first_cids(src, table) if "CID" in available else {}
+        out.executemany("INSERT INTO chemicals VALUES (?, ?, ?, ?, ?, ?, ?)", [
+            (i, name, counts.get(i, 0), proteins.get(i, 0), cids.get(name), *seq.get(i, (0.0, 0)))
+            for i, name in enumerate(chemicals)
+        ])
+        out.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("format", str(ENGINE_FORMAT)),
+            ("version", version),
+            ("rows", str(n_rows)),
+            ("dtypes", json.dumps({col: "float32" if f32 else "float64" for col, f32 in float32.items()})),
+        ])
+        out.commit()
+    except BaseException:
+        out.close()
+        tmp.unlink(missing_ok=True)
+        raise
+    finally:
+        src.close()
+    out.close()
+    os.replace(tmp, path)
+
+
+class SqlDataset:
+    """Dataset served from the engine database (same calls as app.dataset.Dataset)."""
+
+    def __init__(self, path, version: str, db_path=None):
+        self.path = Path(path)
+        self.version = version
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._conn()
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        self.dtypes = {col: np.dtype(dt) for col, dt in json.loads(meta["dtypes"]).items()}
+        table = pd.read_sql("SELECT * FROM chemicals ORDER BY code", conn).set_index("name")
+        table.index.name = "chemical"
+        self.chemicals = ChemicalList(table.index.tolist(), int(meta["rows"]))
+        self.summary = table[["count", "unique_proteins", "cid"]]
+        self.sequence_totals = table[["seq_total", "seq_rows"]]
+        self.avg_sequence_length = mean_sequence_length(self.sequence_totals)
+        self.cooccurrence = SqlCooccurrence(self)
+
+    def _conn(self) -> sqlite3.Connection:
+        """Read-only connection of this thread (reopened after a fork)."""
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            local.pid = os.getpid()
+        return local.conn
+
+    def query(self, sql: str, params=()) -> list:
+        return self._conn().execute(sql, params).fetchall()
+
+    def code(self, chem):
+        """Chemical code of `chem`, or None."""
+        return self.chemicals._pos.get(chem)
+
+    @cached_store
+    def sequences(self) -> SequenceStore:
+        return load_sequences(self.db_path, self.version)
+
+    def distribution(self, key: str, chem) -> "SqlDistribution":
+        col = VALUE_COLUMNS[key]
+        return SqlDistribution(self, self.code(chem), col, self.dtypes.get(col, np.dtype(np.float64)))
+
+    def protein_conditions(self, protein_id) -> pd.DataFrame:
+        """Condition rows of `protein_id` (case-insensitive), in chemical then table order."""
+        rows = self.query(
+            "SELECT r.protein, c.name, r.concentration, r.ph FROM rows r LEFT JOIN chemicals c ON c.code = r.chem "
+            "WHERE r.protein_key = ? ORDER BY r.chem IS NULL, r.chem, r.row_id",
+            (ProteinIndex.normalize(protein_id),),
+        )
+        columns = ["Protein_ID", CHEM_COL, "Concentration", "pH"]
+        return pd.DataFrame(rows, columns=columns, dtype=object).astype("category")
+
+
+class SqlDistribution:
+    """One chemical's values of one column, answered in SQL (see app.distribution)."""
+
+    def __init__(self, engine: SqlDataset, code, column: str, dtype: np.dtype):
+        self._engine, self._code, self._col, self._dtype = engine, code, column, dtype
+        self._where = f"chem = ? AND {column} IS NOT NULL"
+        self._n, self._lo, self._hi = 0, None, None
+        if code is not None:
+            self._n, self._lo, self._hi = self._one(f"SELECT COUNT(*), MIN({column}), MAX({column})")
+
+    def _one(self, select: str, params=()):
+        """Single-row aggregate over this distribution; `params` bind in `select`."""
+        return self._engine.query(f"{select} FROM rows WHERE {self._where}", (*params, self._code))[0]
+
+    def __len__(self) -> int:
+        return self._n
+
+    def values(self) -> np.ndarray:
+        if not self._n:
+            return np.empty(0, dtype=self._dtype)
+        rows = self._engine.query(f"SELECT {self._col} FROM rows WHERE {self._where} ORDER BY {self._col}",
+                                  (self._code,))
+        return np.array([x for (x,) in rows], dtype=self._dtype)
+
+    def extent(self) -> tuple[float, float]:
+        return float(self._lo), float(self._hi)
+
+    def quantile(self, q: float) -> float:
+        """Same interpolation (and dtype arithmetic) as indexes.sorted_quantile, on two seeked rows."""
+        pos = q * (self._n - 1)
+        lo = int(np.floor(pos))
+        hi = min(lo + 1, self._n - 1)
+        rows = self._engine.query(
+            f"SELECT {self._col} FROM rows WHERE {self._where} ORDER BY {self._col} LIMIT ? OFFSET ?",
+            (self._code, hi - lo + 1, lo),
+        )
+        v = np.array([x for (x,) in rows], dtype=self._dtype)
+        return float(v[0] + (v[-1] - v[0]) * (pos - lo))
+
+    def histogram(self, bin_width: float):
+        """
+        indexes.sorted_histogram in SQL: same aligned edges, same outer bins.
+        With more bins than values the output is as large as the values, so
+        those are fetched and binned as they are.
+        """
+        lo, hi = self.extent()
+        start = np.floor(lo / bin_width) * bin_width
+        n_bins = max(int(np.floor((hi - start) / bin_width)) + 1, 1)  # start can round past lo
+        if n_bins > self._n:
+            return sorted_histogram(self.values(), bin_width)
+        # truncated bin, moved by one where the float64 edge start + i·width disagrees
+        rows = self._engine.query(
+            f"SELECT b, COUNT(*) FROM ("
+            f"  SELECT MIN(MAX(t - (x < :start + t * :bw) + (x >= :start + (t + 1) * :bw), 0), :last) AS b FROM ("
+            f"    SELECT {self._col} AS x, CAST(({self._col} - :start) / :bw AS INTEGER) AS t"
+            f"    FROM rows WHERE chem = :chem AND {self._col} IS NOT NULL))"
+            f" GROUP BY b ORDER BY b",
+            {"start": start, "bw": bin_width, "last": n_bins - 1, "chem": self._code},
+        )
+        bins = np.array([b for b, _ in rows], dtype=np.int64)
+        return start + bins * bin_width, np.array([c for _, c in rows], dtype=np.int64)
+
+    def std(self) -> float:
+        """Population standard deviation, two passes like np.std."""
+        (mean,) = self._one(f"SELECT AVG({self._col})")
+        (var,) = self._one(f"SELECT AVG(({self._col} - ?) * ({self._col} - ?))", (mean, mean))
+        return float(np.sqrt(var))
+
+    def linear_bins(self, lo: float, dx: float, bins: int) -> np.ndarray:
+        """distribution.linear_bin as a GROUP BY: each value split between its two grid nodes."""
+        rows = self._engine.query(
+            f"SELECT l, SUM(1.0 - (p - l)), SUM(p - l) FROM ("
+            f"  SELECT MIN(MAX(CAST(p AS INTEGER) - (p < CAST(p AS INTEGER)), 0), :last) AS l, p FROM ("
+            f"    SELECT ({self._col} - :lo) / :dx AS p FROM rows WHERE chem = :chem AND {self._col} IS NOT NULL))"
+            f" GROUP BY l",
+            {"lo": lo, "dx": dx, "last": bins - 2, "chem": self._code},
+        )
+        weights = np.zeros(bins)
+        for left, w_left, w_right in rows:
+            weights[left] += w_left
+            weights[left + 1] += w_right
+        return weights
+
+
+class SqlCooccurrence:
+    """CooccurrenceIndex.top_partners / pair_counts as joins on protein."""
+
+    def __init__(self, engine: SqlDataset):
+        self._engine = engine
+        self.version = engine.version
+        self.chemicals = np.array(engine.chemicals.chemicals, dtype=object)
+
+    def top_partners(self, chem, k: int) -> pd.Series:
+        """
+        Condition-row counts of the other chemicals among the proteins that
+        used `chem`: top k, descending, ties in chemical order.
+        """
+        code = self._engine.code(chem)
+        rows = [] if code is None else self._engine.query(
+            "SELECT r.chem, COUNT(*) AS n FROM rows r "
+            "JOIN (SELECT DISTINCT protein FROM rows WHERE chem = :c AND protein IS NOT NULL) p USING (protein) "
+            "WHERE r.chem IS NOT NULL AND r.chem != :c GROUP BY r.chem ORDER BY n DESC, r.chem LIMIT :k",
+            {"c": code, "k": k},
+        )
+        idx = np.array([c for c, _ in rows], dtype=np.int64)
+        return pd.Series(np.array([n for _, n in rows], dtype=np.int64), index=self.chemicals[idx], name="count")
+
+    def pair_counts(self, chem, others) -> np.ndarray:
+        """
+        Dense len(others)² matrix: number of distinct proteins that used `chem`
+        and both chemicals of each pair (diagonal: each chemical alone).
+
+        SQL groups those proteins by which of `others` they used (a bitmask
+        over their positions); the matrix is summed from the distinct masks.
+        """
+        codes = [self._engine.code(c) for c in others]
+        if self._engine.code(chem) is None or not codes:
+            return np.zeros((len(codes), len(codes)), dtype=np.int32)
+        bit = " ".join(f"WHEN {c} THEN {1 << i}" for i, c in enumerate(codes) if c is not None)
+        rows = self._engine.query(
+            f"SELECT mask, COUNT(*) FROM ("
+            f"  SELECT SUM(DISTINCT CASE r.chem {bit} END) AS mask FROM rows r"
+            f"  JOIN (SELECT DISTINCT protein FROM rows WHERE chem = ? AND protein IS NOT NULL) p USING (protein)"
+            f"  WHERE r.chem IN ({', '.join(str(c) for c in codes if c is not None)}) GROUP BY r.protein)"
+            f" GROUP BY mask",
+            (self._engine.code(chem),),
+        )
+        masks = np.array([m for m, _ in rows], dtype=np.int64)
+        used = (masks[:, None] >> np.arange(len(codes))) & 1
+        return ((used.T * np.array([n for _, n in rows], dtype=np.int64)) @ used).astype(np.int32)
+
+
+def open_engine(path, version: str, db_path=None):
+    """SqlDataset over the engine database at `path`; None if missing or built for another version."""
+    try:
+        with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as conn:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+    except sqlite3.Error:
+        return None
+    if meta.get("format") != str(ENGINE_FORMAT) or meta.get("version") != version:
+        return None
+    return SqlDataset(path, version, db_path)
+
+
+def load_sql_dataset(table: str = TABLE):
+    """SqlDataset for the configured DB, building its engine database if needed."""
+    db_path = get_db_path()
+    if not Path(db_path).exists():
+        return load_dataset(table)  # empty in-memory dataset
+    version = dataset_version(current_fingerprint(db_path))
+    path = engine_path(db_path)
+    dataset = open_engine(path, version, db_path)
+    if dataset is None:
+        with bundle_lock(path):
+            # another process may have built it while we waited for the lock
+            dataset = open_engine(path, version, db_path)
+            if dataset is None:
+                t0 = time.perf_counter()
+                build_engine(db_path, path, version, table)
+                dataset = open_engine(path, version, db_path)
+                print(f"[INFO] Built SQL engine database {path} in {time.perf_counter() - t0:.1f}s")
+    print(f"[INFO] Serving {len(dataset.chemicals):,} rows from {path} (QUERY_ENGINE=sql)")
+    return dataset
+
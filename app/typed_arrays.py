@@ -0,0 +1,169 @@
+"""
+typed_arrays.py
+-----------------
+NumPy arrays as base64 typed-array specs, the binary form plotly.js (≥ 2.28)
+reads in figure data:
+
+    {"dtype": "f8", "bdata": "<base64 of the little-endian bytes>"}   (+ "shape" for 2-D)
+
+The dashboard's clientside code decodes the same specs (assets/rebin.js), so
+numeric payloads in dcc.Store travel as bytes rather than JSON text.
+
+Figures leave the server the same way (compact_figure, FIGURE_ENCODING):
+every numeric array of at least MIN_TYPED_LENGTH values in the trace data
+becomes a spec of the narrowest exact type — integer types for whole
+numbers, float32 when its rounding error stays below F32_MAX_ERROR of the
+array's span (invisible at any plot size), float64 otherwise. Arrays stay
+JSON when that is shorter (e.g. short decimals as float64), or when they
+hold infinities, None or strings; NaN gaps are kept.
+
+    FIGURE_ENCODING=typed   (default) encode figure arrays
+    FIGURE_ENCODING=json    plain JSON lists, as plotly.py emits them
+"""
+
+import base64
+import functools
+import os
+
+import numpy as np
+
+FIGURE_ENCODING = os.environ.get("FIGURE_ENCODING", "typed")
+MIN_TYPED_LENGTH = 32     # shorter arrays cost less as JSON than as base64
+F32_MAX_ERROR = 1e-6      # float32 when max rounding error ≤ this × the array's span
+SKIP_KEYS = {"text", "hovertext", "ids", "labels", "parents"}  # label-like, even when numeric
+
+# spec dtype → NumPy dtype (little-endian, as JavaScript typed arrays on every platform we serve)
+DTYPES = {
+    "f8": "<f8", "f4": "<f4",
+    "i4": "<i4", "u4": "<u4", "i2": "<i2", "u2": "<u2", "i1": "i1", "u1": "u1",
+}
+
+
+def typed_array(a, dtype: str = None) -> dict:
+    """Spec of `a` (1-D or 2-D) as `dtype` (a DTYPES key; default: from a's dtype)."""
+    a = np.asarray(a)
+    if dtype is None:
+        dtype = next((k for k, v in DTYPES.items() if np.dtype(v) == a.dtype.newbyteorder("<")), None)
+        if dtype is None:
+            raise ValueError(f"no typed-array dtype for {a.dtype}")
+    data = np.ascontiguousarray(a, dtype=DTYPES[dtype])
+    spec = {"dtype": dtype, "bdata": base64.b64encode(data.tobytes()).decode("ascii")}
+    if data.ndim == 2:
+        spec["shape"] = f"{data.shape[0]},{data.shape[1]}"
+    return spec
+
+
+def from_typed_array(spec: dict) -> np.ndarray:
+    """Inverse of typed_array."""
+    a = np.frombuffer(base64.b64decode(spec["bdata"]), dtype=DTYPES[spec["dtype"]])
+    if "shape" in spec:
+        a = a.reshape([int(n) for n in str(spec["shape"]).split(",")])
+    return a
+
+
+def smallest_float(a: np.ndarray) -> str:
+    """"f4" when every value of float array `a` survives float32 unchanged, else "f8"."""
+    a = np.asarray(a, dtype=np.float64)
+    with np.errstate(over="ignore"):
+        return "f4" if np.array_equal(a.astype(np.float32).astype(np.float64), a, equal_nan=True) else "f8"
+
+
+def smallest_uint(a: np.ndarray) -> str:
+    """Narrowest unsigned spec dtype holding every value of non-negative integer array `a`."""
+    top = int(np.max(a)) if len(a) else 0
+    return "u1" if top < 1 << 8 else "u2" if top < 1 << 16 else "u4"
+
+
+def _int_dtype(lo: int, hi: int):
+    """Narrowest spec integer dtype holding [lo, hi], or None beyond 32 bits."""
+    for dtype in (("u1", "u2", "u4") if lo >= 0 else ("i1", "i2", "i4")):
+        info = np.iinfo(DTYPES[dtype])
+        if info.min <= lo and hi <= info.max:
+            return dtype
+    return None
+
+
+def _json_chars(a: np.ndarray) -> float:
+    """Estimated JSON text per value of `a` (from up to 64 evenly spaced values)."""
+    flat = a.ravel()
+    sample = flat[np.linspace(0, flat.size - 1, min(flat.size, 64)).astype(np.int64)]
+    return np.mean([len(repr(v)) + 1 for v in sample.tolist()])
+
+
+def _worth(a: np.ndarray, dtype: str) -> bool:
+    """Base64 (4/3 chars per byte) beats the JSON text of `a`."""
+    return np.dtype(DTYPES[dtype]).itemsize * 4 / 3 < _json_chars(a)
+
+
+def encode_array(values, exact: bool = False):
+    """
+    Typed-array spec of a numeric 1-D / 2-D array worth encoding (see the
+    module docstring), else None. `exact` allows float32 only when lossless.
+    """
+    try:
+        a = np.asarray(values)
+    except ValueError:  # ragged
+        return None
+    if a.dtype.kind not in "iuf" or a.ndim not in (1, 2) or a.size < MIN_TYPED_LENGTH:
+        return None
+    dtype = None
+    if a.dtype.kind == "f":
+        if np.isinf(a).any():
+            return None
+        finite = a[~np.isnan(a)]
+        if len(finite) == a.size and np.array_equal(finite, np.floor(finite)):
+            dtype = _int_dtype(finite.min(), finite.max())
+        if dtype is None and len(finite) == 0:
+            dtype = "f4"
+        elif dtype is None:
+            with np.errstate(over="ignore", invalid="ignore"):
+                error = np.max(np.abs(finite.astype(np.float32).astype(np.float64) - finite))
+            span = float(finite.max() - finite.min()) or float(np.abs(finite).max())
+            dtype = "f4" if error <= (0 if exact else F32_MAX_ERROR * span) else "f8"
+    else:
+        dtype = _int_dtype(int(a.min()), int(a.max()))
+        if dtype is None and np.abs(a).max() < 2 ** 53:
+            dtype = "f8"
+    return typed_array(a, dtype) if dtype is not None and _worth(a, dtype) else None
+
+
+def _compact(obj, exact: bool = False):
+    if isinstance(obj, dict):
+        return {k: obj[k] if k in SKIP_KEYS else _compact(obj[k], exact) for k in obj}
+    if isinstance(obj, (list, tuple, np.ndarray)):
+        spec = encode_array(obj, exact)
+        return obj if spec is None else spec
+    return obj
+
+
+def compact_figure(fig) -> dict:
+    """
+    Figure (go.Figure or its dict) as a dict whose trace arrays are
+    typed-array specs. Samples that the browser bins itself (histogram
+    traces) keep every bit, so no value moves across a bin edge.
+    """
+    fig = fig.to_plotly_json() if hasattr(fig, "to_plotly_json") else fig
+    return {**fig, "data": [_compact(trace, exact=str(trace.get("type", "")).startswith("histogram"))
+                            for trace in fig.get("data", [])]}
+
+
+def _compact_output(value):
+    if hasattr(value, "to_plotly_json") and hasattr(value, "data"):
+        return compact_figure(value)
+    if isinstance(value, (tuple, list)):
+        return type(value)(_compact_output(v) for v in value)
+    return value
+
+
+def encoded_figures(fn):
+    """
+    Callback decorator: figures it returns (alone or in a tuple of outputs)
+    go out through compact_figure when FIGURE_ENCODING=typed.
+    """
+    if FIGURE_ENCODING != "typed":
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return _compact_output(fn(*args, **kwargs))
+    return wrapper
@@ -0,0 +1,130 @@
+/*
+ * Clientside re-binning of the concentration histograms (REBIN_MODE=client).
+ *
+ * The server stores a selection's distinct values once (app.figures.rebin_data);
+ * bin-width and IQR changes are then drawn here, with the same arithmetic as
+ * app.indexes.sorted_histogram and app.figures.make_hist_with_kde_binwidth,
+ * so the figure matches the server-rendered one.
+ */
+(function () {
+    var TYPED = {
+        f8: Float64Array, f4: Float32Array,
+        i4: Int32Array, u4: Uint32Array, i2: Int16Array, u2: Uint16Array, i1: Int8Array, u1: Uint8Array
+    };
+
+    // app.typed_arrays spec → typed array
+    function decodeTypedArray(spec) {
+        var raw = atob(spec.bdata);
+        var bytes = new Uint8Array(raw.length);
+        for (var i = 0; i < raw.length; i++) {
+            bytes[i] = raw.charCodeAt(i);
+        }
+        return new TYPED[spec.dtype](bytes.buffer);
+    }
+
+    // decoded values, prefix counts and KDE per stored payload
+    var decoded = new WeakMap();
+
+    function prepare(data) {
+        var ready = decoded.get(data);
+        if (!ready) {
+            var values = decodeTypedArray(data.values);
+            var counts = data.counts ? decodeTypedArray(data.counts) : null;
+            var cum = new Float64Array(values.length + 1);
+            for (var i = 0; i < values.length; i++) {
+                cum[i + 1] = cum[i] + (counts ? counts[i] : 1);
+            }
+            ready = {values: values, cum: cum, kde: data.kde ? decodeTypedArray(data.kde) : null};
+            decoded.set(data, ready);
+        }
+        return ready;
+    }
+
+    function lowerBound(a, x) {
+        var lo = 0, hi = a.length;
+        while (lo < hi) {
+            var mid = (lo + hi) >>> 1;
+            if (a[mid] < x) {
+                lo = mid + 1;
+            } else {
+                hi = mid;
+            }
+        }
+        return lo;
+    }
+
+    // sorted_histogram over distinct values with prefix counts: [left edges, counts] of non-empty bins
+    function histogram(values, cum, bw) {
+        var n = cum[values.length];
+        var start = Math.floor(values[0] / bw) * bw;
+        // at least one bin: start can round past values[0]
+        var nBins = Math.max(Math.floor((values[values.length - 1] - start) / bw) + 1, 1);
+        var left = [], counts = [];
+        if (nBins <= n) {
+            var prev = 0;
+            for (var i = 1; i <= nBins; i++) {
+                var cut = i === nBins ? n : cum[lowerBound(values, start + i * bw)];
+                if (cut > prev) {
+                    left.push(start + (i - 1) * bw);
+                    counts.push(cut - prev);
+                }
+                prev = cut;
+            }
+        } else {
+            var last = null;
+            for (var j = 0; j < values.length; j++) {
+                var idx = Math.min(Math.max(Math.floor((values[j] - start) / bw), 0), nBins - 1);
+                if (idx !== last) {
+                    left.push(start + idx * bw);
+                    counts.push(0);
+                    last = idx;
+                }
+                counts[counts.length - 1] += cum[j + 1] - cum[j];
+            }
+        }
+        return [left, counts];
+    }
+
+    // Python's round(): halves go to the even neighbour
+    function roundHalfEven(x) {
+        var r = Math.round(x);
+        return Math.abs(x % 1) === 0.5 ? 2 * Math.round(x / 2) : r;
+    }
+
+    function figure(data, showAll, binWidth) {
+        if (!data) {
+            return window.dash_clientside.no_update;
+        }
+        if (!data.values) {
+            return data.figure;
+        }
+        var limits = data.bin_width;
+        var bw = Math.max(limits.min, Math.min(parseFloat(binWidth || limits.default), limits.max));
+        var ready = prepare(data);
+        var hist = histogram(ready.values, ready.cum, bw);
+
+        var fig = Object.assign({}, data.figure, {data: data.figure.data.slice()});
+        fig.data[0] = Object.assign({}, fig.data[0], {
+            x: hist[0].map(function (l) { return l + bw / 2; }),
+            y: hist[1],
+            width: bw * (1 - 0.02)
+        });
+        if (ready.kde && fig.data.length > 1) {
+            var height = data.n / Math.max(roundHalfEven((data.extent[1] - data.extent[0]) / bw), 1);
+            fig.data[1] = Object.assign({}, fig.data[1], {
+                y: Array.prototype.map.call(ready.kde, function (d) { return d * height; })
+            });
+        }
+        var focus = (showAll || []).indexOf("all") < 0;
+        if (focus && data.iqr) {
+            fig.layout = Object.assign({}, fig.layout, {
+                xaxis: Object.assign({}, fig.layout.xaxis, {range: data.iqr})
+            });
+        }
+        return fig;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        rebin: {figure: figure, decodeTypedArray: decodeTypedArray}
+    });
+})();
@@ -0,0 +1,122 @@
+"""
+bench_engines.py
+------------------
+Latency per view of the dashboard's queries, pandas vs. Polars.
+
+    python -m benchmarks.bench_engines [rows ...]    # default: 1M 10M
+
+For each view, three ways to answer it:
+
+- pandas scan:     the query as a plain pandas expression over the frame
+                   (boolean mask, groupby().agg(nunique), pivot_table, upper-cased mask)
+- polars:          the same query in app.polarsengine (QUERY_ENGINE=polars)
+- pandas indexed:  app.dataset.Dataset, the default engine (built at load)
+
+Views: chemical filter (one chemical's sorted mM values), top-50 summary
+(per-chemical count + distinct proteins), co-occurrence (partner counts and
+the pivot of the top 15), protein lookup. Median over a frequent, a mid and
+a rare chemical / a few proteins. Results are checked against each other.
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from app.data_utils import prepare_frame
+from app.dataset import Dataset
+from app.indexes import CHEM_COL
+from app.polarsengine import PolarsDataset, pl
+from benchmarks.synthetic import make_conditions
+
+CHEMICALS = ["CHEMICAL 0000", "CHEMICAL 0040", "CHEMICAL 0700"]
+
+
+def scan_filter(df, chem):
+    return np.sort(df.loc[df[CHEM_COL] == chem, "conc_mM"].dropna().to_numpy())
+
+
+def scan_summary(df):
+    return df.groupby(CHEM_COL, observed=True)["Protein_ID"].agg(["size", "nunique"])
+
+
+def scan_cooccurrence(df, chem):
+    proteins = df.loc[df[CHEM_COL] == chem, "Protein_ID"].unique()
+    sub = df[df["Protein_ID"].isin(proteins)]
+    counts = sub.loc[sub[CHEM_COL] != chem, CHEM_COL].value_counts(sort=False)
+    top = counts[counts > 0].sort_values(ascending=False, kind="stable").head(15)
+    pivot = sub[sub[CHEM_COL].isin(top.index)].pivot_table(
+        index="Protein_ID", columns=CHEM_COL, aggfunc="size", fill_value=0, observed=True)
+    B = (pivot.reindex(columns=top.index, fill_value=0).to_numpy() > 0).astype(np.int32)
+    return top, B.T @ B
+
+
+def scan_protein(df, pid):
+    return df[df["Protein_ID"].astype(str).str.upper() == pid.upper()]
+
+
+def engine_cooccurrence(ds, chem):
+    top = ds.cooccurrence.top_partners(chem, 15)
+    return top, ds.cooccurrence.pair_counts(chem, top.index.tolist())
+
+
+def _median_ms(fn, args_list, repeat: int = 3) -> float:
+    times = []
+    for args in args_list:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn(*args)
+            times.append(time.perf_counter() - t0)
+    return float(np.median(times) * 1e3)
+
+
+def main(sizes):
+    if pl is None:
+        print("[WARN] polars is not installed (pip install -r requirements-polars.txt)")
+        return
+    print(f"{'rows':>12} {'view':<16} {'pandas scan':>12} {'polars':>10} {'pandas indexed':>15}   (ms)")
+    for n in sizes:
+        df = prepare_frame(make_conditions(n, seq_len=10))
+        t0 = time.perf_counter()
+        indexed = Dataset(df)
+        t_index = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        polars = PolarsDataset(df)
+        t_polars = time.perf_counter() - t0
+        proteins = [str(p).lower() for p in df["Protein_ID"].dropna().unique()[:: max(n // 40, 1)][:5]]
+
+        # same answers before timing anything
+        for chem in CHEMICALS:
+            a, b = scan_filter(df, chem), polars.distribution("mM", chem).values()
+            assert np.array_equal(a, b) and np.array_equal(a, indexed.distribution("mM", chem).values())
+            (ta, ma), (tb, mb) = scan_cooccurrence(df, chem), engine_cooccurrence(polars, chem)
+            assert ta.index.tolist() == tb.index.tolist() and np.array_equal(ma, mb)
+        assert np.array_equal(PolarsDataset.summary.func(polars)["unique_proteins"].to_numpy(),
+                              Dataset.summary.func(indexed)["unique_proteins"].to_numpy())
+
+        chems = [(c,) for c in CHEMICALS]
+        rows = [
+            ("chemical filter",
+             _median_ms(lambda c: scan_filter(df, c), chems),
+             _median_ms(lambda c: polars.distribution("mM", c).values(), chems),
+             _median_ms(lambda c: indexed.distribution("mM", c).values(), chems)),
+            ("top-50 summary",
+             _median_ms(lambda: scan_summary(df), [()]),
+             _median_ms(lambda: PolarsDataset.summary.func(polars), [()]),
+             _median_ms(lambda: Dataset.summary.func(indexed), [()])),
+            ("co-occurrence",
+             _median_ms(lambda c: scan_cooccurrence(df, c), chems, repeat=1),
+             _median_ms(lambda c: engine_cooccurrence(polars, c), chems, repeat=1),
+             _median_ms(lambda c: engine_cooccurrence(indexed, c), chems, repeat=1)),
+            ("protein lookup",
+             _median_ms(lambda p: scan_protein(df, p), [(p,) for p in proteins]),
+             _median_ms(lambda p: polars.protein_conditions(p), [(p,) for p in proteins]),
+             _median_ms(lambda p: indexed.protein_conditions(p), [(p,) for p in proteins])),
+        ]
+        for view, scan, pol, idx in rows:
+            print(f"{n:>12,} {view:<16} {scan:>12.1f} {pol:>10.1f} {idx:>15.2f}")
+        print(f"{n:>12,} {'load / build':<16} {'':>12} {t_polars * 1e3:>10.0f} {t_index * 1e3:>15.0f}")
+
+
+if __name__ == "__main__":
+    main([int(float(a)) for a in sys.argv[1:]] or [1_000_000, 10_000_000])
@@ -0,0 +1,80 @@
+"""
+bench_ingest.py
+-----------------
+Cost of adding a batch of rows to a served dataset: incremental ingest
+(SQLite insert + Dataset.appended) vs. the reload paths it replaces.
+
+    python -m benchmarks.bench_ingest [rows] [batch]    # default: 5M, 10k
+
+The batch mixes existing and new chemicals and proteins. Timed:
+
+- insert:      the batch appended to SQLite and read back (one transaction)
+- appended:    Dataset.appended on the served Dataset
+- bundle:      incremental `python -m app.precompute` + opening the bundle
+- full:        Dataset built from the DB from scratch (load_data + indexes)
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.bundle import load_dataset
+from app.data_utils import load_data
+from app.dataset import Dataset
+from app.ingest import append_to_db
+from app.precompute import build
+from benchmarks.synthetic import make_conditions, write_db
+
+
+def _batch(n: int):
+    df = make_conditions(n, n_chemicals=840, seed=12345)
+    rng = np.random.default_rng(1)
+    new_protein = rng.random(n) < 0.2
+    df.loc[new_protein, "Protein_ID"] = "NEW-" + df.loc[new_protein, "Protein_ID"]
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict("records")
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main(n_rows: int, batch: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = write_db(Path(tmp) / "bench.db", n_rows, seq_len=60)
+        os.environ.update(DB_PATH=str(db_path), DB_SNAPSHOT="0")
+        build(db_path)
+        dataset = load_dataset()
+        dataset.summary, dataset.sequence_totals  # noqa: B018 (as served: already built)
+        rows = _batch(batch)
+
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            (new, sequences), t_insert = _timed(lambda: append_to_db(conn, rows))
+            conn.commit()
+        updated, t_appended = _timed(lambda: dataset.appended(new, sequences, "bench"))
+        _, t_bundle = _timed(lambda: (build(db_path), load_dataset()))
+        os.environ["DB_BUNDLE"] = "0"
+        full, t_full = _timed(lambda: Dataset(load_data()).summary)
+        del os.environ["DB_BUNDLE"]
+
+        assert len(updated.df) == n_rows + batch
+        print(f"{n_rows:,} rows + {batch:,} new ({len(updated.chemicals.chemicals) - len(dataset.chemicals.chemicals)}"
+              f" new chemicals)")
+        print(f"{'insert (SQLite)':<28} {t_insert * 1e3:>9.0f} ms")
+        print(f"{'Dataset.appended':<28} {t_appended * 1e3:>9.0f} ms")
+        print(f"{'  ingest total':<28} {(t_insert + t_appended) * 1e3:>9.0f} ms")
+        print(f"{'bundle update + open':<28} {t_bundle * 1e3:>9.0f} ms")
+        print(f"{'full rebuild from DB':<28} {t_full * 1e3:>9.0f} ms")
+
+
+if __name__ == "__main__":
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 5_000_000,
+         int(float(sys.argv[2])) if len(sys.argv) > 2 else 10_000)
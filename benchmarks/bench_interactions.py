@@ -0,0 +1,100 @@
+"""
+bench_interactions.py
+-----------------------
+Server CPU per drill-down interaction: the former single `update_drilldown`
+callback vs. the split callbacks.
+
+    python -m benchmarks.bench_interactions [rows]      # default: 1M
+
+The result cache is cleared before every interaction so only the callback
+structure is compared. "before" re-runs what the monolithic callback did on
+every input change (summary + the active tab); "after" runs only the
+callbacks whose inputs changed.
+"""
+
+import sys
+import time
+
+from app.cache import result_cache
+from app.callbacks import (
+    summary_block, build_concentration_fig, build_ph_fig, build_co_figs,
+)
+from app.data_utils import prepare_frame
+from app.dataset import Dataset
+from benchmarks.synthetic import make_conditions
+
+CHEM_A, CHEM_B = "CHEMICAL 0001", "CHEMICAL 0012"
+
+# (interaction, changed input) on a typical session
+SESSION = (
+    [("select chemical", "chem")]
+    + [("drag mM slider", "bw_mm")] * 5
+    + [("drag % slider", "bw_pct")] * 3
+    + [("toggle IQR focus", "show_all")]
+    + [("switch tab (pH)", "tab"), ("switch tab (co)", "tab"), ("switch tab (conc)", "tab")]
+)
+
+
+def before(dataset, state, changed):
+    chem, tab = state["chem"], state["tab"]
+    summary_block(dataset, chem)
+    if tab == "tab-conc":
+        build_concentration_fig(dataset, chem, "mM", state["bw_mm"], state["focus"], False)
+        build_concentration_fig(dataset, chem, "%", state["bw_pct"], state["focus"], False)
+    elif tab == "tab-ph":
+        build_ph_fig(dataset, chem, state["focus"])
+    else:
+        build_co_figs(dataset.cooccurrence, chem)
+
+
+def after(dataset, state, changed):
+    chem = state["chem"]
+    if changed == "chem":
+        summary_block(dataset, chem)
+    if changed in ("chem", "show_all", "bw_mm"):
+        build_concentration_fig(dataset, chem, "mM", state["bw_mm"], state["focus"], False)
+    if changed in ("chem", "show_all", "bw_pct"):
+        build_concentration_fig(dataset, chem, "%", state["bw_pct"], state["focus"], False)
+    if changed in ("chem", "show_all"):
+        build_ph_fig(dataset, chem, state["focus"])
+    if changed == "chem":
+        build_co_figs(dataset.cooccurrence, chem)
+    # tab switches: content is already rendered, no server callback fires
+
+
+def run(dataset, chem, handler):
+    state = {"chem": chem, "tab": "tab-conc", "bw_mm": 1.0, "bw_pct": 0.25, "focus": True}
+    tabs = iter(["tab-ph", "tab-co", "tab-conc"])
+    costs = {}
+    for name, changed in SESSION:
+        if changed == "bw_mm":
+            state["bw_mm"] += 0.5
+        elif changed == "bw_pct":
+            state["bw_pct"] += 0.5
+        elif changed == "show_all":
+            state["focus"] = not state["focus"]
+        elif changed == "tab":
+            state["tab"] = next(tabs)
+        result_cache.clear()
+        t0 = time.process_time()
+        handler(dataset, state, changed)
+        costs.setdefault(name, []).append(time.process_time() - t0)
+    return costs
+
+
+def main(n_rows):
+    dataset = Dataset(prepare_frame(make_conditions(n_rows, seq_len=60)))
+    for chem in (CHEM_A, CHEM_B):
+        print(f"\n{chem}: {dataset.chemicals.count(chem):,} rows  (server CPU ms per interaction)")
+        b, a = run(dataset, chem, before), run(dataset, chem, after)
+        print(f"{'interaction':<20} {'before':>9} {'after':>9}")
+        for name in b:
+            mb = 1e3 * sum(b[name]) / len(b[name])
+            ma = 1e3 * sum(a[name]) / len(a[name])
+            print(f"{name:<20} {mb:>9.1f} {ma:>9.1f}")
+        tb, ta = (1e3 * sum(sum(v) for v in c.values()) for c in (b, a))
+        print(f"{'session total':<20} {tb:>9.1f} {ta:>9.1f}")
+
+
+if __name__ == "__main__":
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,55 @@
+"""
+bench_kde.py
+--------------
+Exact vs. binned (FFT) KDE in `figures.kde_curve`: peak memory, time and
+accuracy of the binned engine relative to the exact one.
+
+    python -m benchmarks.bench_kde [n ...]      # default: 10k 100k 1M
+
+The exact engine is skipped above EXACT_LIMIT samples (it needs 200×n floats),
+so accuracy is only reported where both engines ran. Peak memory includes
+kde_curve's NaN-filtered copy of the input. The accuracy bound itself is a
+test (tests/test_kde.py).
+"""
+
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.figures import kde_curve
+
+EXACT_LIMIT = 200_000
+
+
+def _measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 1e6
+
+
+def main(sizes):
+    rng = np.random.default_rng(0)
+    print(f"{'n':>10} {'exact (s)':>10} {'exact MB':>9} {'binned (s)':>11} {'binned MB':>10} {'max rel err':>12}")
+    for n in sizes:
+        # bimodal, skewed: closer to real concentration data than a single normal
+        x = np.concatenate([rng.lognormal(2.0, 0.6, n - n // 3), rng.normal(40.0, 5.0, n // 3)])
+
+        (_, gy_b), t_b, m_b = _measure(lambda: kde_curve(x, method="binned"))
+        if n <= EXACT_LIMIT:
+            (_, gy_e), t_e, m_e = _measure(lambda: kde_curve(x, method="exact"))
+            err = np.max(np.abs(gy_b - gy_e)) / np.max(gy_e)
+            exact_cols = f"{t_e:>10.3f} {m_e:>9.1f}"
+        else:
+            err, exact_cols = float("nan"), f"{'skipped':>10} {200 * n * 8 / 1e6:>8.0f}*"
+        print(f"{n:>10,} {exact_cols} {t_b:>11.4f} {m_b:>10.2f} {err:>12.2e}")
+    print("* estimated size of the dense kernel matrix alone")
+
+
+if __name__ == "__main__":
+    main([int(float(a)) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
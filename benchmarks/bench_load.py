@@ -0,0 +1,49 @@
+"""
+bench_load.py
+---------------
+Startup benchmark: SQLite `read_sql` path vs. memory-mapped Arrow snapshot.
+
+    python -m benchmarks.bench_load [rows ...]      # default: 100k 1M 10M
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app import data_utils
+from app.snapshot import snapshot_path
+from benchmarks.synthetic import write_db
+
+
+def _timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(sizes):
+    print(f"{'rows':>12} {'sqlite (s)':>12} {'snapshot (s)':>13} {'speedup':>8} {'snapshot MB':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            db = write_db(Path(tmp) / f"bench_{n}.db", n)
+            os.environ["DB_PATH"] = str(db)
+
+            os.environ["DB_SNAPSHOT"] = "0"
+            t_sql = _timed(data_utils.load_data)
+
+            os.environ["DB_SNAPSHOT"] = "1"
+            data_utils.load_data()  # writes the snapshot
+            t_snap = _timed(data_utils.load_data)
+
+            size_mb = snapshot_path(db, data_utils.TABLE).stat().st_size / 1e6
+            print(f"{n:>12,} {t_sql:>12.3f} {t_snap:>13.3f} {t_sql / t_snap:>7.1f}x {size_mb:>12.1f}")
+            db.unlink()
+
+
+if __name__ == "__main__":
+    main([int(float(a)) for a in sys.argv[1:]] or [100_000, 1_000_000, 10_000_000])
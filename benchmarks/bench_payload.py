@@ -0,0 +1,93 @@
+"""
+bench_payload.py
+------------------
+Response size and serialization time per figure type: plain JSON (plotly.py
+lists) vs. typed arrays (app.typed_arrays.compact_figure).
+
+    python -m benchmarks.bench_payload [rows]      # default: 1M
+
+Figures are built once for a frequent chemical of a synthetic dataset, then
+serialized the way Dash sends a callback response (plotly.io.json's
+to_json_plotly). "typed" time includes the compaction itself. Sizes are raw
+and gzipped (what a compressing proxy would send). Each typed figure is
+decoded back and checked against the JSON one: integers exactly, floats
+within float32 rounding.
+"""
+
+import gzip
+import sys
+import time
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
+
+from app.callbacks import BW_DEFAULTS, build_co_figs, build_concentration_fig, build_ph_conc_heatmap, build_ph_fig
+from app.data_utils import prepare_frame
+from app.dataset import Dataset
+from app.figures import histogram_trace, make_top50_overview, rebin_data
+from app.typed_arrays import compact_figure, from_typed_array
+from benchmarks.synthetic import make_conditions
+
+CHEM = "CHEMICAL 0001"
+
+
+def figures(dataset: Dataset) -> dict:
+    """Figure type → figure, from the uncached builders."""
+    co_heatmap, co_bar = build_co_figs.__wrapped__(dataset.cooccurrence, CHEM)
+    raw = go.Figure(histogram_trace(dataset.distribution("mM", CHEM), BW_DEFAULTS["mM"], mode="client"))
+    return {
+        "concentration + KDE": build_concentration_fig.__wrapped__(dataset, CHEM, "mM", BW_DEFAULTS["mM"], True, False),
+        "concentration raw": raw,
+        "pH histogram": build_ph_fig.__wrapped__(dataset, CHEM, True),
+        "co-occurrence heat": co_heatmap,
+        "co-occurrence bar": co_bar,
+        "pH × conc heatmap": build_ph_conc_heatmap.__wrapped__(dataset, "mM"),
+        "top-50 overview": make_top50_overview(dataset.summary, len(dataset.chemicals)),
+        "rebin store (mM)": rebin_data(dataset.distribution("mM", CHEM), CHEM, "mM", BW_DEFAULTS["mM"])["figure"],
+    }
+
+
+def _median_ms(fn, repeat: int = 7) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times) * 1e3)
+
+
+def _check(plain, typed, path=""):
+    """Typed figure data decodes to the plain figure's values (float32 tolerance)."""
+    if isinstance(typed, dict) and "bdata" in typed:
+        a, b = np.asarray(plain, dtype=np.float64), from_typed_array(typed).astype(np.float64)
+        tol = 0.0 if typed["dtype"] != "f4" else 1e-6 * (np.nanmax(a) - np.nanmin(a) or np.nanmax(np.abs(a)))
+        assert a.shape == b.shape and np.allclose(a, b, rtol=0, atol=tol, equal_nan=True), path
+    elif isinstance(typed, dict):
+        for k in typed:
+            _check(plain[k], typed[k], f"{path}.{k}")
+    elif isinstance(typed, list) and typed and isinstance(typed[0], dict):
+        for i, (p, t) in enumerate(zip(plain, typed)):
+            _check(p, t, f"{path}[{i}]")
+
+
+def main(n_rows: int):
+    dataset = Dataset(prepare_frame(make_conditions(n_rows, seq_len=10)))
+    print(f"{n_rows:,} rows, chemical {CHEM} ({dataset.chemicals.count(CHEM):,} rows)")
+    print(f"{'figure':<22} {'json KB':>9} {'typed KB':>9} {'gzip json':>10} {'gzip typed':>11}"
+          f" {'json ms':>8} {'typed ms':>9}")
+    for name, fig in figures(dataset).items():
+        plain = fig.to_plotly_json() if hasattr(fig, "to_plotly_json") else fig
+        typed = compact_figure(fig)
+        _check(plain, typed)
+        plain_text, typed_text = to_json_plotly(fig), to_json_plotly(typed)
+        t_plain = _median_ms(lambda: to_json_plotly(fig))
+        t_typed = _median_ms(lambda: to_json_plotly(compact_figure(fig)))
+        sizes = [len(plain_text), len(typed_text),
+                 len(gzip.compress(plain_text.encode())), len(gzip.compress(typed_text.encode()))]
+        print(f"{name:<22} " + " ".join(f"{s / 1024:>{w}.1f}" for s, w in zip(sizes, (9, 9, 10, 11)))
+              + f" {t_plain:>8.2f} {t_typed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,60 @@
+"""
+bench_ph.py
+-------------
+pH parsing microbenchmark at 1M rows:
+
+- before: the former per-element `series.apply` parser, run on every pH tab render
+- load:   the vectorized `parse_ph`, run once at load
+- after:  what the pH tab does per call now (read the precomputed column)
+
+    python -m benchmarks.bench_ph [rows]      # default: 1M
+"""
+
+import sys
+import time
+
+import pandas as pd
+
+from app.data_utils import parse_ph
+from benchmarks.synthetic import make_conditions
+
+
+def parse_ph_series_apply(series: pd.Series) -> pd.Series:
+    """The former implementation, kept here as the baseline."""
+    def _one(s):
+        if pd.isna(s):
+            return None
+        x = str(s).strip().upper()
+        if x.startswith("PH"):
+            x = x.replace("PH", "").strip()
+        try:
+            return float(x)
+        except Exception:
+            return None
+    return series.apply(_one)
+
+
+def _best(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1e3
+
+
+def main(n_rows):
+    ph = make_conditions(n_rows, seq_len=10)["pH"]
+    ph_cat = ph.astype("category")
+    df = pd.DataFrame({"pH": ph_cat})
+    df["pH_numeric"], df["pH_status"] = parse_ph(ph_cat)
+
+    print(f"{n_rows:,} rows, {ph.nunique():,} distinct pH strings")
+    print(f"{'before: apply per element (object)':<42} {_best(lambda: parse_ph_series_apply(ph)):>10.1f} ms")
+    print(f"{'load:   parse_ph (object column)':<42} {_best(lambda: parse_ph(ph)):>10.1f} ms")
+    print(f"{'load:   parse_ph (category column)':<42} {_best(lambda: parse_ph(ph_cat)):>10.1f} ms")
+    print(f"{'after:  read pH_numeric per call':<42} {_best(lambda: df['pH_numeric'].dropna()):>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 1_000_000)
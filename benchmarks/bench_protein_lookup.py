@@ -0,0 +1,47 @@
+"""
+bench_protein_lookup.py
+-------------------------
+Protein drill-down lookup latency: upper-cased full-column mask vs. ProteinIndex.
+
+    python -m benchmarks.bench_protein_lookup [rows ...]   # default: 100k 1M 5M
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from app.indexes import ProteinIndex
+from benchmarks.synthetic import make_conditions
+
+
+def _p99_ms(fn, ids):
+    times = []
+    for pid in ids:
+        t0 = time.perf_counter()
+        fn(pid)
+        times.append(time.perf_counter() - t0)
+    return np.percentile(times, 99) * 1e3
+
+
+def main(sizes, n_queries=200):
+    print(f"{'rows':>12} {'mask p99 (ms)':>14} {'index p99 (ms)':>15} {'index build (s)':>16}")
+    for n in sizes:
+        df = make_conditions(n, seq_len=10)
+        ids = np.random.default_rng(0).choice(df["Protein_ID"].unique(), n_queries)
+        ids = [str(i).lower() for i in ids]
+
+        def mask(pid):
+            return df[df["Protein_ID"].astype(str).str.upper() == pid.upper()]
+
+        t0 = time.perf_counter()
+        index = ProteinIndex(df)
+        build = time.perf_counter() - t0
+
+        mask_p99 = _p99_ms(mask, ids[:20])
+        index_p99 = _p99_ms(lambda pid: df.take(index.rows(pid)), ids)
+        print(f"{n:>12,} {mask_p99:>14.2f} {index_p99:>15.3f} {build:>16.2f}")
+
+
+if __name__ == "__main__":
+    main([int(float(a)) for a in sys.argv[1:]] or [100_000, 1_000_000, 5_000_000])
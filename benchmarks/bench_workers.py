@@ -0,0 +1,127 @@
+"""
+bench_workers.py
+------------------
+Total memory of a gunicorn deployment for 2, 4 and 8 workers, with the app
+imported in each worker vs. once in the master (`--preload`).
+
+    python -m benchmarks.bench_workers [rows]      # default: 1M
+
+Writes a synthetic DB (and its bundle) to a temp dir, starts gunicorn with
+gunicorn.conf.py, sends the same drill-down requests to every worker, then
+sums PSS (proportional set size: shared pages are split between the
+processes mapping them) over the master and its workers. Linux only: reads
+/proc/<pid>/smaps_rollup.
+"""
+
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from app.precompute import build
+from benchmarks.synthetic import write_db
+
+ROOT = Path(__file__).resolve().parents[1]
+CHEMICALS = ["CHEMICAL 0000", "CHEMICAL 0001", "CHEMICAL 0012", "CHEMICAL 0300"]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url, data=None):
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=120) as resp:
+        return resp.read()
+
+
+def _requests(base):
+    """One update-component payload per server callback fed by the drill-down inputs."""
+    values = {
+        "chem-dropdown.value": None, "show-all.value": [], "binwidth-mm.value": 1.0,
+        "binwidth-pct.value": 0.5, "protein-submit.n_clicks": 1, "protein-id-input.value": "00A1",
+    }
+    payloads = []
+    for dep in json.loads(_get(f"{base}/_dash-dependencies")):
+        ins, states = dep["inputs"], dep.get("state", [])
+        if dep.get("clientside_function") or not all(
+                f"{i['id']}.{i['property']}" in values for i in ins + states):
+            continue
+        outs = [dict(zip(("id", "property"), o.split("."))) for o in dep["output"].strip(".").split("...")]
+        payloads.append(lambda chem, dep=dep, ins=ins, states=states, outs=outs: json.dumps({
+            "output": dep["output"],
+            "outputs": outs if dep["output"].startswith("..") else outs[0],
+            "inputs": [dict(i, value=chem if i["id"] == "chem-dropdown" else values[f"{i['id']}.{i['property']}"])
+                       for i in ins],
+            "state": [dict(s, value=values[f"{s['id']}.{s['property']}"]) for s in states],
+            "changedPropIds": [f"{i['id']}.{i['property']}" for i in ins],
+        }).encode())
+    return payloads
+
+
+def _pss_kb(pid) -> int:
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+        if line.startswith("Pss:"):
+            return int(line.split()[1])
+    return 0
+
+
+def _children(pid):
+    path = Path(f"/proc/{pid}/task/{pid}/children")
+    return [int(p) for p in path.read_text().split()] if path.exists() else []
+
+
+def run(db_path, workers: int, preload: bool) -> tuple[float, float]:
+    port = _free_port()
+    env = dict(os.environ, DB_PATH=str(db_path), PORT=str(port),
+               WEB_CONCURRENCY=str(workers), GUNICORN_PRELOAD="1" if preload else "0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:server"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(600):
+            try:
+                _get(f"{base}/")
+                break
+            except OSError:
+                time.sleep(0.5)
+        while len(_children(proc.pid)) < workers:
+            time.sleep(0.5)
+        # every chemical through every callback, enough times for all workers to serve some
+        for _ in range(workers):
+            for make in _requests(base):
+                for chem in CHEMICALS:
+                    _get(f"{base}/_dash-update-component", make(chem))
+        time.sleep(1)
+        pids = [proc.pid] + _children(proc.pid)
+        master = _pss_kb(proc.pid) / 1024
+        return master, sum(_pss_kb(p) for p in pids) / 1024
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=60)
+
+
+def main(n_rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = write_db(Path(tmp) / "bench.db", n_rows, seq_len=60)
+        build(db_path)
+        print(f"{n_rows:,} rows — total PSS of master + workers (MB)")
+        print(f"{'workers':>8} {'per-worker import':>18} {'--preload':>10}")
+        for workers in (2, 4, 8):
+            no_preload = run(db_path, workers, preload=False)[1]
+            preload = run(db_path, workers, preload=True)[1]
+            print(f"{workers:>8} {no_preload:>18.0f} {preload:>10.0f}")
+
+
+if __name__ == "__main__":
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,129 @@
+"""
+check_engines.py
+------------------
+Parity of the query engines: every view drawn from the in-memory Dataset
+and from another engine (app.sqlengine, app.polarsengine) must match.
+
+    python -m benchmarks.check_engines [rows] [engine ...]   # default: 200k, sql polars
+                                                             # exits 1 on a mismatch
+
+Compared per chemical (the most and least frequent ones, plus an unknown
+name): the summary block, both concentration figures over several bin
+widths with and without the IQR focus, the pH figure, the co-occurrence
+figures and protein lookups. Figures are compared trace by trace; float
+arrays within float64 round-off (SQL sums in another order), the rest
+exactly. Query latency of both engines is printed alongside.
+
+The same checks run as tests on a small DB (python -m pytest tests; the
+Polars ones are skipped without polars).
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.bundle import load_dataset
+from app.callbacks import build_co_figs, build_concentration_fig, build_ph_fig, summary_block
+from app.polarsengine import load_polars_dataset
+from app.sqlengine import load_sql_dataset
+from benchmarks.synthetic import write_db
+
+ENGINES = {"sql": load_sql_dataset, "polars": load_polars_dataset}
+BIN_WIDTHS = {"mM": [None, 0.05, 1.0, 10.0], "%": [None, 0.005, 0.25, 3.0]}
+
+
+def figure_diff(a, b, path="") -> list:
+    """Paths where two figure/component structures differ."""
+    a, b = (x.to_plotly_json() if hasattr(x, "to_plotly_json") else x for x in (a, b))
+    if isinstance(a, dict) and isinstance(b, dict):
+        out = [f"{path}.{k}: missing on one side" for k in set(a) ^ set(b)]
+        for k in set(a) & set(b):
+            out += figure_diff(a[k], b[k], f"{path}.{k}")
+        return out
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)) and not _numeric(a):
+        if len(a) != len(b):
+            return [f"{path}: length {len(a)} vs {len(b)}"]
+        return [d for i, (x, y) in enumerate(zip(a, b)) for d in figure_diff(x, y, f"{path}[{i}]")]
+    if isinstance(a, (np.ndarray, list, tuple, float)) or isinstance(b, (np.ndarray, list, tuple, float)):
+        x, y = np.asarray(a), np.asarray(b)
+        if x.shape != y.shape:
+            return [f"{path}: shape {x.shape} vs {y.shape}"]
+        if x.dtype.kind in "fiu" and y.dtype.kind in "fiu":
+            ok = np.allclose(x.astype(float), y.astype(float), rtol=1e-9, atol=1e-12, equal_nan=True)
+        else:
+            ok = np.array_equal(x, y)
+        return [] if ok else [f"{path}: values differ"]
+    return [] if a == b else [f"{path}: {a!r} vs {b!r}"]
+
+
+def _numeric(seq) -> bool:
+    return len(seq) > 0 and all(isinstance(v, (int, float, np.number)) for v in seq)
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def compare(reference, other, name: str, n_rows: int) -> list:
+    """Mismatches between the views of two datasets; prints per-view latency."""
+    chems = reference.summary["count"].sort_values(kind="stable").index
+    selected = [*chems[-5:], *chems[:5], *chems[len(chems) // 2:][:3], "NOT A CHEMICAL"]
+    proteins = [str(p) for p in reference.df["Protein_ID"].dropna().unique()[:: max(n_rows // 800, 1)][:20]]
+    views = [("summary", summary_block.__wrapped__, (c,)) for c in selected]
+    views += [("concentration", build_concentration_fig.__wrapped__, (c, unit, bw, focus, False))
+              for c in selected for unit, widths in BIN_WIDTHS.items() for bw in widths for focus in (False, True)]
+    views += [("pH", build_ph_fig.__wrapped__, (c, focus)) for c in selected for focus in (False, True)]
+
+    failures, times = [], {}
+    for view, fn, args in views:
+        a, ta = _timed(fn, reference, *args)
+        b, tb = _timed(fn, other, *args)
+        times.setdefault(view, []).append((ta, tb))
+        failures += [f"{view}{args}: {d}" for d in figure_diff(a, b)]
+    for chem in selected:
+        (a, ta), (b, tb) = (_timed(build_co_figs.__wrapped__, ds.cooccurrence, chem) for ds in (reference, other))
+        times.setdefault("co-occurrence", []).append((ta, tb))
+        failures += [f"co-occurrence({chem!r}): {d}" for fa, fb in zip(a, b) for d in figure_diff(fa, fb)]
+    columns = ["Protein_ID", "Standardized_Precipitate", "Concentration", "pH"]
+    for pid in [*proteins, *(p.lower() for p in proteins[:5]), "NO SUCH PROTEIN"]:
+        (a, ta), (b, tb) = (_timed(ds.protein_conditions, pid) for ds in (reference, other))
+        times.setdefault("protein", []).append((ta, tb))
+        a, b = (d[columns].astype(object).reset_index(drop=True) for d in (a, b))
+        if not a.equals(b):
+            failures.append(f"protein({pid!r}): rows differ")
+    failures += [f"avg_sequence_length: {d}" for d in figure_diff(
+        reference.avg_sequence_length.to_numpy(), other.avg_sequence_length.to_numpy())]
+
+    print(f"{'view':<16} {'calls':>6} {'pandas ms':>10} {name + ' ms':>10}")
+    for view, pairs in times.items():
+        ta, tb = np.mean(pairs, axis=0) * 1e3
+        print(f"{view:<16} {len(pairs):>6} {ta:>10.2f} {tb:>10.2f}")
+    return failures
+
+
+def main(n_rows: int, engines: list) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = write_db(Path(tmp) / "parity.db", n_rows, seq_len=60)
+        os.environ.update(DB_PATH=str(db_path), DB_SNAPSHOT="0", DB_BUNDLE="0")
+        reference = load_dataset()
+        print(f"{n_rows:,} rows, {len(reference.chemicals.chemicals)} chemicals")
+        failures = []
+        for name in engines:
+            other, t_load = _timed(ENGINES[name])
+            print(f"\n{name}: loaded in {t_load:.1f}s")
+            found = compare(reference, other, name, n_rows)
+            for line in found[:40]:
+                print(f"[WARN] {line}")
+            print(f"{name}: {len(found)} mismatches")
+            failures += found
+        return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 200_000, sys.argv[2:] or list(ENGINES)))
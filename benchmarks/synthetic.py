@@ -0,0 +1,74 @@
+"""
+synthetic.py
+--------------
+Synthetic `conditions` tables for the benchmark scripts.
+
+The shape mirrors the real database: a skewed (Zipf-like) chemical
+distribution, several condition rows per protein, mixed concentration units
+and messy pH strings.
+"""
+
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+UNITS = np.array(["mM", "%", "M", "mm", "%w/v", "uM", ""], dtype=object)
+UNIT_P = [0.40, 0.30, 0.15, 0.05, 0.04, 0.03, 0.03]
+
+
+def make_conditions(n_rows: int, n_chemicals: int = 800, rows_per_protein: int = 8,
+                    seq_len: int = 120, seed: int = 0) -> pd.DataFrame:
+    """Return a synthetic conditions DataFrame with `n_rows` rows."""
+    rng = np.random.default_rng(seed)
+    n_proteins = max(n_rows // rows_per_protein, 1)
+
+    chem_names = np.array([f"CHEMICAL {i:04d}" for i in range(n_chemicals)], dtype=object)
+    weights = 1.0 / np.arange(1, n_chemicals + 1)
+    chem = rng.choice(n_chemicals, size=n_rows, p=weights / weights.sum())
+
+    protein = np.sort(rng.integers(0, n_proteins, size=n_rows))
+    protein_ids = np.array([f"{i:X}".rjust(4, "0") for i in range(n_proteins)], dtype=object)
+
+    aas = np.frombuffer(b"ACDEFGHIKLMNPQRSTVWY", dtype="S1")
+    seqs = np.array(
+        [b"".join(rng.choice(aas, size=int(rng.integers(seq_len // 2, seq_len * 2)))).decode()
+         for _ in range(min(n_proteins, 5000))],
+        dtype=object,
+    )
+
+    unit = rng.choice(UNITS, size=n_rows, p=UNIT_P)
+    value = np.round(rng.lognormal(mean=2.0, sigma=1.0, size=n_rows), 2)
+    converted = np.where(unit == "M", value * 1000.0, np.where(unit == "uM", value / 1000.0, np.nan))
+
+    ph_val = np.round(rng.normal(7.0, 1.2, size=n_rows).clip(2, 11), 1)
+    ph_kind = rng.integers(0, 10, size=n_rows)
+    ph = np.where(ph_kind < 5, np.char.add("PH ", ph_val.astype(str)), ph_val.astype(str)).astype(object)
+    ph[ph_kind == 8] = np.char.add(np.char.add(ph_val[ph_kind == 8].astype(str), "-"),
+                                   (ph_val[ph_kind == 8] + 1).round(1).astype(str))
+    ph[ph_kind == 9] = None
+
+    return pd.DataFrame({
+        "Protein_ID": protein_ids[protein],
+        "Standardized_Precipitate": chem_names[chem],
+        "CID": chem + 1000,
+        "Concentration": np.char.add(np.char.add(value.astype(str), " "), unit.astype(str)),
+        "Concentration_Value": value,
+        "Concentration_Unit": unit,
+        "Concentration_Converted": converted,
+        "pH": ph,
+        "FASTA_Sequence": seqs[protein % len(seqs)],
+    })
+
+
+def write_db(path, n_rows: int, table: str = "conditions", chunk: int = 1_000_000, **kwargs) -> Path:
+    """Write a synthetic conditions table of `n_rows` rows to a fresh SQLite file."""
+    path = Path(path)
+    if path.exists():
+        path.unlink()
+    with sqlite3.connect(path) as conn:
+        for start in range(0, n_rows, chunk):
+            part = make_conditions(min(chunk, n_rows - start), seed=start, **kwargs)
+            part.to_sql(table, conn, if_exists="append", index=False)
+    return path
@@ -0,0 +1,47 @@
+"""
+gunicorn.conf.py
+------------------
+Gunicorn settings (picked up automatically from the working directory).
+
+The app is imported once in the master (`preload_app`), so the dataset and
+its indexes are loaded a single time and shared copy-on-write by every
+forked worker. Before each fork, the objects built so far are moved out of
+the garbage collector's reach (`gc.freeze`): otherwise a collection in a
+worker writes to the header of every shared object and un-shares its page.
+
+The DB watcher (app/reload.py) runs in the master too: a changed DB is
+loaded there once, then the master hangs itself up (SIGHUP), so gunicorn
+forks fresh workers from the new Dataset and stops the old ones gracefully.
+Without preload, each worker watches and reloads on its own.
+
+    WEB_CONCURRENCY     number of workers (default 2)
+    GUNICORN_PRELOAD=0  import the app in each worker instead (always the case
+                        with QUERY_ENGINE=polars: its thread pool does not survive a fork)
+"""
+
+import gc
+import os
+import signal
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8050')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+preload_app = (os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+               and os.environ.get("QUERY_ENGINE") != "polars")
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        gc.freeze()
+
+
+def when_ready(server):
+    if preload_app:
+        from main import live  # already imported by the preload
+        live.start_master(_recycle_workers)
+
+
+def _recycle_workers():
+    # the old Dataset was frozen with everything else before the last fork
+    gc.unfreeze()
+    gc.collect()
+    os.kill(os.getpid(), signal.SIGHUP)
@@ -6,16 +6,29 @@ Main entry point. Runs Dash server, builds layout, and registers callbacks.
 
 import dash
 import dash_bootstrap_components as dbc
-from app.data_utils import load_data
+from flask import jsonify
+from app.cache import memoize, result_cache
+from app.dataset import Dataset
 from app.figures import make_top50_overview
 from app.layout import make_layout
 from app.callbacks import register_callbacks
+from app.ingest import register_ingest
+from app.reload import LiveDataset, dataset_loader
+from app.typed_arrays import FIGURE_ENCODING, compact_figure
 import plotly.io as pio
 
 pio.templates.default = "plotly_dark"
 
-# Load data
-df = load_data()
+# Load the precomputed bundle (or the DB) with the chemical / protein / co-occurrence indexes,
+# or hand the queries to another engine (QUERY_ENGINE, see app/reload.py).
+# `live.current` is swapped for a new Dataset when the DB file changes.
+loader = dataset_loader()
+live = LiveDataset(loader(), loader=loader)
+result_cache.retain_version(live.current.version)  # results of an older DB are dead weight
+live.on_swap.append(lambda new, old: result_cache.retain_version(new.version))
+# Open (or build) the sequence store now: with gunicorn's preload this runs in the
+# master, so the workers inherit it instead of each building it on first use
+live.preload()
 
 # Dash app
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.SLATE])
@@ -24,16 +37,40 @@ app.title = "Crystallization EDA"
 # 👇 expose the Flask server for Render
 server = app.server
 
-# Top 50 overview + chem dropdown
-fig_top = make_top50_overview(df)
-chem_options = [{"label": c, "value": c}
-                for c in sorted(df["Standardized_Precipitate"].dropna().unique())]
+# Layout: top 50 overview + chem dropdown of the dataset being served
+@memoize(result_cache)
+def build_layout(dataset: Dataset):
+    fig_top = make_top50_overview(dataset.summary, len(dataset.chemicals))
+    if FIGURE_ENCODING == "typed":
+        fig_top = compact_figure(fig_top)
+    # sorted: ingested chemicals are appended after the existing ones
+    chem_options = [{"label": c, "value": c} for c in sorted(dataset.chemicals.chemicals)]
+    return make_layout(fig_top, chem_options)
 
-# Layout
-app.layout = make_layout(fig_top, chem_options)
+
+app.layout = lambda: build_layout(live.current)
 
 # Callbacks
-register_callbacks(app, df)
+register_callbacks(app, live)
+
+
+# DB watcher: in the gunicorn master when the app is preloaded (gunicorn.conf.py);
+# otherwise one thread per serving process, started on its first request
+# (threads started before a gunicorn fork would not exist in the workers)
+@server.before_request
+def start_watcher():
+    live.start()
+
+
+# POST /ingest: append rows without a reload (only when INGEST_TOKEN is set)
+register_ingest(server, live)
+
+
+# Drill-down result cache counters
+@server.route("/cache-stats")
+def cache_stats():
+    return jsonify(result_cache.stats())
+
 
 # Expose for gunicorn
 server = app.server
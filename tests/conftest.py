@@ -0,0 +1,46 @@
+"""
+Shared fixtures: a small synthetic conditions DB (benchmarks.synthetic) and
+the default pandas Dataset built from it, the reference for parity tests.
+"""
+
+import os
+
+os.environ.setdefault("SHARED_CACHE", "0")  # before app.cache is imported: no result cache across runs
+
+import pytest
+
+from benchmarks.synthetic import write_db
+
+N_ROWS = 5_000
+
+
+@pytest.fixture(scope="session")
+def db_path(tmp_path_factory):
+    """Synthetic DB, set as DB_PATH (no snapshot, no bundle) for the session."""
+    path = write_db(tmp_path_factory.mktemp("db") / "parity.db", N_ROWS, seq_len=60)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("DB_PATH", str(path))
+        mp.setenv("DB_SNAPSHOT", "0")
+        mp.setenv("DB_BUNDLE", "0")
+        yield path
+
+
+@pytest.fixture(scope="session")
+def reference(db_path):
+    """The pandas Dataset (QUERY_ENGINE=pandas) of the synthetic DB."""
+    from app.bundle import load_dataset
+    return load_dataset()
+
+
+@pytest.fixture(scope="session")
+def chemicals(reference) -> list:
+    """Most and least frequent chemicals, a few in between, and an unknown name."""
+    chems = reference.summary["count"].sort_values(kind="stable").index
+    return [*chems[-3:], *chems[:3], *chems[len(chems) // 2:][:2], "NOT A CHEMICAL"]
+
+
+@pytest.fixture(scope="session")
+def proteins(reference) -> list:
+    """A spread of protein IDs, a lower-cased one and an unknown one."""
+    ids = [str(p) for p in reference.df["Protein_ID"].dropna().unique()[::50][:10]]
+    return [*ids, ids[0].lower(), "NO SUCH PROTEIN"]
@@ -0,0 +1,21 @@
+"""Shared result cache (app.cache): entries are scoped to the build and its settings."""
+
+from app.cache import SharedCache, build_fingerprint
+
+KEY = ("build_concentration_fig", (("version", "v1"), "CHEMICAL 0001"), ())
+
+
+def test_namespaces_do_not_share_entries(tmp_path):
+    old = SharedCache(tmp_path / "cache.sqlite", 1 << 20, namespace="old build")
+    new = SharedCache(tmp_path / "cache.sqlite", 1 << 20, namespace="new build")
+    old.put(KEY, "figure")
+    assert old.get(KEY) == "figure"
+    assert new.get(KEY) is None
+
+
+def test_fingerprint_follows_result_settings(monkeypatch):
+    monkeypatch.delenv("HISTOGRAM_MODE", raising=False)
+    server = build_fingerprint()
+    assert build_fingerprint() == server
+    monkeypatch.setenv("HISTOGRAM_MODE", "client")
+    assert build_fingerprint() != server
@@ -0,0 +1,36 @@
+"""Dataset.appended against a full load of the same rows."""
+
+import shutil
+import sqlite3
+
+import pandas as pd
+
+from app.data_utils import load_data
+from app.ingest import append_to_db
+from app.indexes import CHEM_COL
+
+ROWS = [
+    {"Protein_ID": "0000 NEW", "Standardized_Precipitate": "AAA NEW CHEMICAL", "Concentration": "1.5 M", "pH": "6.5"},
+    {"Protein_ID": "ZZZZ NEW", "Standardized_Precipitate": "ZZZ NEW CHEMICAL", "Concentration": "20 %", "pH": "8"},
+    {"Protein_ID": "0000 NEW", "Standardized_Precipitate": "ZZZ NEW CHEMICAL", "Concentration": "0.2 M"},
+]
+
+
+def test_appended_categories_sorted(reference, db_path, tmp_path, monkeypatch):
+    """New category values are merged in sorted order, as a full load has them."""
+    path = shutil.copy(db_path, tmp_path / "appended.db")
+    conn = sqlite3.connect(path)
+    new, sequences = append_to_db(conn, ROWS)
+    conn.commit()
+    conn.close()
+
+    appended = reference.appended(new, sequences, "appended")
+    monkeypatch.setenv("DB_PATH", str(path))
+    full = load_data()
+    for col in full.columns:
+        if isinstance(full[col].dtype, pd.CategoricalDtype):
+            assert list(appended.df[col].cat.categories) == list(full[col].cat.categories), col
+
+    # sorting on the categorical column follows the chemical names
+    table = appended.protein_conditions("0000 NEW").sort_values(CHEM_COL)
+    assert list(table[CHEM_COL].astype(str)) == ["AAA NEW CHEMICAL", "ZZZ NEW CHEMICAL"]
@@ -0,0 +1,48 @@
+"""Accuracy of the binned (FFT) KDE against the exact one (app.figures)."""
+
+import numpy as np
+import pytest
+
+import app.figures as figures
+from app.figures import KDE_EXACT_MAX_N, kde_curve
+
+MAX_ERROR = 1e-3  # largest |binned - exact| relative to the exact curve's peak
+
+rng = np.random.default_rng(0)
+SAMPLES = {
+    "normal": rng.normal(5.0, 2.0, 5_000),
+    "skewed": rng.lognormal(0.0, 1.5, 5_000),
+    "bimodal": np.concatenate([rng.lognormal(2.0, 0.6, 3_000), rng.normal(40.0, 5.0, 1_500)]),
+    "just above KDE_EXACT_MAX_N": rng.normal(0.0, 1.0, KDE_EXACT_MAX_N + 1),
+}
+
+
+@pytest.mark.parametrize("name", SAMPLES)
+def test_binned_matches_exact(name):
+    x = SAMPLES[name]
+    grid_exact, exact = kde_curve(x, method="exact")
+    grid_binned, binned = kde_curve(x, method="binned")
+    np.testing.assert_array_equal(grid_binned, grid_exact)
+    assert np.max(np.abs(binned - exact)) <= MAX_ERROR * np.max(exact)
+
+
+@pytest.mark.parametrize("method", ["exact", "binned", "auto"])
+def test_all_equal_values_have_no_curve(method):
+    assert kde_curve(np.full(KDE_EXACT_MAX_N + 10, 3.0), method=method) == (None, None)
+
+
+def _refuse(*args):
+    raise AssertionError("wrong KDE engine")
+
+
+def test_auto_is_exact_up_to_the_limit(monkeypatch):
+    monkeypatch.setattr(figures, "_kde_binned", _refuse)
+    for n in (2, 50, KDE_EXACT_MAX_N):
+        grid, density = kde_curve(rng.normal(size=n))
+        assert density is not None and len(density) == len(grid)
+
+
+def test_auto_is_binned_above_the_limit(monkeypatch):
+    monkeypatch.setattr(figures, "_kde_exact", _refuse)
+    grid, density = kde_curve(rng.normal(size=KDE_EXACT_MAX_N + 1))
+    assert density is not None and len(density) == len(grid)
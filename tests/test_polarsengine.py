@@ -0,0 +1,63 @@
+"""Parity of the Polars engine (app.polarsengine) with the pandas Dataset."""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("polars")  # optional: requirements-polars.txt
+
+from app.callbacks import build_co_figs, build_concentration_fig
+from app.figures import make_top50_overview
+from app.polarsengine import PolarsCooccurrence, PolarsDataset, load_polars_dataset
+from benchmarks.check_engines import BIN_WIDTHS, figure_diff
+
+
+@pytest.fixture(scope="module")
+def polars_dataset(db_path):
+    dataset = load_polars_dataset()
+    assert isinstance(dataset, PolarsDataset)
+    assert isinstance(dataset.cooccurrence, PolarsCooccurrence)
+    return dataset
+
+
+@pytest.mark.parametrize("key", ["mM", "%", "pH"])
+def test_chemical_filter(reference, polars_dataset, chemicals, key):
+    for chem in chemicals:
+        np.testing.assert_array_equal(polars_dataset.distribution(key, chem).values(),
+                                      reference.distribution(key, chem).values(), err_msg=chem)
+    for chem in chemicals:
+        for bw in BIN_WIDTHS.get(key, []):
+            args = (chem, key, bw, True, False)
+            diff = figure_diff(build_concentration_fig.__wrapped__(reference, *args),
+                               build_concentration_fig.__wrapped__(polars_dataset, *args))
+            assert not diff, (args, diff)
+
+
+def test_top50_overview(reference, polars_dataset):
+    """Per-chemical count and nunique(Protein_ID), and the overview drawn from them."""
+    assert polars_dataset.chemicals.chemicals == list(reference.chemicals.chemicals)
+    for col in ("count", "unique_proteins"):
+        np.testing.assert_array_equal(polars_dataset.summary[col].to_numpy(), reference.summary[col].to_numpy())
+    assert polars_dataset.summary["cid"].tolist() == reference.summary["cid"].tolist()
+    assert not figure_diff(make_top50_overview(reference.summary, len(reference.chemicals)),
+                           make_top50_overview(polars_dataset.summary, len(polars_dataset.chemicals)))
+
+
+def test_cooccurrence_pivot(reference, polars_dataset, chemicals):
+    for chem in chemicals:
+        a, b = reference.cooccurrence.top_partners(chem, 15), polars_dataset.cooccurrence.top_partners(chem, 15)
+        assert a.index.tolist() == b.index.tolist(), chem
+        np.testing.assert_array_equal(a.to_numpy(), b.to_numpy())
+        others = a.index.tolist()
+        np.testing.assert_array_equal(reference.cooccurrence.pair_counts(chem, others),
+                                      polars_dataset.cooccurrence.pair_counts(chem, others))
+        for fa, fb in zip(build_co_figs.__wrapped__(reference.cooccurrence, chem),
+                          build_co_figs.__wrapped__(polars_dataset.cooccurrence, chem)):
+            assert not figure_diff(fa, fb), chem
+
+
+def test_protein_lookup(reference, polars_dataset, proteins):
+    columns = ["Protein_ID", "Standardized_Precipitate", "Concentration", "pH"]
+    for pid in proteins:
+        a, b = (ds.protein_conditions(pid)[columns].astype(object).reset_index(drop=True)
+                for ds in (reference, polars_dataset))
+        assert a.equals(b), pid
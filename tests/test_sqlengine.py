@@ -0,0 +1,79 @@
+"""Parity of the SQL engine (app.sqlengine) with the pandas Dataset."""
+
+import numpy as np
+import pytest
+
+from app.callbacks import build_co_figs, build_concentration_fig, build_ph_fig
+from app.figures import make_top50_overview
+from app.sqlengine import SqlDataset, load_sql_dataset
+from benchmarks.check_engines import BIN_WIDTHS, figure_diff
+
+
+@pytest.fixture(scope="module")
+def sql(db_path):
+    dataset = load_sql_dataset()
+    assert isinstance(dataset, SqlDataset)
+    return dataset
+
+
+def test_summary(reference, sql):
+    assert sql.chemicals.chemicals == list(reference.chemicals.chemicals)
+    assert len(sql.chemicals) == len(reference.chemicals)
+    for col in ("count", "unique_proteins"):
+        np.testing.assert_array_equal(sql.summary[col].to_numpy(), reference.summary[col].to_numpy())
+    assert sql.summary["cid"].tolist() == reference.summary["cid"].tolist()
+    np.testing.assert_allclose(sql.avg_sequence_length.to_numpy(), reference.avg_sequence_length.to_numpy(),
+                               rtol=1e-12)
+
+
+@pytest.mark.parametrize("key", ["mM", "%", "pH"])
+def test_distribution(reference, sql, chemicals, key):
+    for chem in chemicals:
+        a, b = reference.distribution(key, chem), sql.distribution(key, chem)
+        assert len(a) == len(b), chem
+        if not len(a):
+            continue
+        assert a.extent() == b.extent(), chem
+        for q in (0.0, 0.1, 0.25, 0.5, 0.75, 1.0):
+            assert a.quantile(q) == pytest.approx(b.quantile(q), rel=1e-12), (chem, q)
+        for bw in [w for w in BIN_WIDTHS.get(key, [0.25, 1.0]) if w]:
+            (edges_a, counts_a), (edges_b, counts_b) = a.histogram(bw), b.histogram(bw)
+            np.testing.assert_array_equal(counts_a, counts_b, err_msg=f"{chem} {bw}")
+            np.testing.assert_allclose(edges_a, edges_b, rtol=1e-12, err_msg=f"{chem} {bw}")
+
+
+def test_cooccurrence(reference, sql, chemicals):
+    for chem in chemicals:
+        a, b = reference.cooccurrence.top_partners(chem, 15), sql.cooccurrence.top_partners(chem, 15)
+        assert a.index.tolist() == b.index.tolist(), chem
+        np.testing.assert_array_equal(a.to_numpy(), b.to_numpy())
+        others = a.index.tolist()
+        np.testing.assert_array_equal(reference.cooccurrence.pair_counts(chem, others),
+                                      sql.cooccurrence.pair_counts(chem, others))
+
+
+def test_figures(reference, sql, chemicals):
+    failures = figure_diff(make_top50_overview(reference.summary, len(reference.chemicals)),
+                           make_top50_overview(sql.summary, len(sql.chemicals)))
+    for chem in chemicals:
+        for unit, widths in BIN_WIDTHS.items():
+            for bw in widths:
+                for focus in (False, True):
+                    args = (chem, unit, bw, focus, False)
+                    failures += [f"concentration{args}: {d}" for d in figure_diff(
+                        build_concentration_fig.__wrapped__(reference, *args),
+                        build_concentration_fig.__wrapped__(sql, *args))]
+        for focus in (False, True):
+            failures += [f"pH({chem!r}, {focus}): {d}" for d in figure_diff(
+                build_ph_fig.__wrapped__(reference, chem, focus), build_ph_fig.__wrapped__(sql, chem, focus))]
+        for a, b in zip(build_co_figs.__wrapped__(reference.cooccurrence, chem),
+                        build_co_figs.__wrapped__(sql.cooccurrence, chem)):
+            failures += [f"co-occurrence({chem!r}): {d}" for d in figure_diff(a, b)]
+    assert not failures, "\n".join(failures[:20])
+
+
+def test_protein_conditions(reference, sql, proteins):
+    columns = ["Protein_ID", "Standardized_Precipitate", "Concentration", "pH"]
+    for pid in proteins:
+        a, b = (ds.protein_conditions(pid)[columns].astype(object).reset_index(drop=True) for ds in (reference, sql))
+        assert a.equals(b), pid